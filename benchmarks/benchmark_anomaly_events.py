@@ -0,0 +1,116 @@
+'''
+Script to benchmark the latency of the anomaly events queries:
+the flagged days of a ticker and the daily summary, over a
+synthetic history of scored tickers and days
+
+Run from the repository root, e.g.:
+python -m benchmarks.benchmark_anomaly_events --dsn "host=localhost dbname=postgres user=postgres"
+
+Author: Vitor Abdo
+Date: Oct/2026
+'''
+
+# import necessary packages
+import os
+import time
+import logging
+import argparse
+import datetime
+import numpy as np
+import pandas as pd
+import psycopg2
+
+from components.dw_management import insert_anomaly_events, refresh_anomaly_summary
+from components.dw_management import fetch_anomaly_events, fetch_anomaly_summary
+from components.dw_migrations import MIGRATIONS
+
+logging.basicConfig(
+    level=logging.WARNING,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S')
+
+BENCH_SCHEMA = 'bench_anomaly_events'
+
+
+def create_events(dsn: str, n_tickers: int, n_days: int, rng: np.random.Generator) -> None:
+    '''
+    Create the events table in the bench schema and fill it with one event per ticker and day.
+
+    :param dsn: (str) libpq connection string of the database.
+    :param n_tickers: (int) Number of tickers.
+    :param n_days: (int) Days of history per ticker.
+    :param rng: (np.random.Generator) Random generator.
+    '''
+    conn = psycopg2.connect(dsn)
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute(f'DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE')
+        cur.execute(f'CREATE SCHEMA {BENCH_SCHEMA}')
+        for version, _, statements in MIGRATIONS:
+            if version == 2:
+                for statement in statements:
+                    cur.execute(statement.format(schema_name=BENCH_SCHEMA))
+    conn.close()
+
+    dates = [datetime.date(2020, 1, 1) + datetime.timedelta(days=day) for day in range(n_days)]
+    for i in range(n_tickers):
+        z_scores = rng.standard_t(3, n_days)
+        insert_anomaly_events(dsn, BENCH_SCHEMA, pd.DataFrame({
+            'ticker': f'SYN{i:05d}-USD',
+            'date': dates,
+            'value': z_scores * 10,
+            'z_score': z_scores,
+            'p_value': 2 * np.exp(-np.abs(z_scores)),
+            'lower_bound': -30.0,
+            'upper_bound': 30.0,
+            'is_anomaly': np.abs(z_scores) > 3,
+            'detector_version': 'bench'}))
+
+    conn = psycopg2.connect(dsn)
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute(f'ANALYZE {BENCH_SCHEMA}.anomaly_events')
+    conn.close()
+    refresh_anomaly_summary(dsn, BENCH_SCHEMA)
+
+
+def time_queries(run_query, n_queries: int) -> dict:
+    '''
+    Time a query function, including its connection, and summarize the latencies.
+    '''
+    latencies = []
+    for _ in range(n_queries):
+        start = time.perf_counter()
+        run_query()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return {'p50_ms': np.percentile(latencies, 50), 'p99_ms': np.percentile(latencies, 99)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Latency of the anomaly events queries.')
+    parser.add_argument('--dsn', default=os.getenv('BENCH_DSN'), required=os.getenv('BENCH_DSN') is None,
+                        help='libpq connection string of a local Postgres.')
+    parser.add_argument('--tickers', type=int, default=1000, help='Number of synthetic tickers.')
+    parser.add_argument('--days', type=int, default=730, help='Days of history per ticker.')
+    parser.add_argument('--queries', type=int, default=200, help='Queries timed per scenario.')
+    args = parser.parse_args()
+
+    # the components configure INFO logging on import, keep the benchmark output readable
+    logging.getLogger().setLevel(logging.WARNING)
+
+    rng = np.random.default_rng(0)
+    start = time.perf_counter()
+    create_events(args.dsn, args.tickers, args.days, rng)
+    print(f'{args.tickers * args.days} events written in {time.perf_counter() - start:.1f}s')
+
+    def flagged_days():
+        ticker = f'SYN{rng.integers(args.tickers):05d}-USD'
+        fetch_anomaly_events(args.dsn, BENCH_SCHEMA, ticker, '2020-06-01', '2021-05-31')
+
+    def daily_summary():
+        fetch_anomaly_summary(args.dsn, BENCH_SCHEMA, '2021-01-01', '2021-01-31')
+
+    print(f'{"query":<28} {"p50 ms":>8} {"p99 ms":>8}')
+    for name, run_query in (('flagged days of a ticker', flagged_days), ('daily summary of a month', daily_summary)):
+        result = time_queries(run_query, args.queries)
+        print(f'{name:<28} {result["p50_ms"]:>8.2f} {result["p99_ms"]:>8.2f}')
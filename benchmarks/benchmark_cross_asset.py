@@ -0,0 +1,59 @@
+'''
+Script to benchmark the daily update of the cross-asset
+monitor against a full refit, for growing ticker universes
+
+Run from the repository root: python -m benchmarks.benchmark_cross_asset
+
+Author: Vitor Abdo
+Date: Oct/2026
+'''
+
+# import necessary packages
+import time
+import numpy as np
+
+from components.cross_asset_detection import CrossAssetMonitor
+
+UNIVERSE_SIZES = [100, 1000, 5000]
+HISTORY_DAYS = 365
+UPDATES = 20
+
+
+def make_history(n_days: int, n_assets: int, rng: np.random.Generator) -> np.array:
+    '''
+    Create daily values driven by one market factor plus idiosyncratic noise.
+
+    :param n_days: (int) Number of days.
+    :param n_assets: (int) Number of tickers.
+    :param rng: (np.random.Generator) Random generator.
+
+    :return history: (np.array) array of shape (n_days, n_assets).
+    '''
+    market = rng.normal(size=(n_days, 1))
+    beta = rng.uniform(0.5, 1.5, size=n_assets)
+    return (market * beta + rng.normal(size=(n_days, n_assets))).astype(np.float32)
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(42)
+
+    print(f'{"assets":>8} {"dtype":>8} {"fit s":>8} {"update ms":>10} {"covariance MB":>14}')
+    for n_assets in UNIVERSE_SIZES:
+        history = make_history(HISTORY_DAYS + UPDATES, n_assets, rng)
+        tickers = [f'T{i}' for i in range(n_assets)]
+
+        for dtype in (np.float64, np.float32):
+            monitor = CrossAssetMonitor(tickers, dtype=dtype)
+
+            start = time.perf_counter()
+            monitor.fit(history[:HISTORY_DAYS])
+            fit_seconds = time.perf_counter() - start
+
+            timings = []
+            for values in history[HISTORY_DAYS:]:
+                start = time.perf_counter()
+                monitor.update(values)
+                timings.append((time.perf_counter() - start) * 1000)
+
+            print(f'{n_assets:>8} {np.dtype(dtype).name:>8} {fit_seconds:>8.2f} '
+                  f'{np.median(timings):>10.1f} {monitor.covariance.nbytes / 2 ** 20:>14.0f}')
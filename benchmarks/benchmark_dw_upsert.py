@@ -0,0 +1,95 @@
+'''
+Script to benchmark the latency of the two insert
+paths of the datawarehouse: small-batch and bulk
+
+Run from the repository root: python -m benchmarks.benchmark_dw_upsert
+
+Author: Vitor Abdo
+Date: Oct/2026
+'''
+
+# import necessary packages
+import logging
+import time
+import datetime
+import numpy as np
+import pandas as pd
+from decouple import config
+
+from components.dw_management import create_table_into_postgresql
+from components.dw_management import insert_data_into_postgresql
+from components.dw_management import upsert_small_batch_into_postgresql
+
+logging.basicConfig(
+    level=logging.WARNING,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S')
+
+# config
+ENDPOINT_NAME = config('ENDPOINT_NAME')
+PORT = config('PORT')
+DB_NAME = config('DB_NAME')
+USER = config('USER')
+PASSWORD = config('PASSWORD')
+DW_SCHEMA_TO_CREATE = config('DW_SCHEMA_TO_CREATE')
+DW_TEMP_SCHEMA_TO_CREATE = config('DW_TEMP_SCHEMA_TO_CREATE')
+
+BENCH_TABLE_NAME = 'bench_upsert'
+BATCH_SIZES = [1, 10, 100, 1000, 10000]
+REPEATS = 5
+
+
+def make_batch(n_rows: int, offset: int) -> pd.DataFrame:
+    '''
+    Create a processed-like dataframe with unique dates.
+
+    :param n_rows: (int) Number of rows.
+    :param offset: (int) Day offset of the first date, so batches never conflict.
+
+    :return batch: (pd.DataFrame) dataframe with the processed table columns.
+    '''
+    now = datetime.datetime.now()
+    dates = pd.date_range('1900-01-01', periods=n_rows) + pd.Timedelta(days=offset)
+    return pd.DataFrame({
+        'id': np.random.randint(1, 2147483647, n_rows),
+        'date': dates.astype(str),
+        'price_amplitude': np.random.normal(size=n_rows),
+        'created_at': now,
+        'updated_at': now})
+
+
+if __name__ == "__main__":
+    # the components configure INFO logging on import, keep the benchmark output readable
+    logging.getLogger().setLevel(logging.WARNING)
+
+    table_columns = '''
+    id INT,
+    date TEXT,
+    price_amplitude FLOAT,
+    created_at TEXT,
+    updated_at TEXT,
+    PRIMARY KEY (date)
+    '''
+    create_table_into_postgresql(
+        ENDPOINT_NAME, PORT, DB_NAME, USER, PASSWORD, DW_SCHEMA_TO_CREATE, BENCH_TABLE_NAME, table_columns)
+
+    offset = 0
+    print(f'{"rows":>8} {"small-batch ms":>16} {"bulk ms":>10}')
+    for n_rows in BATCH_SIZES:
+        timings = {'small': [], 'bulk': []}
+        for _ in range(REPEATS):
+            for path in timings:
+                batch = make_batch(n_rows, offset)
+                offset += n_rows
+
+                start = time.perf_counter()
+                if path == 'small':
+                    upsert_small_batch_into_postgresql(
+                        ENDPOINT_NAME, PORT, DB_NAME, USER, PASSWORD, DW_SCHEMA_TO_CREATE, BENCH_TABLE_NAME, batch)
+                else:
+                    insert_data_into_postgresql(
+                        ENDPOINT_NAME, PORT, DB_NAME, USER, PASSWORD, DW_SCHEMA_TO_CREATE, BENCH_TABLE_NAME,
+                        batch, DW_TEMP_SCHEMA_TO_CREATE, small_batch_max_rows=0)
+                timings[path].append((time.perf_counter() - start) * 1000)
+
+        print(f'{n_rows:>8} {np.median(timings["small"]):>16.1f} {np.median(timings["bulk"]):>10.1f}')
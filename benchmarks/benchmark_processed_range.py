@@ -0,0 +1,95 @@
+'''
+Script to benchmark range reads of the processed layer:
+one partition at a time against the bounded thread pool
+
+Run from the repository root: python -m benchmarks.benchmark_processed_range
+By default it reads a temporary local lake. Set LAKE_BACKEND=s3 and the
+S3 variables to read the partitions already in the bucket instead.
+
+Author: Vitor Abdo
+Date: Oct/2026
+'''
+
+# import necessary packages
+import os
+import shutil
+import logging
+import datetime
+import tempfile
+import numpy as np
+import pandas as pd
+from decouple import config
+
+from components.lake_backend import LocalLakeBackend, get_lake_backend
+from components.create_s3_processed import get_range_from_processed_layer
+
+logging.basicConfig(
+    level=logging.WARNING,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S')
+
+# config
+LAKE_BACKEND = config('LAKE_BACKEND', default='local')
+N_ASSETS = 10
+N_DAYS = 60
+ROWS_PER_PARTITION = 1000
+WORKER_COUNTS = [1, 4, 16, 32]
+
+
+def make_local_lake(root_dir: str) -> tuple:
+    '''
+    Write N_ASSETS x N_DAYS processed partitions in a local lake.
+
+    :param root_dir: (str) Directory of the lake.
+
+    :return (backend, assets, start_date, end_date): the lake and the range to read.
+    '''
+    backend = LocalLakeBackend(root_dir)
+    assets = [f'syn{i:03d}' for i in range(N_ASSETS)]
+    days = pd.date_range('2023-01-01', periods=N_DAYS).date
+    now = datetime.datetime.now()
+    local_file = os.path.join(root_dir, 'partition.parquet')
+    os.makedirs(root_dir, exist_ok=True)
+
+    for asset in assets:
+        for day in days:
+            pd.DataFrame({
+                'id': np.random.randint(1, 2147483647, ROWS_PER_PARTITION).astype(float),
+                'date': pd.date_range(end=day, periods=ROWS_PER_PARTITION).astype(str),
+                'price_amplitude': np.random.normal(size=ROWS_PER_PARTITION),
+                'created_at': now,
+                'updated_at': now}).to_parquet(local_file, compression='gzip')
+            backend.put_file(
+                local_file,
+                f'processed/crypto_anomaly_detect/{asset}/extracted_at={day}/processed_{asset}_historical_data.parquet')
+
+    os.remove(local_file)
+    return backend, assets, str(days[0]), str(days[-1])
+
+
+if __name__ == "__main__":
+    # the components configure the root logger at import, keep the table readable
+    logging.getLogger().setLevel(logging.WARNING)
+
+    workdir = None
+    if LAKE_BACKEND == 'local':
+        workdir = tempfile.mkdtemp(prefix='processed_range_')
+        backend, assets, start_date, end_date = make_local_lake(workdir)
+    else:
+        backend = get_lake_backend(
+            LAKE_BACKEND, config('BUCKET_NAME'), config('AWS_ACCESS_KEY_ID'),
+            config('AWS_SECRET_ACCESS_KEY'), config('AWS_REGION'))
+        assets = config('BENCH_ASSETS', default='eth').split(',')
+        start_date = config('BENCH_START_DATE', default='2023-01-01')
+        end_date = config('BENCH_END_DATE', default=str(datetime.date.today()))
+
+    try:
+        print(f'{"workers":>8} {"objects":>8} {"seconds":>8} {"objects/s":>10} {"MB/s":>8}')
+        for max_workers in WORKER_COUNTS:
+            _, stats = get_range_from_processed_layer(
+                '', '', '', '', start_date, end_date, assets, backend, max_workers, return_stats=True)
+            print(f'{max_workers:>8} {stats["objects"]:>8} {stats["seconds"]:>8.2f} '
+                  f'{stats["objects_per_s"]:>10.1f} {stats["mb_per_s"]:>8.1f}')
+    finally:
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
@@ -0,0 +1,55 @@
+'''
+Script to benchmark the single-pass sensitivity sweep
+against refitting the detector once per (k, sigma)
+
+Run from the repository root: python -m benchmarks.benchmark_sensitivity_sweep
+
+Author: Vitor Abdo
+Date: Oct/2026
+'''
+
+# import necessary packages
+import time
+import numpy as np
+
+from components.anomaly_detection_system import detect_outliers_iqr, sensitivity_sweep
+
+HISTORY_SIZES = [1000, 10000, 100000]
+KS = np.linspace(1.0, 3.0, 9)
+SIGMAS = np.linspace(2.0, 4.0, 9)
+
+
+def refit_grid(data: np.array) -> list:
+    '''
+    Evaluate the grid by refitting: one outlier elimination and fit per k, reused for every sigma.
+
+    :param data: (np.array) history of the ticker.
+
+    :return alerts: (list) number of alerts over the history per (k, sigma).
+    '''
+    alerts = []
+    for k in KS:
+        cleaned = data[~detect_outliers_iqr(data, k)]
+        mean, std = np.mean(cleaned), np.std(cleaned)
+        for sigma in SIGMAS:
+            alerts.append(int(np.sum(np.abs(data - mean) > sigma * std)))
+    return alerts
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+
+    print(f'{"history":>8} {"grid":>6} {"refit ms":>10} {"sweep ms":>10} {"speedup":>8}')
+    for n_values in HISTORY_SIZES:
+        data = np.round(rng.standard_t(3, n_values) * 10, 2)
+
+        start = time.perf_counter()
+        refit_alerts = refit_grid(data)
+        refit_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        sweep = sensitivity_sweep(data, KS, SIGMAS)
+        sweep_ms = (time.perf_counter() - start) * 1000
+
+        assert sweep['n_alerts'].tolist() == refit_alerts
+        print(f'{n_values:>8} {len(sweep):>6} {refit_ms:>10.1f} {sweep_ms:>10.1f} {refit_ms / sweep_ms:>8.1f}')
@@ -0,0 +1,62 @@
+'''
+Script to benchmark the batched fit of the volatility-adaptive
+detector against fitting the tickers one at a time
+
+Run from the repository root: python -m benchmarks.benchmark_volatility_fit
+
+Author: Vitor Abdo
+Date: Oct/2026
+'''
+
+# import necessary packages
+import time
+import numpy as np
+
+from components.anomaly_detection_system import VolatilityAdaptiveDetector
+
+TICKER_COUNTS = [10, 100, 1000]
+HISTORY_DAYS = 730
+MAX_TICKERS_ONE_AT_A_TIME = 100
+
+
+def simulate_garch(n_tickers: int, n_days: int, rng: np.random.Generator) -> np.array:
+    '''
+    Simulate GARCH(1,1) price amplitudes with parameters drawn per ticker.
+
+    :param n_tickers: (int) Number of tickers.
+    :param n_days: (int) Days of history.
+    :param rng: (np.random.Generator) Random generator.
+
+    :return data: (np.array) array of shape (n_tickers, n_days).
+    '''
+    alpha = rng.uniform(0.05, 0.15, n_tickers)
+    beta = rng.uniform(0.75, 0.97 - alpha)
+    omega = rng.uniform(0.01, 1.0, n_tickers)
+    data = np.zeros((n_tickers, n_days))
+    variance = omega / (1 - alpha - beta)
+    for t in range(n_days):
+        data[:, t] = rng.normal(size=n_tickers) * np.sqrt(variance)
+        variance = omega + alpha * data[:, t] ** 2 + beta * variance
+    return data
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+
+    print(f'{"tickers":>8} {"model":>6} {"batched s":>10} {"one at a time s":>16} {"speedup":>8}')
+    for n_tickers in TICKER_COUNTS:
+        data = simulate_garch(n_tickers, HISTORY_DAYS, rng)
+
+        for model in ('garch', 'ewma'):
+            start = time.perf_counter()
+            VolatilityAdaptiveDetector(model).fit(data)
+            batched = time.perf_counter() - start
+
+            if n_tickers <= MAX_TICKERS_ONE_AT_A_TIME:
+                start = time.perf_counter()
+                for series in data:
+                    VolatilityAdaptiveDetector(model).fit(series)
+                one_at_a_time = time.perf_counter() - start
+                print(f'{n_tickers:>8} {model:>6} {batched:>10.2f} {one_at_a_time:>16.2f} {one_at_a_time / batched:>8.1f}')
+            else:
+                print(f'{n_tickers:>8} {model:>6} {batched:>10.2f} {"-":>16} {"-":>8}')
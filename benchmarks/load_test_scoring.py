@@ -0,0 +1,164 @@
+'''
+Script to load test the scoring service: concurrent keep-alive
+clients send single or batch scoring requests for a fixed time,
+and the latency percentiles and throughput are reported
+
+Run from the repository root: python -m benchmarks.load_test_scoring
+By default it starts the service in a separate process on a temporary
+local lake with synthetic detector states. Pass --port (and --host)
+to load test a service that is already running instead.
+
+Author: Vitor Abdo
+Date: Oct/2026
+'''
+
+# import necessary packages
+import json
+import time
+import shutil
+import asyncio
+import logging
+import argparse
+import tempfile
+import multiprocessing
+import numpy as np
+
+from components.lake_backend import LocalLakeBackend
+from components.scoring_service import DetectorStateStore, ScoringService, publish_detector_state
+
+logging.basicConfig(
+    level=logging.WARNING,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S')
+
+
+def make_state_lake(root_dir: str, n_tickers: int) -> list:
+    '''
+    Publish synthetic detector states in a local lake.
+
+    :param root_dir: (str) Directory of the lake.
+    :param n_tickers: (int) Number of tickers.
+
+    :return tickers: (list) the tickers with a state.
+    '''
+    backend = LocalLakeBackend(root_dir)
+    rng = np.random.default_rng(0)
+    tickers = [f'SYN{i:05d}-USD' for i in range(n_tickers)]
+    for ticker in tickers:
+        mean, std = rng.normal(0, 1), rng.uniform(1, 10)
+        publish_detector_state(backend, {
+            'ticker': ticker, 'fitted_at': '2023-01-01', 'iqr_lower_bound': mean - 3 * std,
+            'iqr_upper_bound': mean + 3 * std, 'mean': mean, 'std': std, 'threshold': 3 * std,
+            'detector_version': 'synthetic'})
+    return tickers
+
+
+def serve(root_dir: str, port: int, ready) -> None:
+    '''
+    Entry point of the service process.
+    '''
+    logging.getLogger().setLevel(logging.WARNING)
+
+    async def main():
+        service = ScoringService(DetectorStateStore(LocalLakeBackend(root_dir)), host='127.0.0.1', port=port)
+        await service.start()
+        ready.put(service.port)
+        await service.server.serve_forever()
+
+    asyncio.run(main())
+
+
+async def client(host: str, port: int, tickers: list, batch_size: int, deadline: float, latencies: list) -> None:
+    '''
+    Send requests over one keep-alive connection until the deadline.
+    '''
+    rng = np.random.default_rng()
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while time.perf_counter() < deadline:
+            if batch_size:
+                items = [{'ticker': tickers[i], 'value': float(v)}
+                         for i, v in zip(rng.integers(len(tickers), size=batch_size), rng.normal(0, 20, batch_size))]
+                body = json.dumps({'items': items}).encode()
+                request = (f'POST /score/batch HTTP/1.1\r\nHost: {host}\r\n'
+                           f'Content-Length: {len(body)}\r\n\r\n').encode() + body
+            else:
+                ticker = tickers[rng.integers(len(tickers))]
+                request = f'GET /score?ticker={ticker}&value={rng.normal(0, 20):.4f} HTTP/1.1\r\nHost: {host}\r\n\r\n'.encode()
+
+            start = time.perf_counter()
+            writer.write(request)
+            await writer.drain()
+
+            content_length = 0
+            status_line = await reader.readline()
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b''):
+                    break
+                if line.lower().startswith(b'content-length:'):
+                    content_length = int(line.split(b':')[1])
+            await reader.readexactly(content_length)
+            latencies.append(time.perf_counter() - start)
+
+            if b' 200 ' not in status_line:
+                raise RuntimeError(f'Unexpected response: {status_line!r}')
+    finally:
+        writer.close()
+
+
+async def load(host: str, port: int, tickers: list, concurrency: int, batch_size: int, duration: float) -> dict:
+    '''
+    Run the clients and summarize the latencies.
+    '''
+    latencies = []
+    deadline = time.perf_counter() + duration
+    start = time.perf_counter()
+    await asyncio.gather(*(client(host, port, tickers, batch_size, deadline, latencies) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        'requests': len(latencies),
+        'req_per_s': len(latencies) / elapsed,
+        'scores_per_s': len(latencies) * max(batch_size, 1) / elapsed,
+        'p50_ms': float(np.percentile(latencies_ms, 50)),
+        'p99_ms': float(np.percentile(latencies_ms, 99)),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Load test of the scoring service.')
+    parser.add_argument('--host', default='127.0.0.1', help='Host of a running service.')
+    parser.add_argument('--port', type=int, help='Port of a running service, a local one is started if not given.')
+    parser.add_argument('--tickers', type=int, default=1000, help='Synthetic tickers of the local service.')
+    parser.add_argument('--concurrency', type=int, default=32, help='Concurrent keep-alive connections.')
+    parser.add_argument('--duration', type=float, default=10, help='Seconds of load per scenario.')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[0, 100],
+                        help='Items per request of each scenario, 0 for the single scoring endpoint.')
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    workdir, service_process = None, None
+    port = args.port
+    if port is None:
+        workdir = tempfile.mkdtemp(prefix='load_test_scoring_')
+        tickers = make_state_lake(workdir, args.tickers)
+        ready = multiprocessing.Queue()
+        service_process = multiprocessing.Process(target=serve, args=(workdir, 0, ready), daemon=True)
+        service_process.start()
+        port = ready.get(timeout=60)
+    else:
+        tickers = [f'SYN{i:05d}-USD' for i in range(args.tickers)]
+
+    try:
+        print(f'{"batch":>6} {"conns":>6} {"requests":>9} {"req/s":>9} {"scores/s":>10} {"p50 ms":>8} {"p99 ms":>8}')
+        for batch_size in args.batch_sizes:
+            result = asyncio.run(load(args.host, port, tickers, args.concurrency, batch_size, args.duration))
+            print(f'{batch_size:>6} {args.concurrency:>6} {result["requests"]:>9} {result["req_per_s"]:>9.0f} '
+                  f'{result["scores_per_s"]:>10.0f} {result["p50_ms"]:>8.2f} {result["p99_ms"]:>8.2f}')
+    finally:
+        if service_process is not None:
+            service_process.terminate()
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
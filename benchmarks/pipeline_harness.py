@@ -0,0 +1,364 @@
+'''
+Load and soak test harness that drives the full pipeline of main.py
+with local stand-ins: a synthetic Yahoo source, the local lake backend,
+a local Postgres and a local SMTP sink
+
+Run from the repository root, e.g.:
+python -m benchmarks.pipeline_harness --tickers 5000 --years 10 --dsn "host=localhost dbname=harness user=postgres"
+
+Author: Vitor Abdo
+Date: Oct/2026
+'''
+
+# import necessary packages
+import os
+import json
+import time
+import zlib
+import shutil
+import logging
+import argparse
+import datetime
+import resource
+import tempfile
+import threading
+import subprocess
+import socketserver
+import contextlib
+import numpy as np
+import pandas as pd
+from psycopg2.extensions import parse_dsn
+
+from components.get_api_data import CachedYahooSource, get_historical_data
+from components.lake_backend import LocalLakeBackend
+from components.create_s3_raw import move_files_to_raw_layer
+from components.create_s3_processed import move_files_to_processed_layer, get_files_from_processed_layer
+from components.dw_management import create_table_into_postgresql, insert_data_into_postgresql, cache_table_columns
+from components.dw_management import fetch_array_from_database, insert_anomaly_events
+from components.dw_migrations import apply_migrations, PROCESSED_TABLE_COLUMNS
+from components.anomaly_detection_system import AnomalyTransformer, AnomalyDetector
+from components.alert_system import send_gmail_message
+
+logging.basicConfig(
+    level=logging.WARNING,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S')
+
+STAGES = ['ingest', 'raw_layer', 'processed_layer', 'read_processed', 'dw_load', 'detect', 'alert']
+HARNESS_SCHEMA = 'harness'
+HARNESS_TEMP_SCHEMA = 'temp_harness'
+
+
+class _SmtpSinkHandler(socketserver.StreamRequestHandler):
+    '''
+    Minimal SMTP dialogue that accepts any login and keeps the messages in memory.
+    '''
+    def handle(self):
+        self.wfile.write(b'220 harness sink ready\r\n')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                break
+
+            command = line.decode(errors='replace').strip().upper()
+            if command.startswith('EHLO'):
+                self.wfile.write(b'250-harness sink\r\n250 AUTH PLAIN LOGIN\r\n')
+            elif command.startswith('AUTH'):
+                self.wfile.write(b'235 authenticated\r\n')
+            elif command == 'DATA':
+                self.wfile.write(b'354 end with <CRLF>.<CRLF>\r\n')
+                message = []
+                for data_line in self.rfile:
+                    if data_line in (b'.\r\n', b'.\n'):
+                        break
+                    message.append(data_line)
+                with self.server.lock:
+                    self.server.messages.append(b''.join(message))
+                self.wfile.write(b'250 queued\r\n')
+            elif command == 'QUIT':
+                self.wfile.write(b'221 bye\r\n')
+                break
+            else:
+                self.wfile.write(b'250 ok\r\n')
+
+
+class SmtpSink:
+    def __init__(self):
+        '''
+        SmtpSink class, a local SMTP server on a free port that stores the alerts it receives.
+        '''
+        self.server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), _SmtpSinkHandler)
+        self.server.daemon_threads = True
+        self.server.messages = []
+        self.server.lock = threading.Lock()
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self) -> 'SmtpSink':
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
+
+    @property
+    def messages(self) -> list:
+        return self.server.messages
+
+
+def synthetic_ohlcv(ticker: str, start_date: str, end_date: str, interval: str = '1d') -> pd.DataFrame:
+    '''
+    Stub of the Yahoo Finance download: a deterministic random walk per ticker
+    with the same columns and index as yf.download.
+
+    :param ticker: (str) Ticker symbol, used as the random seed.
+    :param start_date: (str) Start date in the format 'YYYY-MM-DD'.
+    :param end_date: (str) End date (exclusive) in the format 'YYYY-MM-DD'.
+    :param interval: (str) Ignored, the candles are always daily.
+
+    :return data: (pd.DataFrame) OHLCV dataframe indexed by Date.
+    '''
+    dates = pd.date_range(start_date, end_date, inclusive='left', name='Date')
+    rng = np.random.default_rng(zlib.crc32(ticker.encode()))
+
+    returns = rng.standard_t(df=4, size=len(dates)) * 0.02
+    close = 100 * np.exp(np.cumsum(returns))
+    open_ = close * np.exp(rng.normal(0, 0.01, len(dates)))
+    high = np.maximum(open_, close) * (1 + rng.exponential(0.01, len(dates)))
+    low = np.minimum(open_, close) * (1 - rng.exponential(0.01, len(dates)))
+
+    return pd.DataFrame({
+        'Open': open_,
+        'High': high,
+        'Low': low,
+        'Close': close,
+        'Adj Close': close,
+        'Volume': rng.lognormal(15, 1, len(dates)).round(),
+    }, index=dates)
+
+
+class StageTimer:
+    def __init__(self):
+        '''
+        StageTimer class that collects the latency of every execution of each stage.
+        '''
+        self.latencies = {stage: [] for stage in STAGES}
+
+    @contextlib.contextmanager
+    def time(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.latencies[stage].append(time.perf_counter() - start)
+
+    def report(self) -> dict:
+        '''
+        Latency percentiles of each stage, in milliseconds.
+        '''
+        report = {}
+        for stage, values in self.latencies.items():
+            if not values:
+                continue
+            ms = np.array(values) * 1000
+            report[stage] = {
+                'count': len(values),
+                'total_s': float(ms.sum() / 1000),
+                'p50_ms': float(np.percentile(ms, 50)),
+                'p95_ms': float(np.percentile(ms, 95)),
+                'p99_ms': float(np.percentile(ms, 99)),
+                'max_ms': float(ms.max()),
+            }
+        return report
+
+
+def peak_rss_mb() -> float:
+    '''
+    Peak resident set size of this process, in MB (Linux reports ru_maxrss in KB).
+    '''
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def git_commit() -> str:
+    '''
+    Commit of the working tree, so reports can be compared across commits.
+    '''
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def run_ticker(ticker: str, args, source, backend, db, sink, timer, end_date, start_date) -> tuple:
+    '''
+    Run every stage of the pipeline for one ticker.
+
+    :return (rows, event): number of rows ingested and the anomaly event of the last day.
+    '''
+    asset = ticker.split('-')[0].lower()
+
+    with timer.time('ingest'):
+        raw_df = get_historical_data(ticker, start_date, end_date, source)
+
+    with timer.time('raw_layer'):
+        move_files_to_raw_layer('', '', '', '', raw_df, backend, asset)
+
+    with timer.time('processed_layer'):
+        move_files_to_processed_layer('', '', '', '', backend, asset)
+
+    with timer.time('read_processed'):
+        processed_data = get_files_from_processed_layer('', '', '', '', backend, asset)
+
+    if db is not None:
+        table_name = f'processed_{asset}_historical_data'
+        with timer.time('dw_load'):
+            insert_data_into_postgresql(
+                db['host'], db['port'], db['dbname'], db['user'], db['password'],
+                HARNESS_SCHEMA, table_name, processed_data, HARNESS_TEMP_SCHEMA, args.small_batch_max_rows)
+
+    with timer.time('detect'):
+        if db is not None:
+            history = fetch_array_from_database(
+                db['conn_string'],
+                f"SELECT price_amplitude, date::date - DATE '1970-01-01' FROM {HARNESS_SCHEMA}.{table_name} ORDER BY date")
+            price_amplitude = history[:, 0]
+            last_date = datetime.date(1970, 1, 1) + datetime.timedelta(days=int(history[-1, 1]))
+        else:
+            history = processed_data.sort_values('date')
+            price_amplitude = history['price_amplitude'].to_numpy()
+            last_date = pd.Timestamp(history['date'].iloc[-1]).date()
+
+        last_value = round(float(price_amplitude[-1]), 2)
+        anomaly_transformer = AnomalyTransformer(np.round(price_amplitude[:-1], 2))
+        anomaly_transformer.fit_transform()
+        transformed_data = anomaly_transformer.transformed_data
+        std = np.std(transformed_data)
+        detector = AnomalyDetector(transformed_data, np.mean(transformed_data), std, 3 * std)
+        event = detector.anomaly_event(ticker, str(last_date), last_value)
+
+    if event['is_anomaly']:
+        with timer.time('alert'):
+            send_gmail_message(
+                'harness@localhost', 'alerts@localhost', 'harness', f'Anomaly about {ticker} has been found!',
+                f'The anomaly detection system found an anomaly with a value of {last_value} '
+                f'and a p-value of {event["p_value"]}',
+                smtp_host='127.0.0.1', smtp_port=sink.port, use_tls=False)
+
+    return len(raw_df), event
+
+
+def run(args) -> dict:
+    '''
+    Run the harness and build the machine-readable report.
+    '''
+    workdir = args.workdir or tempfile.mkdtemp(prefix='pipeline_harness_')
+    backend = LocalLakeBackend(os.path.join(workdir, 'lake'))
+    source = CachedYahooSource(
+        cache_dir=os.path.join(workdir, 'yahoo_cache'), rate=1e9, burst=10 ** 6, downloader=synthetic_ohlcv)
+
+    end_date = datetime.date.today()
+    start_date = end_date - datetime.timedelta(days=int(365.25 * args.years))
+    tickers = [f'SYN{i:05d}-USD' for i in range(args.tickers)]
+
+    db = None
+    if args.dsn:
+        db = parse_dsn(args.dsn)
+        db.setdefault('host', 'localhost')
+        db.setdefault('port', '5432')
+        db.setdefault('password', '')
+        db['conn_string'] = args.dsn
+        db['table_columns'] = ', '.join(f'{name} {data_type}' for name, data_type in PROCESSED_TABLE_COLUMNS) \
+            + ', PRIMARY KEY (date)'
+        apply_migrations(
+            db['host'], db['port'], db['dbname'], db['user'], db['password'],
+            HARNESS_SCHEMA, HARNESS_TEMP_SCHEMA, 'processed_harness_historical_data')
+
+        # the tables are created once here, so the dw_load latency only measures the load
+        table_columns = [name for name, _ in PROCESSED_TABLE_COLUMNS]
+        for ticker in tickers:
+            table_name = f'processed_{ticker.split("-")[0].lower()}_historical_data'
+            create_table_into_postgresql(
+                db['host'], db['port'], db['dbname'], db['user'], db['password'],
+                HARNESS_SCHEMA, table_name, db['table_columns'])
+            cache_table_columns(HARNESS_SCHEMA, table_name, table_columns)
+
+    timer = StageTimer()
+    started_at = datetime.datetime.now()
+    iterations = []
+    try:
+        with SmtpSink() as sink:
+            for iteration in range(args.iterations):
+                start = time.perf_counter()
+                rows = 0
+                events = []
+                for ticker in tickers:
+                    n_rows, event = run_ticker(ticker, args, source, backend, db, sink, timer, end_date, start_date)
+                    rows += n_rows
+                    events.append(event)
+
+                if db is not None:
+                    insert_anomaly_events(db['conn_string'], HARNESS_SCHEMA, pd.DataFrame(events))
+
+                elapsed = time.perf_counter() - start
+                iterations.append({
+                    'iteration': iteration,
+                    'elapsed_s': elapsed,
+                    'tickers_per_s': len(tickers) / elapsed,
+                    'rows_per_s': rows / elapsed,
+                    'anomalies': int(sum(event['is_anomaly'] for event in events)),
+                    'peak_rss_mb': peak_rss_mb(),
+                })
+                print(f'iteration {iteration}: {elapsed:.1f}s, {len(tickers) / elapsed:.1f} tickers/s, '
+                      f'peak RSS {peak_rss_mb():.0f} MB')
+
+            alerts_received = len(sink.messages)
+
+    finally:
+        if not args.keep and not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        'commit': git_commit(),
+        'started_at': started_at.isoformat(),
+        'config': {
+            'tickers': args.tickers,
+            'years': args.years,
+            'iterations': args.iterations,
+            'dw': db is not None,
+            'small_batch_max_rows': args.small_batch_max_rows,
+        },
+        'iterations': iterations,
+        'stages': timer.report(),
+        'yahoo_source': source.stats(),
+        'alerts_received': alerts_received,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='End-to-end load and soak test of the pipeline.')
+    parser.add_argument('--tickers', type=int, default=50, help='Number of synthetic tickers.')
+    parser.add_argument('--years', type=float, default=1, help='Years of daily history per ticker.')
+    parser.add_argument('--iterations', type=int, default=1, help='Full passes over the universe (soak).')
+    parser.add_argument('--dsn', default=os.getenv('HARNESS_DSN'),
+                        help='libpq connection string of a local Postgres. The DW stage is skipped if empty.')
+    parser.add_argument('--small-batch-max-rows', type=int, default=1000,
+                        help='Row count above which the DW load uses the bulk path.')
+    parser.add_argument('--workdir', help='Directory of the local lake and cache (a temporary one if not given).')
+    parser.add_argument('--keep', action='store_true', help='Keep the temporary working directory.')
+    parser.add_argument('--report', default='harness_report.json', help='Path of the JSON report.')
+    args = parser.parse_args()
+
+    # the components configure INFO logging on import, keep the harness output readable
+    logging.getLogger().setLevel(logging.WARNING)
+
+    report = run(args)
+    with open(args.report, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print(f'{"stage":<16} {"count":>7} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9} {"max ms":>9}')
+    for stage, values in report['stages'].items():
+        print(f'{stage:<16} {values["count"]:>7} {values["p50_ms"]:>9.1f} {values["p95_ms"]:>9.1f} '
+              f'{values["p99_ms"]:>9.1f} {values["max_ms"]:>9.1f}')
+    print(f'peak RSS {report["peak_rss_mb"]:.0f} MB, report written to {args.report}')
@@ -18,7 +18,14 @@ logging.basicConfig(
 
 
 def send_gmail_message(
-        from_email: str, to_email: str, password: str, subject: str, body: str) -> None:
+        from_email: str,
+        to_email: str,
+        password: str,
+        subject: str,
+        body: str,
+        smtp_host: str = 'smtp.gmail.com',
+        smtp_port: int = 587,
+        use_tls: bool = True) -> None:
     '''
     Send an email using a Gmail account.
 
@@ -28,6 +35,9 @@ def send_gmail_message(
         password (str): The password for the Gmail account.
         subject (str): The subject of the email.
         body (str): The body of the email.
+        smtp_host (str): The SMTP server (default: 'smtp.gmail.com').
+        smtp_port (int): The SMTP server port (default: 587).
+        use_tls (bool): Whether to upgrade the connection with STARTTLS (default: True).
 
     Raises:
         smtplib.SMTPAuthenticationError: If the login credentials are incorrect.
@@ -39,8 +49,9 @@ def send_gmail_message(
     '''
     try:
         # connect to the SMTP server and login
-        with smtplib.SMTP('smtp.gmail.com', 587) as server:
-            server.starttls()
+        with smtplib.SMTP(smtp_host, smtp_port) as server:
+            if use_tls:
+                server.starttls()
             server.login(from_email, password)
 
             # create the message and send the email
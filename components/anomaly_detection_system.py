@@ -6,9 +6,14 @@ Data: July/2023
 '''
 
 # import necessary packages
+import datetime
 import numpy as np
+import pandas as pd
 from scipy import stats
 
+# version recorded with every anomaly event, bump it when the detection logic changes
+DETECTOR_VERSION = 'iqr-3sigma-1'
+
 
 def detect_outliers_iqr(data: np.array, k=1.5, return_thresholds=False) -> np.array:
     '''
@@ -113,3 +118,683 @@ class AnomalyDetector:
         z_score = (value - self.mean) / self.std
         p_value = 2 * (1 - stats.norm.cdf(abs(z_score)))
         return p_value
+
+    def anomaly_event(self, ticker: str, date: str, value: float) -> dict:
+        '''
+        Generate the record of a scored value to be persisted in the anomaly events table.
+
+        Parameters:
+            ticker (str): The ticker symbol (e.g., 'ETH-USD').
+            date (str): The day of the value in the format 'YYYY-MM-DD'.
+            value (float): The value that was scored.
+
+        Returns:
+            event (dict): Ticker, date, value, z-score, p-value, bounds, anomaly flag and detector version.
+        '''
+        return {
+            'ticker': ticker,
+            'date': date,
+            'value': value,
+            'z_score': (value - self.mean) / self.std,
+            'p_value': self.anomaly_report(value),
+            'lower_bound': self.mean - self.threshold,
+            'upper_bound': self.mean + self.threshold,
+            'is_anomaly': self.is_anomaly(value),
+            'detector_version': DETECTOR_VERSION,
+        }
+
+
+def _sorted_percentile(sorted_data: np.array, q: float) -> float:
+    '''
+    Percentile of already sorted data, with the linear interpolation of np.percentile.
+    '''
+    position = q / 100 * (len(sorted_data) - 1)
+    lower = int(np.floor(position))
+    upper = min(lower + 1, len(sorted_data) - 1)
+    return sorted_data[lower] + (position - lower) * (sorted_data[upper] - sorted_data[lower])
+
+
+def sensitivity_sweep(
+        data: np.array,
+        ks: list = (1.0, 1.5, 2.0, 2.5, 3.0),
+        sigmas: list = (2.0, 2.5, 3.0, 3.5, 4.0),
+        value: float = None) -> pd.DataFrame:
+    '''
+    Evaluate the detector for a whole grid of IQR multipliers k and sigma multipliers
+    in one pass: the history is sorted once, the cleaned mean and std of each k come from
+    prefix sums over the kept slice, and the alerts of each (k, sigma) from searchsorted.
+    Each row matches AnomalyTransformer(k) followed by AnomalyDetector(threshold=sigma * std).
+
+    Parameters:
+        data (array-like): History of the ticker, NaN values are ignored.
+        ks (list): IQR multipliers used to eliminate the outliers (default: 1.0 to 3.0).
+        sigmas (list): Multipliers of the cleaned std used as threshold (default: 2.0 to 4.0).
+        value (float): Value to score with every combination, e.g. the last day (default: None).
+
+    Returns:
+        sweep (pd.DataFrame): One row per (k, sigma) with the number of kept values, the cleaned
+        mean and std, the detection bounds, the number and rate of alerts over the history and,
+        if a value was given, whether it is an anomaly.
+
+    Raises:
+        ValueError: If the history is empty or all NaN.
+    '''
+    sorted_data = np.sort(np.asarray(data, dtype=float))
+    sorted_data = sorted_data[~np.isnan(sorted_data)]
+    n_values = len(sorted_data)
+    if n_values == 0:
+        raise ValueError('The history has no values to run the sensitivity sweep on')
+    ks = np.asarray(ks, dtype=float)
+    sigmas = np.asarray(sigmas, dtype=float)
+
+    # the quartiles do not depend on k
+    q25, q75 = _sorted_percentile(sorted_data, 25), _sorted_percentile(sorted_data, 75)
+    iqr = q75 - q25
+
+    # kept slice of each k: lower <= x <= upper, as in detect_outliers_iqr
+    start = np.searchsorted(sorted_data, q25 - ks * iqr, side='left')
+    stop = np.searchsorted(sorted_data, q75 + ks * iqr, side='right')
+    n_kept = stop - start
+
+    # prefix sums of the values shifted by the median, which keeps the variance accurate
+    shift = _sorted_percentile(sorted_data, 50)
+    shifted = sorted_data - shift
+    sums = np.concatenate([[0.0], np.cumsum(shifted)])
+    squares = np.concatenate([[0.0], np.cumsum(shifted ** 2)])
+
+    mean_shifted = (sums[stop] - sums[start]) / n_kept
+    variance = (squares[stop] - squares[start]) / n_kept - mean_shifted ** 2
+    mean = mean_shifted + shift
+    std = np.sqrt(np.maximum(variance, 0))
+
+    # alerts of each (k, sigma): x < mean - threshold or x > mean + threshold
+    threshold = std[:, None] * sigmas[None, :]
+    lower_bound = mean[:, None] - threshold
+    upper_bound = mean[:, None] + threshold
+    n_alerts = np.searchsorted(sorted_data, lower_bound, side='left') \
+        + n_values - np.searchsorted(sorted_data, upper_bound, side='right')
+
+    sweep = pd.DataFrame({
+        'k': np.repeat(ks, len(sigmas)),
+        'sigma': np.tile(sigmas, len(ks)),
+        'n_kept': np.repeat(n_kept, len(sigmas)),
+        'mean': np.repeat(mean, len(sigmas)),
+        'std': np.repeat(std, len(sigmas)),
+        'lower_bound': lower_bound.ravel(),
+        'upper_bound': upper_bound.ravel(),
+        'n_alerts': n_alerts.ravel(),
+        'alert_rate': n_alerts.ravel() / n_values,
+    })
+
+    if value is not None:
+        sweep['is_anomaly'] = (value < sweep['lower_bound']) | (value > sweep['upper_bound'])
+
+    return sweep
+
+
+def sensitivity_sweep_tickers(histories: dict, ks: list = (1.0, 1.5, 2.0, 2.5, 3.0),
+                              sigmas: list = (2.0, 2.5, 3.0, 3.5, 4.0)) -> pd.DataFrame:
+    '''
+    Run the sensitivity sweep for several tickers. A ticker whose history is empty or
+    all NaN has no alert rate and is left out, the others are still swept.
+
+    Parameters:
+        histories (dict): Mapping from ticker to its history.
+        ks (list): IQR multipliers used to eliminate the outliers.
+        sigmas (list): Multipliers of the cleaned std used as threshold.
+
+    Returns:
+        sweep (pd.DataFrame): The sweep of every ticker, with a leading 'ticker' column.
+
+    Raises:
+        ValueError: If no ticker has a value.
+    '''
+    sweeps = []
+    for ticker, data in histories.items():
+        if np.isnan(np.asarray(data, dtype=float)).all():
+            continue
+        sweep = sensitivity_sweep(data, ks, sigmas)
+        sweep.insert(0, 'ticker', ticker)
+        sweeps.append(sweep)
+
+    if not sweeps:
+        raise ValueError('No ticker has a value to run the sensitivity sweep on')
+    return pd.concat(sweeps, ignore_index=True)
+
+
+def select_thresholds(sweep: pd.DataFrame, target_alert_rate: float = 0.01) -> pd.DataFrame:
+    '''
+    Pick, for each ticker, the (k, sigma) whose alert rate over the history is the closest
+    to a target. Ties go to the largest sigma, then the largest k, i.e. the fewest alerts.
+
+    Parameters:
+        sweep (pd.DataFrame): Output of sensitivity_sweep_tickers.
+        target_alert_rate (float): Wanted fraction of days flagged (default: 0.01).
+
+    Returns:
+        thresholds (pd.DataFrame): One row of the sweep per ticker.
+    '''
+    ranked = sweep.assign(distance=(sweep['alert_rate'] - target_alert_rate).abs()) \
+        .sort_values(['ticker', 'distance', 'sigma', 'k'], ascending=[True, True, False, False])
+    return ranked.groupby('ticker', sort=False).head(1).drop(columns='distance').reset_index(drop=True)
+
+
+# columns of the Yahoo Finance dataframe used by the multivariate detector
+OHLCV_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+
+def build_ohlcv_features(data: pd.DataFrame) -> np.array:
+    '''
+    Build scale-free features from all the OHLCV columns of a Yahoo Finance dataframe.
+
+    Parameters:
+        data (pd.DataFrame): Dataframe with the Open, High, Low, Close and Volume columns.
+
+    Returns:
+        features (array-like): Array of shape (n_rows, 5) with, in this order, the price amplitude,
+        the high-low range, the upper shadow and the lower shadow (all relative to Open),
+        and the log volume.
+    '''
+    open_, high, low, close, volume = (data[col].to_numpy(dtype=float) for col in OHLCV_COLUMNS)
+
+    body_top = np.maximum(open_, close)
+    body_bottom = np.minimum(open_, close)
+
+    features = np.column_stack([
+        (close - open_) / open_,
+        (high - low) / open_,
+        (high - body_top) / open_,
+        (body_bottom - low) / open_,
+        np.log1p(volume),
+    ])
+    return features
+
+
+def stack_ticker_features(frames: dict) -> tuple:
+    '''
+    Stack the OHLCV features of several tickers in a single padded array so that
+    the multivariate detector can be fitted for all of them at once.
+
+    Parameters:
+        frames (dict): Mapping from ticker to its Yahoo Finance dataframe.
+
+    Returns:
+        tickers (list): Tickers in the order of the first axis.
+        features (array-like): Array of shape (n_tickers, max_rows, 5), padded with NaN.
+    '''
+    tickers = list(frames)
+    per_ticker = [build_ohlcv_features(frames[ticker]) for ticker in tickers]
+    max_rows = max((len(f) for f in per_ticker), default=0)
+
+    features = np.full((len(tickers), max_rows, len(OHLCV_COLUMNS)), np.nan)
+    for i, f in enumerate(per_ticker):
+        features[i, max_rows - len(f):] = f
+
+    return tickers, features
+
+
+def _weighted_moments(data: np.array, weights: np.array) -> tuple:
+    '''
+    Weighted mean and covariance of each ticker of a (n_tickers, n_rows, n_features) array.
+    '''
+    total = weights.sum(axis=1)[:, None]
+    location = np.einsum('kn,knp->kp', weights, data) / total
+    centered = data - location[:, None, :]
+    covariance = np.einsum('kn,kni,knj->kij', weights, centered, centered) / total[:, :, None]
+    return location, covariance
+
+
+def _mahalanobis(data: np.array, location: np.array, precision: np.array) -> np.array:
+    '''
+    Squared Mahalanobis distances of a (n_tickers, n_rows, n_features) array.
+    '''
+    centered = data - location[:, None, :]
+    return np.einsum('kni,kij,knj->kn', centered, precision, centered)
+
+
+def _smallest_mask(distances: np.array, h: np.array) -> np.array:
+    '''
+    Weights equal to 1 for the h smallest distances of each ticker and 0 elsewhere.
+    '''
+    order = np.argsort(distances, axis=1)
+    ranks = np.empty_like(order)
+    np.put_along_axis(ranks, order, np.arange(distances.shape[1])[None, :], axis=1)
+    return (ranks < h[:, None]).astype(float)
+
+
+class MultivariateAnomalyDetector:
+    def __init__(self, support_fraction: float = 0.75, n_steps: int = 20, shrinkage: float = 0.0, alpha: float = 0.001):
+        '''
+        MultivariateAnomalyDetector class for detecting anomalies on feature vectors
+        (e.g. the OHLCV features) with a robust covariance and the Mahalanobis distance.
+        The covariance is a minimum covariance determinant (MCD) estimate obtained
+        with concentration steps, computed for every ticker at once.
+
+        Parameters:
+            support_fraction (float): Fraction of the rows used by the MCD estimate (default: 0.75).
+            n_steps (int): Maximum number of concentration steps (default: 20).
+            shrinkage (float): Weight of the shrinkage towards the diagonal, from 0 to 1 (default: 0.0).
+            alpha (float): Significance level of the chi-square cutoff (default: 0.001).
+        '''
+        self.support_fraction = support_fraction
+        self.n_steps = n_steps
+        self.shrinkage = shrinkage
+        self.alpha = alpha
+        self.location = None
+        self.covariance = None
+        self.precision = None
+        self.threshold = None
+
+    def fit(self, features: np.array) -> 'MultivariateAnomalyDetector':
+        '''
+        Fit the robust location and covariance of each ticker.
+
+        Parameters:
+            features (array-like): Array of shape (n_tickers, n_rows, n_features),
+            or (n_rows, n_features) for a single ticker. Rows with NaN are ignored.
+
+        Returns:
+            self (MultivariateAnomalyDetector): The fitted detector.
+        '''
+        data = np.asarray(features, dtype=float)
+        if data.ndim == 2:
+            data = data[None]
+        n_features = data.shape[2]
+
+        valid = ~np.isnan(data).any(axis=2)
+        data = np.where(valid[:, :, None], data, 0.0)
+        h = np.maximum(np.floor(self.support_fraction * valid.sum(axis=1)), n_features + 1)
+
+        # start from the rows closest to the coordinate-wise median, scaled by the MAD
+        masked = np.where(valid[:, :, None], data, np.nan)
+        median = np.nanmedian(masked, axis=1)
+        mad = np.nanmedian(np.abs(masked - median[:, None, :]), axis=1)
+        mad = np.where(mad > 0, mad, 1.0)
+        distances = np.where(valid, (((data - median[:, None, :]) / mad[:, None, :]) ** 2).sum(axis=2), np.inf)
+        weights = _smallest_mask(distances, h)
+
+        # concentration steps: refit on the h rows with the smallest distances
+        for _ in range(self.n_steps):
+            location, covariance = _weighted_moments(data, weights)
+            precision = np.linalg.pinv(covariance, hermitian=True)
+            distances = np.where(valid, _mahalanobis(data, location, precision), np.inf)
+            new_weights = _smallest_mask(distances, h)
+            if np.array_equal(new_weights, weights):
+                break
+            weights = new_weights
+
+        location, covariance = _weighted_moments(data, weights)
+        precision = np.linalg.pinv(covariance, hermitian=True)
+
+        # consistency correction so that the distances follow a chi-square under normality
+        distances = np.where(valid, _mahalanobis(data, location, precision), np.nan)
+        correction = np.nanmedian(distances, axis=1) / stats.chi2.ppf(0.5, n_features)
+        covariance = covariance * np.where(correction > 0, correction, 1.0)[:, None, None]
+
+        if self.shrinkage > 0:
+            target = np.trace(covariance, axis1=1, axis2=2)[:, None, None] / n_features * np.eye(n_features)
+            covariance = (1 - self.shrinkage) * covariance + self.shrinkage * target
+
+        self.location = location
+        self.covariance = covariance
+        self.precision = np.linalg.pinv(covariance, hermitian=True)
+        self.threshold = stats.chi2.ppf(1 - self.alpha, n_features)
+        return self
+
+    def score(self, features: np.array) -> np.array:
+        '''
+        Squared Mahalanobis distance of new rows to the fitted distribution of each ticker.
+
+        Parameters:
+            features (array-like): Array of shape (n_tickers, n_features) with one row per ticker,
+            or (n_tickers, n_rows, n_features) to score a batch of rows per ticker.
+
+        Returns:
+            distances (array-like): Array of shape (n_tickers,) or (n_tickers, n_rows).
+        '''
+        data = np.asarray(features, dtype=float)
+        if data.ndim == 2:
+            return _mahalanobis(data[:, None, :], self.location, self.precision)[:, 0]
+        return _mahalanobis(data, self.location, self.precision)
+
+    def is_anomaly(self, features: np.array) -> np.array:
+        '''
+        Check if new rows are anomalies based on the chi-square cutoff.
+
+        Parameters:
+            features (array-like): Same layout as in score.
+
+        Returns:
+            is_anomaly (array-like): Boolean mask with the shape of the distances.
+        '''
+        return self.score(features) > self.threshold
+
+    def anomaly_report(self, features: np.array) -> np.array:
+        '''
+        Generate the p-values of new rows under the chi-square distribution of the distances.
+
+        Parameters:
+            features (array-like): Same layout as in score.
+
+        Returns:
+            p_value (array-like): P-values with the shape of the distances.
+        '''
+        return stats.chi2.sf(self.score(features), self.location.shape[1])
+
+
+def _conditional_variance_log_likelihood(
+        squared: np.array, observed: np.array, omega: np.array, alpha: np.array, beta: np.array,
+        initial_variance: np.array) -> tuple:
+    '''
+    Gaussian log-likelihood of GARCH(1,1) candidates, sigma2[t+1] = omega + alpha * e[t]^2 + beta * sigma2[t],
+    evaluated for every ticker and candidate at once. EWMA is the case omega = 0, alpha + beta = 1.
+
+    Parameters:
+        squared (array-like): Squared residuals of shape (n_tickers, n_days), 0 where missing.
+        observed (array-like): Boolean mask of shape (n_tickers, n_days), a missing day keeps the variance.
+        omega, alpha, beta (array-like): Candidates of shape (n_tickers, n_candidates).
+        initial_variance (array-like): Variance of the first day, shape (n_tickers, 1).
+
+    Returns:
+        log_likelihood (array-like): Shape (n_tickers, n_candidates), without the constant term.
+        forecast (array-like): Variance forecast of the day after the history, same shape.
+    '''
+    variance = np.broadcast_to(initial_variance, alpha.shape).copy()
+    log_likelihood = np.zeros(alpha.shape)
+
+    for t in range(squared.shape[1]):
+        e2 = squared[:, t:t + 1]
+        seen = observed[:, t:t + 1]
+        log_likelihood -= np.where(seen, 0.5 * (np.log(variance) + e2 / variance), 0.0)
+        variance = np.where(seen, omega + alpha * e2 + beta * variance, variance)
+
+    return log_likelihood, variance
+
+
+class VolatilityAdaptiveDetector:
+    def __init__(self, model: str = 'garch', sigma: float = 3.0, grid_size: int = 12, refine_steps: int = 2):
+        '''
+        VolatilityAdaptiveDetector class for detecting anomalies against the volatility of the day
+        instead of one std over the whole history: each value is scored with the conditional
+        variance forecast of a GARCH(1,1) or EWMA model, so a move is judged relative to the
+        current regime. The parameters of every ticker are fitted at once, by evaluating the
+        likelihood of a grid of candidates for all tickers in a single vectorized recursion,
+        refined around the best candidate of each ticker. The daily forecast is an O(1) update.
+
+        GARCH(1,1) uses variance targeting, omega = (1 - alpha - beta) * unconditional variance,
+        so only alpha and beta are fitted. EWMA fits the decay lambda (alpha = 1 - lambda, beta = lambda).
+
+        Parameters:
+            model (str): 'garch' or 'ewma' (default: 'garch').
+            sigma (float): Number of conditional standard deviations used as threshold (default: 3.0).
+            grid_size (int): Candidates per parameter in the first grid (default: 12).
+            refine_steps (int): Finer grids around the best candidate of each ticker (default: 2).
+        '''
+        if model not in ('garch', 'ewma'):
+            raise ValueError(f"Unknown volatility model '{model}', expected 'garch' or 'ewma'")
+        self.model = model
+        self.sigma = sigma
+        self.grid_size = grid_size
+        self.refine_steps = refine_steps
+        self.mean = None
+        self.omega = None
+        self.alpha = None
+        self.beta = None
+        self.variance = None
+        self.log_likelihood = None
+        self.fitted = None
+
+    @property
+    def detector_version(self) -> str:
+        '''
+        Version recorded with the anomaly events of this detector.
+        '''
+        return f'{self.model}-{self.sigma:g}sigma-1'
+
+    def fit(self, history: np.array) -> 'VolatilityAdaptiveDetector':
+        '''
+        Fit the volatility model of each ticker and forecast the variance of the next day.
+
+        Parameters:
+            history (array-like): Price amplitudes of shape (n_tickers, n_days), oldest day first,
+            or (n_days,) for a single ticker. NaN values (e.g. padding of shorter histories) are skipped.
+            Tickers with fewer than two values are not fitted: their parameters are NaN, their
+            scores NaN and they are never flagged.
+
+        Returns:
+            self (VolatilityAdaptiveDetector): The fitted detector.
+        '''
+        data = np.asarray(history, dtype=float)
+        if data.ndim == 1:
+            data = data[None]
+
+        self.fitted = (~np.isnan(data)).sum(axis=1) >= 2
+        n_tickers = len(data)
+        data = data[self.fitted]
+        if not len(data):
+            raise ValueError('No ticker has at least two values to fit the volatility model on')
+
+        observed = ~np.isnan(data)
+        self.mean = np.nanmean(data, axis=1)
+        residuals = np.where(observed, data - self.mean[:, None], 0.0)
+        squared = residuals ** 2
+        unconditional = np.maximum(np.nanvar(data, axis=1), np.finfo(float).tiny)[:, None]
+
+        # first grid, shared by all tickers: (alpha, persistence) or lambda
+        if self.model == 'garch':
+            alpha_grid, persistence_grid = np.meshgrid(
+                np.linspace(0.01, 0.3, self.grid_size), np.linspace(0.5, 0.995, self.grid_size))
+            valid = persistence_grid > alpha_grid
+            first = np.stack([alpha_grid[valid], persistence_grid[valid]])
+            steps = np.array([0.29, 0.495]) / (self.grid_size - 1)
+            lower, upper = np.array([1e-4, 0.0]), np.array([0.999, 0.9995])
+        else:
+            first = np.linspace(0.8, 0.995, self.grid_size)[None]
+            steps = np.array([0.195]) / (self.grid_size - 1)
+            lower, upper = np.array([0.5]), np.array([0.9995])
+
+        candidates = np.broadcast_to(first[:, None, :], (len(first), len(data), first.shape[1]))
+        best, log_likelihood, forecast = self._best_candidates(candidates, squared, observed, unconditional)
+
+        # finer grids centred on the best candidate of each ticker
+        offsets = np.linspace(-1, 1, 5)
+        for _ in range(self.refine_steps):
+            mesh = np.stack(np.meshgrid(*[offsets] * len(steps), indexing='ij')).reshape(len(steps), -1)
+            candidates = np.clip(best[:, :, None] + mesh[:, None, :] * steps[:, None, None],
+                                 lower[:, None, None], upper[:, None, None])
+            best, log_likelihood, forecast = self._best_candidates(candidates, squared, observed, unconditional)
+            steps = steps / 2
+
+        omega, alpha, beta = self._parameters(best[:, :, None], unconditional)
+        for name, values in (('mean', self.mean), ('omega', omega[:, 0]), ('alpha', alpha[:, 0]),
+                             ('beta', beta[:, 0]), ('variance', forecast), ('log_likelihood', log_likelihood)):
+            # the tickers that were not fitted keep NaN
+            full = np.full(n_tickers, np.nan)
+            full[self.fitted] = values
+            setattr(self, name, full)
+        return self
+
+    def state(self, index: int = 0) -> dict:
+        '''
+        JSON serializable state of one ticker, enough to score and update it without refitting.
+
+        Parameters:
+            index (int): Position of the ticker in the fitted history (default: 0).
+
+        Returns:
+            state (dict): Model, sigma, mean, omega, alpha, beta and variance forecast.
+        '''
+        return {
+            'model': self.model,
+            'sigma': self.sigma,
+            'mean': float(self.mean[index]),
+            'omega': float(self.omega[index]),
+            'alpha': float(self.alpha[index]),
+            'beta': float(self.beta[index]),
+            'variance': float(self.variance[index]),
+        }
+
+    @classmethod
+    def from_states(cls, states: list) -> 'VolatilityAdaptiveDetector':
+        '''
+        Rebuild a fitted detector from the states of its tickers, all of the same model.
+
+        Parameters:
+            states (list): Dicts built by state, one per ticker.
+
+        Returns:
+            detector (VolatilityAdaptiveDetector): Detector ready to score and update, in the order of the states.
+        '''
+        detector = cls(states[0]['model'], states[0]['sigma'])
+        for name in ('mean', 'omega', 'alpha', 'beta', 'variance'):
+            setattr(detector, name, np.array([state[name] for state in states], dtype=float))
+        detector.fitted = ~np.isnan(detector.variance)
+        return detector
+
+    def score(self, values: np.array) -> np.array:
+        '''
+        Z-score of the values of the next day against the variance forecast of each ticker.
+
+        Parameters:
+            values (array-like): Array of shape (n_tickers,), or a float for a single ticker.
+
+        Returns:
+            z_score (array-like): Array of shape (n_tickers,).
+        '''
+        return (np.asarray(values, dtype=float) - self.mean) / np.sqrt(self.variance)
+
+    def is_anomaly(self, values: np.array) -> np.array:
+        '''
+        Check if the values are further than sigma conditional standard deviations from the mean.
+
+        Parameters:
+            values (array-like): Same layout as in score.
+
+        Returns:
+            is_anomaly (array-like): Boolean mask of shape (n_tickers,).
+        '''
+        return np.abs(self.score(values)) > self.sigma
+
+    def anomaly_report(self, values: np.array) -> np.array:
+        '''
+        Generate the two-sided p-values of the values under the conditional normal distribution.
+
+        Parameters:
+            values (array-like): Same layout as in score.
+
+        Returns:
+            p_value (array-like): Array of shape (n_tickers,).
+        '''
+        return 2 * stats.norm.sf(np.abs(self.score(values)))
+
+    def anomaly_event(self, ticker: str, date: str, value: float, index: int = 0) -> dict:
+        '''
+        Generate the record of a scored value to be persisted in the anomaly events table.
+
+        Parameters:
+            ticker (str): The ticker symbol (e.g., 'ETH-USD').
+            date (str): The day of the value in the format 'YYYY-MM-DD'.
+            value (float): The value that was scored.
+            index (int): Position of the ticker in the fitted history (default: 0).
+
+        Returns:
+            event (dict): Ticker, date, value, z-score, p-value, bounds, anomaly flag and detector version.
+        '''
+        mean, std = self.mean[index], np.sqrt(self.variance[index])
+        z_score = (value - mean) / std
+        return {
+            'ticker': ticker,
+            'date': date,
+            'value': value,
+            'z_score': float(z_score),
+            'p_value': float(2 * stats.norm.sf(abs(z_score))),
+            'lower_bound': float(mean - self.sigma * std),
+            'upper_bound': float(mean + self.sigma * std),
+            'is_anomaly': bool(abs(z_score) > self.sigma),
+            'detector_version': self.detector_version,
+        }
+
+    def update(self, values: np.array) -> np.array:
+        '''
+        Fold the observed values of a day into the variance forecast of the next one, an O(1)
+        update per ticker. Score the values first, the forecast is for the day being scored.
+
+        Parameters:
+            values (array-like): Array of shape (n_tickers,), NaN where a ticker has no value.
+
+        Returns:
+            variance (array-like): The new variance forecast of each ticker.
+        '''
+        residuals = np.asarray(values, dtype=float) - self.mean
+        new_variance = self.omega + self.alpha * residuals ** 2 + self.beta * self.variance
+        self.variance = np.where(np.isnan(residuals), self.variance, new_variance)
+        return self.variance
+
+    def _parameters(self, candidates: np.array, unconditional: np.array) -> tuple:
+        '''
+        GARCH(1,1) (omega, alpha, beta) of candidates of shape (n_params, n_tickers, n_candidates).
+        '''
+        if self.model == 'garch':
+            alpha, persistence = candidates
+            return (1 - persistence) * unconditional, alpha, persistence - alpha
+
+        decay = candidates[0]
+        return np.zeros_like(decay), 1 - decay, decay
+
+    def _best_candidates(self, candidates: np.array, squared: np.array, observed: np.array,
+                         unconditional: np.array) -> tuple:
+        '''
+        Evaluate candidates of shape (n_params, n_tickers, n_candidates) and keep the best one of each ticker.
+        '''
+        omega, alpha, beta = self._parameters(candidates, unconditional)
+        log_likelihood, forecast = _conditional_variance_log_likelihood(
+            squared, observed, omega, alpha, beta, unconditional)
+
+        best = np.argmax(log_likelihood, axis=1)
+        rows = np.arange(len(best))
+        return candidates[:, rows, best], log_likelihood[rows, best], forecast[rows, best]
+
+
+def advance_volatility_state(
+        ticker: str,
+        date: datetime.date,
+        data_distribution: np.array,
+        value: float,
+        previous_state: dict = None,
+        model: str = 'garch',
+        refit_days: int = 30) -> tuple:
+    '''
+    Score the value of a day against the volatility forecast of a ticker and carry the state to the next day.
+    The state of the previous daily run is reused with an O(1) update when it went up to the day before;
+    the model is refitted on the history when there is no such state, when it skipped days, when
+    the model changed or when the last fit is refit_days old.
+
+    Parameters:
+        ticker (str): The ticker symbol (e.g., 'ETH-USD').
+        date (datetime.date): The day of the value.
+        data_distribution (array-like): History of the ticker up to the day before, oldest day first.
+        value (float): The value to score.
+        previous_state (dict): State returned by the previous run, None if there is none (default: None).
+        model (str): 'garch' or 'ewma' (default: 'garch').
+        refit_days (int): Days after which the parameters are fitted again (default: 30).
+
+    Returns:
+        (event, state): The anomaly event of the value and the state to persist for the next run.
+    '''
+    day_before = str(date - datetime.timedelta(days=1))
+    reusable = (
+        previous_state is not None
+        and previous_state['model'] == model
+        and previous_state['updated_through'] == day_before
+        and (date - datetime.date.fromisoformat(previous_state['fitted_at'])).days < refit_days)
+
+    if reusable:
+        detector = VolatilityAdaptiveDetector.from_states([previous_state])
+        fitted_at = previous_state['fitted_at']
+    else:
+        detector = VolatilityAdaptiveDetector(model).fit(data_distribution)
+        fitted_at = day_before
+
+    event = detector.anomaly_event(ticker, str(date), value)
+    detector.update(value)
+    return event, dict(detector.state(), fitted_at=fitted_at, updated_through=str(date))
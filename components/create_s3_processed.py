@@ -7,14 +7,18 @@ Date: July/2023
 '''
 
 # import necessary packages
-import boto3
 import logging
 import datetime
 import os
 import io
+import time
 import random
+import concurrent.futures
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+
+from components.lake_backend import LakeBackend, S3LakeBackend
 
 logging.basicConfig(
     level=logging.INFO,
@@ -27,7 +31,9 @@ def move_files_to_processed_layer(
         bucket_name: str,
         aws_access_key_id: str,
         aws_secret_access_key: str,
-        region_name: str) -> None:
+        region_name: str,
+        backend: LakeBackend = None,
+        asset: str = 'eth') -> None:
     '''
     Process data for the current day from raw layer and save it in the processed layer of the data lake.
 
@@ -35,28 +41,22 @@ def move_files_to_processed_layer(
     :param aws_access_key_id: (str) AWS access key ID.
     :param aws_secret_access_key: (str) AWS secret access key.
     :param region_name: (str) AWS region name.
+    :param backend: (LakeBackend) lake backend to read from and write to, an S3 backend built from the credentials above if not given.
+    :param asset: (str) lower case name of the asset in the lake keys (default: 'eth').
     '''
-    # Create a session with AWS credentials
-    session = boto3.Session(
-        aws_access_key_id=aws_access_key_id,
-        aws_secret_access_key=aws_secret_access_key,
-        region_name=region_name
-    )
-
-    # Create a client instance for S3
-    s3_client = session.client('s3')
-    logging.info('S3 authentication was created successfully.')
+    # Use the S3 bucket unless another backend was configured
+    if backend is None:
+        backend = S3LakeBackend(bucket_name, aws_access_key_id, aws_secret_access_key, region_name)
 
     # Get the current date
     today_date = datetime.datetime.now()
 
     # Define the paths for the raw and processed layers
-    raw_directory = f'raw/crypto_anomaly_detect/eth/extracted_at={today_date.date()}/eth_historical_data.csv'
-    processed_directory = f'processed/crypto_anomaly_detect/eth/extracted_at={today_date.date()}/processed_eth_historical_data.parquet'
+    raw_directory = f'raw/crypto_anomaly_detect/{asset}/extracted_at={today_date.date()}/{asset}_historical_data.csv'
+    processed_directory = f'processed/crypto_anomaly_detect/{asset}/extracted_at={today_date.date()}/processed_{asset}_historical_data.parquet'
 
-    # Read the raw data from S3, selecting only desired columns
-    obj = s3_client.get_object(Bucket=bucket_name, Key=raw_directory)
-    raw_data = pd.read_csv(obj['Body'])
+    # Read the raw data from the lake
+    raw_data = pd.read_csv(io.BytesIO(backend.get_bytes(raw_directory)))
     logging.info('Raw data from s3 raw folder was fetched successfully.')
 
     ######################### Perform data transformations #########################
@@ -85,13 +85,13 @@ def move_files_to_processed_layer(
         os.makedirs('tmp')
 
     # Save the processed data to Parquet format
-    processed_data.to_parquet(f'/tmp/{today_date.date()}_processed_eth_historical_data.parquet', compression='gzip')
+    processed_data.to_parquet(f'/tmp/{today_date.date()}_processed_{asset}_historical_data.parquet', compression='gzip')
 
-    # Upload the Parquet file to S3
-    s3_client.upload_file(f'/tmp/{today_date.date()}_processed_eth_historical_data.parquet', bucket_name, processed_directory)
+    # Upload the Parquet file to the lake
+    backend.put_file(f'/tmp/{today_date.date()}_processed_{asset}_historical_data.parquet', processed_directory)
 
     # Delete the temporary file
-    os.remove(f'/tmp/{today_date.date()}_processed_eth_historical_data.parquet')
+    os.remove(f'/tmp/{today_date.date()}_processed_{asset}_historical_data.parquet')
     logging.info(f'Processed data for {today_date.date()} processed and saved in {processed_directory}.')
 
 
@@ -99,7 +99,9 @@ def get_files_from_processed_layer(
         bucket_name: str,
         aws_access_key_id: str,
         aws_secret_access_key: str,
-        region_name: str) -> pd.DataFrame:
+        region_name: str,
+        backend: LakeBackend = None,
+        asset: str = 'eth') -> pd.DataFrame:
     '''
     Script to get data from processed layer.
 
@@ -107,6 +109,8 @@ def get_files_from_processed_layer(
     :param aws_access_key_id: (str) AWS access key ID.
     :param aws_secret_access_key: (str) AWS secret access key.
     :param region_name: (str) AWS region name.
+    :param backend: (LakeBackend) lake backend to read from, an S3 backend built from the credentials above if not given.
+    :param asset: (str) lower case name of the asset in the lake keys (default: 'eth').
 
     :return processed_data: (pd.DataFrame) data from processed layer in the bucket.
     '''
@@ -114,24 +118,109 @@ def get_files_from_processed_layer(
     today_date = datetime.datetime.now()
 
     # Define the path for the processed layer
-    processed_directory = f'processed/crypto_anomaly_detect/eth/extracted_at={today_date.date()}/processed_eth_historical_data.parquet'
-
-    # Create a session with AWS credentials
-    session = boto3.Session(
-        aws_access_key_id=aws_access_key_id,
-        aws_secret_access_key=aws_secret_access_key,
-        region_name=region_name
-    )
-
-    # Create a client instance for S3
-    s3_client = session.client('s3')
-    
-    # Read the Parquet file from S3 using the S3 client
-    response = s3_client.get_object(Bucket=bucket_name, Key=processed_directory)
-    body = response['Body']
-
-    # Read the Parquet data using pandas
-    parquet_buffer = io.BytesIO(body.read())
-    processed_data = pd.read_parquet(parquet_buffer)
+    processed_directory = f'processed/crypto_anomaly_detect/{asset}/extracted_at={today_date.date()}/processed_{asset}_historical_data.parquet'
+
+    # Use the S3 bucket unless another backend was configured
+    if backend is None:
+        backend = S3LakeBackend(bucket_name, aws_access_key_id, aws_secret_access_key, region_name)
+
+    # Read the Parquet data as an Arrow table (memory-mapped on the local backend)
+    processed_data = backend.read_table(processed_directory).to_pandas()
 
     return processed_data
+
+
+def get_range_from_processed_layer(
+        bucket_name: str,
+        aws_access_key_id: str,
+        aws_secret_access_key: str,
+        region_name: str,
+        start_date: str,
+        end_date: str,
+        assets: list = ('eth',),
+        backend: LakeBackend = None,
+        max_workers: int = 16,
+        return_stats: bool = False):
+    '''
+    Read every processed partition of some assets extracted in a date range, as one Arrow table.
+    The partitions of each asset are listed from the start of the range only, and listed and
+    downloaded by the same bounded thread pool, which shares the connections of the backend.
+    The tables are concatenated without copying their columns, partitions missing a column get
+    nulls for it, and an 'asset' and an 'extracted_at' column tell which partition each row came from.
+
+    :param bucket_name: (str) Name of the S3 bucket.
+    :param aws_access_key_id: (str) AWS access key ID.
+    :param aws_secret_access_key: (str) AWS secret access key.
+    :param region_name: (str) AWS region name.
+    :param start_date: (str) First extraction date in the format 'YYYY-MM-DD' (included).
+    :param end_date: (str) Last extraction date in the format 'YYYY-MM-DD' (included).
+    :param assets: (list) lower case names of the assets in the lake keys (default: ('eth',)).
+    :param backend: (LakeBackend) lake backend to read from, an S3 backend built from the credentials above if not given.
+    :param max_workers: (int) maximum number of partitions downloaded at once (default: 16).
+    :param return_stats: (bool) whether to also return the read statistics (default: False).
+
+    :return processed_data: (pa.Table) rows of the matching partitions, in asset and date order.
+    :return stats: (dict) if return_stats, objects, Arrow MB, seconds, objects/sec and MB/sec of the read.
+    '''
+    # Use the S3 bucket unless another backend was configured
+    if backend is None:
+        backend = S3LakeBackend(bucket_name, aws_access_key_id, aws_secret_access_key, region_name, max_workers)
+
+    start = time.perf_counter()
+
+    start_date, end_date = str(start_date), str(end_date)
+    # the dates share a prefix (e.g. the year), the listing does not need to go past it
+    range_prefix = os.path.commonprefix([start_date, end_date])
+
+    def list_partitions(asset: str) -> list:
+        prefix = f'processed/crypto_anomaly_detect/{asset}/extracted_at='
+        partitions = []
+        for key in backend.list_keys(prefix + range_prefix, start_after=prefix + start_date):
+            extracted_at = key[len(prefix):].split('/', 1)[0]
+            if start_date <= extracted_at <= end_date and key.endswith('.parquet'):
+                partitions.append((asset, extracted_at, key))
+        return partitions
+
+    def read_partition(partition: tuple) -> pa.Table:
+        asset, extracted_at, key = partition
+        table = backend.read_table(key).replace_schema_metadata(None)
+        table = table.append_column('asset', pa.repeat(asset, table.num_rows))
+        return table.append_column('extracted_at', pa.repeat(extracted_at, table.num_rows))
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # the reads of an asset start as soon as its listing is done, while the next ones are listed
+        listings = [executor.submit(list_partitions, asset) for asset in assets]
+        reads = [executor.submit(read_partition, partition) for listing in listings for partition in listing.result()]
+        tables = [read.result() for read in reads]
+    logging.info(f'{len(tables)} processed partitions were found between {start_date} and {end_date}.')
+
+    # concat_tables only references the chunks of each table, nothing is copied
+    processed_data = _concat_promoting(tables) if tables else pa.table({})
+    seconds = time.perf_counter() - start
+
+    stats = {
+        'objects': len(tables),
+        'mb': processed_data.nbytes / 2 ** 20,
+        'seconds': seconds,
+        'objects_per_s': len(tables) / seconds if seconds > 0 else 0.0,
+        'mb_per_s': processed_data.nbytes / 2 ** 20 / seconds if seconds > 0 else 0.0,
+    }
+    logging.info(
+        f'{stats["objects"]} processed partitions were read in {seconds:.2f}s: '
+        f'{stats["objects_per_s"]:.1f} objects/s, {stats["mb_per_s"]:.1f} MB/s')
+
+    if return_stats:
+        return processed_data, stats
+    return processed_data
+
+
+def _concat_promoting(tables: list) -> pa.Table:
+    '''
+    Concatenate tables whose schemas may have drifted between partitions:
+    a column missing from some of them is filled with nulls.
+    '''
+    try:
+        return pa.concat_tables(tables, promote_options='default')
+    except TypeError:
+        # pyarrow < 14 only has the boolean flag
+        return pa.concat_tables(tables, promote=True)
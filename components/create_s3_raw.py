@@ -7,12 +7,13 @@ Date: July/2023
 '''
 
 # import necessary packages
-import boto3
 import logging
 import datetime
 import os
 import pandas as pd
 
+from components.lake_backend import LakeBackend, S3LakeBackend
+
 logging.basicConfig(
     level=logging.INFO,
     filemode='w',
@@ -25,7 +26,9 @@ def move_files_to_raw_layer(
         aws_access_key_id: str, 
         aws_secret_access_key: str, 
         region_name: str,
-        input_df: pd.DataFrame) -> None:
+        input_df: pd.DataFrame,
+        backend: LakeBackend = None,
+        asset: str = 'eth') -> None:
     '''
     Move that we fetched from Yahoo API to the raw layer folder in AWS S3.
 
@@ -34,38 +37,33 @@ def move_files_to_raw_layer(
     :param aws_secret_access_key: (str) AWS secret access key.
     :param region_name: (str) AWS region name.
     :param input_df: (dataframe) pandas dataframe that you want to upload in raw layer.
+    :param backend: (LakeBackend) lake backend to write to, an S3 backend built from the credentials above if not given.
+    :param asset: (str) lower case name of the asset in the lake keys (default: 'eth').
     '''
-    # Create a session with AWS credentials
-    session = boto3.Session(
-        aws_access_key_id=aws_access_key_id,
-        aws_secret_access_key=aws_secret_access_key,
-        region_name=region_name
-    )
-
-    # Create a client instance for S3
-    s3_client = session.client('s3')
-    logging.info('S3 authentication was created successfully.')
+    # Use the S3 bucket unless another backend was configured
+    if backend is None:
+        backend = S3LakeBackend(bucket_name, aws_access_key_id, aws_secret_access_key, region_name)
 
     # Define the start and end date of the period of interest (last day)
     today_date = datetime.datetime.now()
 
     # Define the destination directory path with the current date
-    destination_directory = f'raw/crypto_anomaly_detect/eth/extracted_at={today_date.date()}/eth_historical_data.csv'
+    destination_directory = f'raw/crypto_anomaly_detect/{asset}/extracted_at={today_date.date()}/{asset}_historical_data.csv'
 
     # Read the raw data from yahoo finance api
     eth_df = input_df
-    logging.info('The ETH dataframe from yesterday was fetched successfully.')
+    logging.info(f'The {asset.upper()} dataframe from yesterday was fetched successfully.')
 
     # Create the 'tmp' directory if it doesn't exist
     if not os.path.exists('tmp'):
         os.makedirs('tmp')
 
     # Save the processed data to csv format
-    eth_df.to_csv(f'/tmp/{today_date.date()}_eth_historical_data.csv')
+    eth_df.to_csv(f'/tmp/{today_date.date()}_{asset}_historical_data.csv')
 
-    # Upload the csv file to S3
-    s3_client.upload_file(f'/tmp/{today_date.date()}_eth_historical_data.csv', bucket_name, destination_directory)
+    # Upload the csv file to the lake
+    backend.put_file(f'/tmp/{today_date.date()}_{asset}_historical_data.csv', destination_directory)
 
     # Delete the temporary file
-    os.remove(f'/tmp/{today_date.date()}_eth_historical_data.csv')
+    os.remove(f'/tmp/{today_date.date()}_{asset}_historical_data.csv')
     logging.info(f'Raw data for {today_date.date()} was uploaded and saved in {destination_directory}.')
@@ -0,0 +1,177 @@
+'''
+Component to detect cross-asset anomalies: market-wide moves,
+assets that decouple from the market factor and correlation
+regime breaks, with an incremental EWMA covariance matrix
+
+Author: Vitor Abdo
+Date: Oct/2026
+'''
+
+# import necessary packages
+import numpy as np
+from scipy.linalg import blas
+
+
+class CrossAssetMonitor:
+    def __init__(
+            self,
+            tickers: list,
+            halflife: float = 30,
+            baseline_halflife: float = 250,
+            residual_threshold: float = 4.0,
+            correlation_shift_threshold: float = 0.3,
+            min_periods: int = 30,
+            dtype: type = np.float64):
+        '''
+        CrossAssetMonitor class that keeps an exponentially weighted mean and covariance matrix
+        of the daily values (e.g. price_amplitude) of a ticker universe. Each daily update is a
+        rank-1 update of the covariance, O(k^2) for k tickers, instead of a refit on the history.
+
+        The market factor is the equal-weighted average of the universe. Every day the monitor flags:
+            - a market-wide move, when the market factor is extreme;
+            - tickers whose residual against the market factor is extreme (isolated moves);
+            - tickers whose correlation with the market moved away from its long-run baseline.
+
+        Parameters:
+            tickers (list): Tickers of the universe, in the column order of the values.
+            halflife (float): Half-life, in days, of the covariance (default: 30).
+            baseline_halflife (float): Half-life, in days, of the baseline correlation with the market (default: 250).
+            residual_threshold (float): Absolute z-score above which a move is flagged (default: 4.0).
+            correlation_shift_threshold (float): Absolute change of the correlation with the market
+            above which a regime break is flagged (default: 0.3).
+            min_periods (int): Days of history needed before anything is flagged (default: 30).
+            dtype (type): Float type of the covariance matrix, np.float32 halves its memory (default: np.float64).
+        '''
+        self.tickers = list(tickers)
+        self.alpha = 1 - 0.5 ** (1 / halflife)
+        self.baseline_alpha = 1 - 0.5 ** (1 / baseline_halflife)
+        self.residual_threshold = residual_threshold
+        self.correlation_shift_threshold = correlation_shift_threshold
+        self.min_periods = min_periods
+        self.dtype = dtype
+
+        n_assets = len(self.tickers)
+        self.mean = np.zeros(n_assets, dtype=dtype)
+        # Fortran order lets the BLAS rank-1 update work in place
+        self.covariance = np.zeros((n_assets, n_assets), dtype=dtype, order='F')
+        self.baseline_correlation = np.zeros(n_assets, dtype=dtype)
+        self.n_periods = 0
+        self._rank1_update = blas.sger if np.dtype(dtype) == np.float32 else blas.dger
+
+    def fit(self, history: np.array) -> 'CrossAssetMonitor':
+        '''
+        Initialize the state from a history in one vectorized pass, with the same exponential
+        weights as update (normalized, so there is no bias towards the zero initial state).
+        Missing values (NaN) are left out of the mean and count as the mean in the covariance.
+
+        Parameters:
+            history (array-like): Array of shape (n_days, n_tickers), oldest day first.
+
+        Returns:
+            self (CrossAssetMonitor): The fitted monitor.
+        '''
+        history = np.asarray(history, dtype=self.dtype)
+        n_days = len(history)
+
+        # weight of each day in an EWMA that started with the first one
+        weights = self.alpha * (1 - self.alpha) ** np.arange(n_days - 1, -1, -1, dtype=np.float64)
+        weights /= weights.sum()
+
+        observed = ~np.isnan(history)
+        column_weights = (weights[:, None] * observed).sum(axis=0)
+        filled = np.where(observed, history, 0)
+        self.mean = ((weights[:, None] * filled).sum(axis=0) / np.where(column_weights > 0, column_weights, 1)).astype(self.dtype)
+
+        centered = np.where(observed, history - self.mean, 0).astype(self.dtype)
+        self.covariance = np.asfortranarray((centered * weights[:, None].astype(self.dtype)).T @ centered)
+
+        self.baseline_correlation = self._market_correlation(self._market_stats()[0])
+        self.n_periods = n_days
+        return self
+
+    def update(self, values: np.array) -> dict:
+        '''
+        Score the values of a new day against the current state, then fold them into it.
+
+        Parameters:
+            values (array-like): Array of shape (n_tickers,) with the values of the day, NaN if missing.
+
+        Returns:
+            report (dict): market_z (float), market_move (bool), residual_z (array),
+            correlation_shift (array), decoupled (bool array) and regime_break (bool array).
+        '''
+        values = np.asarray(values, dtype=self.dtype)
+        deviation = np.where(np.isnan(values), 0, values - self.mean).astype(self.dtype)
+        report = self._score(deviation)
+
+        # EWMA update: mean += a * d and covariance = (1 - a) * (covariance + a * d d^T)
+        self.mean += self.alpha * deviation
+        self.covariance = self._rank1_update(
+            self.alpha, deviation, deviation, a=self.covariance, overwrite_a=1)
+        self.covariance *= (1 - self.alpha)
+
+        self.baseline_correlation += self.baseline_alpha * (report['correlation'] - self.baseline_correlation)
+        self.n_periods += 1
+        return report
+
+    def flagged_tickers(self, report: dict) -> dict:
+        '''
+        Tickers flagged in a report returned by update.
+
+        Parameters:
+            report (dict): Report returned by update.
+
+        Returns:
+            flagged (dict): Lists of tickers under 'decoupled' and 'regime_break', and the 'market_move' flag.
+        '''
+        return {
+            'market_move': bool(report['market_move']),
+            'decoupled': [t for t, flag in zip(self.tickers, report['decoupled']) if flag],
+            'regime_break': [t for t, flag in zip(self.tickers, report['regime_break']) if flag],
+        }
+
+    def _market_stats(self) -> tuple:
+        '''
+        Covariance of each ticker with the equal-weighted market factor and the market variance, O(k^2).
+        '''
+        market_covariance = self.covariance.mean(axis=1)
+        market_variance = market_covariance.mean()
+        return market_covariance, market_variance
+
+    def _market_correlation(self, market_covariance: np.array) -> np.array:
+        '''
+        Correlation of each ticker with the market factor.
+        '''
+        market_variance = market_covariance.mean()
+        variances = np.diag(self.covariance)
+        denominator = np.sqrt(np.maximum(variances * market_variance, 0))
+        return np.divide(market_covariance, denominator, out=np.zeros_like(market_covariance), where=denominator > 0)
+
+    def _score(self, deviation: np.array) -> dict:
+        '''
+        Market, residual and correlation scores of a day, before the state is updated.
+        '''
+        market_covariance, market_variance = self._market_stats()
+        market_deviation = deviation.mean()
+        variances = np.diag(self.covariance)
+
+        # one-factor model: d_i = beta_i * d_market + residual_i
+        beta = market_covariance / market_variance if market_variance > 0 else np.zeros_like(market_covariance)
+        residual = deviation - beta * market_deviation
+        residual_variance = np.maximum(variances - beta ** 2 * market_variance, 0)
+        residual_z = np.divide(residual, np.sqrt(residual_variance), out=np.zeros_like(residual), where=residual_variance > 0)
+        market_z = market_deviation / np.sqrt(market_variance) if market_variance > 0 else 0.0
+
+        correlation = self._market_correlation(market_covariance)
+        correlation_shift = correlation - self.baseline_correlation
+
+        warmed_up = self.n_periods >= self.min_periods
+        return {
+            'market_z': float(market_z),
+            'market_move': warmed_up and abs(market_z) > self.residual_threshold,
+            'residual_z': residual_z,
+            'correlation': correlation,
+            'correlation_shift': correlation_shift,
+            'decoupled': warmed_up & (np.abs(residual_z) > self.residual_threshold),
+            'regime_break': warmed_up & (np.abs(correlation_shift) > self.correlation_shift_threshold),
+        }
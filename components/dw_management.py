@@ -8,15 +8,80 @@ Date: May/2023
 
 # import necessary packages
 import logging
+import uuid
 import psycopg2
+from psycopg2.extras import execute_values
+import numpy as np
 import pandas as pd
-from sqlalchemy import create_engine, inspect
+from sqlalchemy import create_engine
 
 logging.basicConfig(
     level=logging.INFO,
     filemode='w',
     format='%(name)s - %(levelname)s - %(message)s')
 
+# table with one row per ticker and day scored by the detection stage
+ANOMALY_EVENTS_TABLE = 'anomaly_events'
+
+# materialized view with the daily summary of the anomaly events
+ANOMALY_SUMMARY_VIEW = 'anomaly_daily_summary'
+
+# columns of the anomaly events written by the detection stage
+ANOMALY_EVENT_COLUMNS = [
+    'ticker', 'date', 'value', 'z_score', 'p_value', 'lower_bound', 'upper_bound', 'is_anomaly', 'detector_version']
+
+# columns of the DW tables already checked by this process, keyed by (schema, table)
+_table_columns_cache = {}
+
+
+def cache_table_columns(schema_name: str, table_name: str, columns: list) -> None:
+    '''
+    Records the columns of a table whose schema is known to be up to date,
+    so get_table_columns does not have to query information_schema for it.
+
+    :param schema_name: (str)
+    The name of the schema where the table is
+
+    :param table_name: (str)
+    The name of the table
+
+    :param columns: (list)
+    The column names of the table, in table order
+    '''
+    _table_columns_cache[(schema_name, table_name)] = list(columns)
+
+
+def get_table_columns(conn, schema_name: str, table_name: str) -> list:
+    '''
+    Returns the columns of a table, querying information_schema only the first
+    time a table is seen by this process.
+
+    :param conn: (psycopg2.connection)
+    An open connection to the database
+
+    :param schema_name: (str)
+    The name of the schema where the table is
+
+    :param table_name: (str)
+    The name of the table
+
+    :return columns: (list)
+    The column names in table order, or an empty list if the table does not exist
+    '''
+    key = (schema_name, table_name)
+    if key not in _table_columns_cache:
+        db_cols_query = f"SELECT column_name FROM information_schema.columns WHERE table_name='{table_name}' AND table_schema='{schema_name}' ORDER BY ordinal_position"
+        with conn.cursor() as cur:
+            cur.execute(db_cols_query)
+            columns = [col[0] for col in cur.fetchall()]
+
+        # a missing table may still be created later in the run, so it is not cached
+        if not columns:
+            return columns
+        _table_columns_cache[key] = columns
+
+    return _table_columns_cache[key]
+
 
 def create_schema_into_postgresql(
         endpoint_name: str,
@@ -154,10 +219,15 @@ def insert_data_into_postgresql(
         schema_name: str,
         table_name: str,
         df: pd.DataFrame,
-        temp_schema_name: str) -> None:
+        temp_schema_name: str,
+        small_batch_max_rows: int = 1000,
+        chunk_size: int = None,
+        check_memory=None) -> None:
     '''
     Function that inserts data from a Pandas DataFrame into a PostgreSQL table.
-    If the table does not exist, it creates a new one in the specified schema.
+    If the table does not exist, nothing is inserted and a warning is logged.
+    DataFrames with up to small_batch_max_rows rows skip the temporary table
+    and are sent with upsert_small_batch_into_postgresql instead.
 
     :param endpoint_name: (str)
     The endpoint URL of your Amazon RDS instance
@@ -182,7 +252,25 @@ def insert_data_into_postgresql(
 
     :param df: (pandas.DataFrame)
     The DataFrame containing the data to be inserted.
+
+    :param temp_schema_name: (str)
+    The name of the schema where the temporary table is created on the bulk path.
+
+    :param small_batch_max_rows: (int)
+    Largest number of rows sent through the small-batch path (default: 1000).
+
+    :param chunk_size: (int)
+    Number of rows written per batch, None to send everything at once (default: None).
+
+    :param check_memory: (callable)
+    Called before each batch is written, e.g. MemoryGovernor.check, to fail fast between batches (default: None).
     '''
+    # Small daily deltas go through a single INSERT ... ON CONFLICT
+    if len(df) <= small_batch_max_rows:
+        upsert_small_batch_into_postgresql(
+            endpoint_name, port, datab_name, user_name, password, schema_name, table_name, df,
+            page_size=chunk_size or 1000, check_memory=check_memory)
+        return
 
     # Connect to the PostgreSQL database
     db_host = endpoint_name
@@ -202,27 +290,26 @@ def insert_data_into_postgresql(
     engine = create_engine(
         f'postgresql+psycopg2://{db_user}:{db_pass}@{db_host}:{db_port}/{db_name}')
 
-    # Create a temporary table with the data from the DataFrame
+    # Create a temporary table with the data from the DataFrame, one batch at a time
     temp_table_name = f'temp_{table_name}'
-    df.to_sql(
-        name=temp_table_name,
-        con=engine.connect(),
-        schema=temp_schema_name,
-        index=False,
-        if_exists='replace')
+    batch_size = chunk_size or len(df)
+    with engine.begin() as engine_conn:
+        for start in range(0, len(df), batch_size):
+            if check_memory is not None:
+                check_memory()
+            df.iloc[start:start + batch_size].to_sql(
+                name=temp_table_name,
+                con=engine_conn,
+                schema=temp_schema_name,
+                index=False,
+                if_exists='replace' if start == 0 else 'append')
     logging.info('Temporary table was created: SUCCESS')
 
-    # Check if the final table exists
-    inspector = inspect(engine)
-    table_exists = inspector.has_table(table_name, schema=schema_name)
+    # Check if the final table exists (catalog probed at most once per process)
+    db_columns = get_table_columns(conn, schema_name, table_name)
 
-    if table_exists:
+    if db_columns:
         # Check if the DataFrame columns match the table columns
-        db_cols_query = f"SELECT column_name FROM information_schema.columns WHERE table_name='{table_name}' AND table_schema='{schema_name}'"
-        with conn.cursor() as cur:
-            cur.execute(db_cols_query)
-            db_columns = [col[0] for col in cur.fetchall()]
-
         df_columns = df.columns.tolist()
 
         if db_columns != df_columns:
@@ -235,6 +322,9 @@ def insert_data_into_postgresql(
             cur.execute(insert_query)
         logging.info('The dataframe data has been inserted: SUCCESS')
 
+    else:
+        logging.warning(f'The table {schema_name}.{table_name} does not exist, no data was inserted')
+
     # Remove the temporary table
     drop_query = f'DROP TABLE {temp_schema_name}.{temp_table_name};'
 
@@ -247,6 +337,95 @@ def insert_data_into_postgresql(
     conn.close()
 
 
+def upsert_small_batch_into_postgresql(
+        endpoint_name: str,
+        port: str,
+        datab_name: str,
+        user_name: str,
+        password: str,
+        schema_name: str,
+        table_name: str,
+        df: pd.DataFrame,
+        page_size: int = 1000,
+        check_memory=None) -> None:
+    '''
+    Function that inserts a small Pandas DataFrame into an existing PostgreSQL table
+    with a single INSERT ... ON CONFLICT (date) DO NOTHING statement inside one transaction.
+    It skips the engine and temporary table of the bulk path and shares its cached
+    column check, so a one row daily delta costs a single round trip. Like the bulk
+    path, it inserts nothing and logs a warning if the table does not exist.
+
+    :param endpoint_name: (str)
+    The endpoint URL of your Amazon RDS instance
+
+    :param port: (int)
+    The port number to connect to the database
+
+    :param datab_name: (str)
+    The name of the database to connect to.
+
+    :param user_name: (str)
+    The name of the user to authenticate as.
+
+    :param password: (str)
+    The user's password.
+
+    :param schema_name: (str)
+    The name of the schema where the table is.
+
+    :param table_name: (str)
+    The name of the table where the data will be inserted.
+
+    :param df: (pandas.DataFrame)
+    The DataFrame containing the data to be inserted. Its columns must match the columns of the table.
+
+    :param page_size: (int)
+    Maximum number of rows packed in each INSERT statement (default: 1000).
+
+    :param check_memory: (callable)
+    Called before each INSERT statement, e.g. MemoryGovernor.check, to fail fast between pages (default: None).
+    '''
+    if df.empty:
+        logging.info('The dataframe is empty, nothing to insert.')
+        return
+
+    columns = ', '.join(df.columns)
+    insert_query = f'INSERT INTO {schema_name}.{table_name} ({columns}) VALUES %s ON CONFLICT (date) DO NOTHING'
+
+    # Convert numpy scalars and NaN into python objects that psycopg2 can adapt
+    records = list(df.astype(object).where(df.notna(), None).itertuples(index=False, name=None))
+
+    conn = psycopg2.connect(
+        host=endpoint_name,
+        port=port,
+        dbname=datab_name,
+        user=user_name,
+        password=password
+    )
+
+    try:
+        # Same compatibility check as the bulk path (catalog probed at most once per process)
+        db_columns = get_table_columns(conn, schema_name, table_name)
+        if not db_columns:
+            logging.warning(f'The table {schema_name}.{table_name} does not exist, no data was inserted')
+            return
+        if db_columns != df.columns.tolist():
+            raise ValueError(
+                f'The columns of the DataFrame do not match the columns of the table {schema_name}.{table_name}')
+
+        # The connection context manager commits on success and rolls back on error
+        with conn:
+            with conn.cursor() as cur:
+                for start in range(0, len(records), page_size):
+                    if check_memory is not None:
+                        check_memory()
+                    execute_values(cur, insert_query, records[start:start + page_size], page_size=page_size)
+        logging.info(f'{len(records)} rows have been inserted with the small-batch path: SUCCESS')
+
+    finally:
+        conn.close()
+
+
 def fetch_data_from_database(conn_string: str, query: str) -> pd.DataFrame:
     '''
     Fetches data from a database using the provided connection string and query.
@@ -278,3 +457,236 @@ def fetch_data_from_database(conn_string: str, query: str) -> pd.DataFrame:
             conn.close()
 
     return data
+
+
+def iter_chunks_from_database(
+        conn_string: str,
+        query: str,
+        chunk_size: int = 10000,
+        dtype: type = np.float64,
+        check_memory=None):
+    '''
+    Streams the result of a query in fixed-size chunks using a named (server-side) cursor.
+    Only the current chunk is held in memory, so the peak memory does not depend on the table size.
+
+    Parameters:
+        conn_string (str): Connection string for the database.
+        query (str): SQL query to fetch the data. Every selected column must be numeric.
+        chunk_size (int): Number of rows fetched from the server per round trip (default: 10000).
+        dtype (type): Numpy dtype of the yielded chunks, e.g. np.float32 to halve memory (default: np.float64).
+        check_memory (callable): Called before each chunk is fetched, e.g. MemoryGovernor.check,
+        to fail fast between chunks (default: None).
+
+    Yields:
+        chunk (np.array): Array of shape (n_rows, n_columns) with n_rows <= chunk_size.
+        The same preallocated buffer is reused between chunks, copy it if you need to keep it.
+    '''
+    conn = None
+
+    try:
+        conn = psycopg2.connect(conn_string)
+
+        # named cursors live on the server and are only valid inside a transaction
+        with conn.cursor(name=f'fetch_{uuid.uuid4().hex}') as cur:
+            cur.itersize = chunk_size
+            cur.execute(query)
+
+            buffer = None
+            while True:
+                if check_memory is not None:
+                    check_memory()
+                rows = cur.fetchmany(chunk_size)
+                if not rows:
+                    break
+
+                if buffer is None:
+                    buffer = np.empty((chunk_size, len(rows[0])), dtype=dtype)
+
+                n_rows = len(rows)
+                buffer[:n_rows] = rows
+                yield buffer[:n_rows]
+
+    except Exception as e:
+        logging.error(f'Error streaming data from the database: {str(e)}')
+        raise
+
+    finally:
+        if conn is not None:
+            conn.close()
+
+
+def fetch_array_from_database(
+        conn_string: str,
+        query: str,
+        chunk_size: int = 10000,
+        use_float32: bool = False,
+        check_memory=None) -> np.array:
+    '''
+    Fetches numeric data from a database straight into a preallocated numpy array.
+    Unlike fetch_data_from_database, the result set is never buffered as a whole on the
+    client: rows are streamed through a server-side cursor and copied chunk by chunk.
+
+    Parameters:
+        conn_string (str): Connection string for the database.
+        query (str): SQL query to fetch the data. Every selected column must be numeric.
+        chunk_size (int): Number of rows fetched from the server per round trip (default: 10000).
+        use_float32 (bool): Whether to store the values as float32 instead of float64 (default: False).
+        check_memory (callable): Called before each chunk is fetched, e.g. MemoryGovernor.check (default: None).
+
+    Returns:
+        data (np.array): 1D array if the query selects a single column, 2D array otherwise.
+    '''
+    dtype = np.float32 if use_float32 else np.float64
+
+    # count the rows first so the output can be allocated only once
+    conn = psycopg2.connect(conn_string)
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f'SELECT count(*) FROM ({query}) AS q')
+            n_rows = cur.fetchone()[0]
+    finally:
+        conn.close()
+
+    logging.info(f'Fetching {n_rows} rows from the database in chunks of {chunk_size}...')
+
+    data = None
+    position = 0
+    for chunk in iter_chunks_from_database(conn_string, query, chunk_size, dtype, check_memory):
+        if data is None:
+            data = np.empty((n_rows, chunk.shape[1]), dtype=dtype)
+
+        # rows inserted between the count and the fetch are ignored
+        end = min(position + len(chunk), n_rows)
+        data[position:end] = chunk[:end - position]
+        position = end
+        if position == n_rows:
+            break
+
+    if data is None:
+        return np.empty(0, dtype=dtype)
+
+    data = data[:position]
+    if data.shape[1] == 1:
+        return data[:, 0]
+    return data
+
+
+def insert_anomaly_events(conn_string: str, schema_name: str, events: pd.DataFrame) -> None:
+    '''
+    Writes the results of the detection stage into the anomaly events table.
+    Scoring the same ticker and day again with the same detector version overwrites the previous row.
+
+    Parameters:
+        conn_string (str): Connection string for the database.
+        schema_name (str): Name of the schema where the anomaly events table is.
+        events (pd.DataFrame): One row per scored ticker and day with the ANOMALY_EVENT_COLUMNS columns.
+    '''
+    if events.empty:
+        logging.info('There are no anomaly events to insert.')
+        return
+
+    columns = ', '.join(ANOMALY_EVENT_COLUMNS)
+    updates = ', '.join(f'{col} = EXCLUDED.{col}' for col in ANOMALY_EVENT_COLUMNS[2:-1])
+    insert_query = (
+        f'INSERT INTO {schema_name}.{ANOMALY_EVENTS_TABLE} ({columns}) VALUES %s '
+        f'ON CONFLICT (ticker, date, detector_version) DO UPDATE SET {updates}, created_at = now()')
+
+    events = events[ANOMALY_EVENT_COLUMNS]
+    records = list(events.astype(object).where(events.notna(), None).itertuples(index=False, name=None))
+
+    conn = psycopg2.connect(conn_string)
+    try:
+        with conn:
+            with conn.cursor() as cur:
+                execute_values(cur, insert_query, records)
+        logging.info(f'{len(records)} anomaly events were inserted: SUCCESS')
+
+    finally:
+        conn.close()
+
+
+def refresh_anomaly_summary(conn_string: str, schema_name: str) -> None:
+    '''
+    Refreshes the materialized view with the daily summary of the anomaly events,
+    without blocking the readers of the view.
+
+    Parameters:
+        conn_string (str): Connection string for the database.
+        schema_name (str): Name of the schema where the view is.
+    '''
+    conn = psycopg2.connect(conn_string)
+    try:
+        with conn:
+            with conn.cursor() as cur:
+                cur.execute(f'REFRESH MATERIALIZED VIEW CONCURRENTLY {schema_name}.{ANOMALY_SUMMARY_VIEW}')
+        logging.info('The anomaly daily summary was refreshed: SUCCESS')
+
+    finally:
+        conn.close()
+
+
+def fetch_anomaly_events(
+        conn_string: str,
+        schema_name: str,
+        ticker: str,
+        start_date: str,
+        end_date: str,
+        only_anomalies: bool = True) -> pd.DataFrame:
+    '''
+    Fetches the anomaly events of a ticker in a date range (both ends included).
+    The query is answered from the (ticker, date) indexes of the table.
+
+    Parameters:
+        conn_string (str): Connection string for the database.
+        schema_name (str): Name of the schema where the anomaly events table is.
+        ticker (str): The ticker symbol (e.g., 'ETH-USD').
+        start_date (str): Start date in the format 'YYYY-MM-DD'.
+        end_date (str): End date in the format 'YYYY-MM-DD'.
+        only_anomalies (bool): Whether to return only the days flagged as anomalies (default: True).
+
+    Returns:
+        DataFrame: The anomaly events ordered by date.
+    '''
+    columns = ', '.join(ANOMALY_EVENT_COLUMNS)
+    query = (
+        f'SELECT {columns} FROM {schema_name}.{ANOMALY_EVENTS_TABLE} '
+        'WHERE ticker = %(ticker)s AND date BETWEEN %(start_date)s AND %(end_date)s'
+        + (' AND is_anomaly' if only_anomalies else '')
+        + ' ORDER BY date')
+
+    return _fetch_query(conn_string, query, {'ticker': ticker, 'start_date': start_date, 'end_date': end_date})
+
+
+def fetch_anomaly_summary(conn_string: str, schema_name: str, start_date: str, end_date: str) -> pd.DataFrame:
+    '''
+    Fetches the daily summary of the anomaly events in a date range (both ends included).
+
+    Parameters:
+        conn_string (str): Connection string for the database.
+        schema_name (str): Name of the schema where the view is.
+        start_date (str): Start date in the format 'YYYY-MM-DD'.
+        end_date (str): End date in the format 'YYYY-MM-DD'.
+
+    Returns:
+        DataFrame: One row per day with n_scored, n_anomalies, min_p_value and anomalous_tickers.
+    '''
+    query = (
+        f'SELECT date, n_scored, n_anomalies, min_p_value, anomalous_tickers FROM {schema_name}.{ANOMALY_SUMMARY_VIEW} '
+        'WHERE date BETWEEN %(start_date)s AND %(end_date)s ORDER BY date')
+
+    return _fetch_query(conn_string, query, {'start_date': start_date, 'end_date': end_date})
+
+
+def _fetch_query(conn_string: str, query: str, params: dict) -> pd.DataFrame:
+    '''
+    Runs a parametrized query and returns the result as a DataFrame.
+    '''
+    conn = psycopg2.connect(conn_string)
+    try:
+        with conn.cursor() as cur:
+            cur.execute(query, params)
+            columns = [col[0] for col in cur.description]
+            return pd.DataFrame(cur.fetchall(), columns=columns)
+
+    finally:
+        conn.close()
@@ -0,0 +1,247 @@
+'''
+File to keep the versioned migrations of the datawarehouse
+and apply the pending ones, once per process and schema
+
+Author: Vitor Abdo
+Date: Oct/2026
+'''
+
+# import necessary packages
+import logging
+import psycopg2
+from psycopg2 import errors
+
+from components.dw_management import cache_table_columns, ANOMALY_EVENTS_TABLE, ANOMALY_SUMMARY_VIEW
+from components.work_queue import WORK_QUEUE_TABLE
+
+logging.basicConfig(
+    level=logging.INFO,
+    filemode='w',
+    format='%(name)s - %(levelname)s - %(message)s')
+
+# table where the applied migrations of each schema are recorded
+MIGRATIONS_TABLE = 'public.dw_schema_migrations'
+
+# versions applied to a schema and processed table, the schema-wide ones have an empty table_name
+APPLIED_VERSIONS_QUERY = f"SELECT version FROM {MIGRATIONS_TABLE} WHERE schema_name = %s AND table_name IN (%s, '')"
+
+# arbitrary key of the advisory lock that serializes concurrent migrators
+MIGRATIONS_LOCK_KEY = 7340291
+
+# columns of the processed table, in table order
+PROCESSED_TABLE_COLUMNS = [
+    ('id', 'INT'),
+    ('date', 'TEXT'),
+    ('price_amplitude', 'FLOAT'),
+    ('created_at', 'TEXT'),
+    ('updated_at', 'TEXT'),
+]
+
+# (version, description, statements). The statements are formatted with
+# schema_name, temp_schema_name and table_name. Never edit an applied
+# migration, append a new one instead.
+MIGRATIONS = [
+    (1, 'create main and temp schemas and the processed table', [
+        'CREATE SCHEMA IF NOT EXISTS {schema_name}',
+        'CREATE SCHEMA IF NOT EXISTS {temp_schema_name}',
+        'CREATE TABLE IF NOT EXISTS {schema_name}.{table_name} ('
+        + ', '.join(f'{name} {data_type}' for name, data_type in PROCESSED_TABLE_COLUMNS)
+        + ', PRIMARY KEY (date))',
+    ]),
+    (2, 'create the anomaly events table, its indexes and the daily summary view', [
+        'CREATE TABLE IF NOT EXISTS {schema_name}.' + ANOMALY_EVENTS_TABLE + ' ('
+        'id BIGSERIAL PRIMARY KEY, '
+        'ticker TEXT NOT NULL, '
+        'date DATE NOT NULL, '
+        'value FLOAT NOT NULL, '
+        'z_score FLOAT, '
+        'p_value FLOAT, '
+        'lower_bound FLOAT, '
+        'upper_bound FLOAT, '
+        'is_anomaly BOOLEAN NOT NULL, '
+        'detector_version TEXT NOT NULL, '
+        'created_at TIMESTAMP NOT NULL DEFAULT now(), '
+        'UNIQUE (ticker, date, detector_version))',
+        # range scans of the flagged days of a ticker only touch this small index
+        'CREATE INDEX IF NOT EXISTS ' + ANOMALY_EVENTS_TABLE + '_anomalies_idx '
+        'ON {schema_name}.' + ANOMALY_EVENTS_TABLE + ' (ticker, date) WHERE is_anomaly',
+        'CREATE INDEX IF NOT EXISTS ' + ANOMALY_EVENTS_TABLE + '_date_idx '
+        'ON {schema_name}.' + ANOMALY_EVENTS_TABLE + ' (date)',
+        'CREATE MATERIALIZED VIEW IF NOT EXISTS {schema_name}.' + ANOMALY_SUMMARY_VIEW + ' AS '
+        'SELECT date, '
+        'count(*) AS n_scored, '
+        'count(*) FILTER (WHERE is_anomaly) AS n_anomalies, '
+        'min(p_value) AS min_p_value, '
+        'array_agg(ticker ORDER BY ticker) FILTER (WHERE is_anomaly) AS anomalous_tickers '
+        'FROM {schema_name}.' + ANOMALY_EVENTS_TABLE + ' GROUP BY date',
+        # a unique index is required by REFRESH MATERIALIZED VIEW CONCURRENTLY
+        'CREATE UNIQUE INDEX IF NOT EXISTS ' + ANOMALY_SUMMARY_VIEW + '_date_idx '
+        'ON {schema_name}.' + ANOMALY_SUMMARY_VIEW + ' (date)',
+    ]),
+    (3, 'create the work queue of (ticker, date) items of the workers', [
+        'CREATE TABLE IF NOT EXISTS {schema_name}.' + WORK_QUEUE_TABLE + ' ('
+        'ticker TEXT NOT NULL, '
+        'date DATE NOT NULL, '
+        "status TEXT NOT NULL DEFAULT 'pending', "
+        'attempts INT NOT NULL DEFAULT 0, '
+        'max_attempts INT NOT NULL DEFAULT 3, '
+        'available_at TIMESTAMP NOT NULL DEFAULT now(), '
+        'lease_owner TEXT, '
+        'lease_expires_at TIMESTAMP, '
+        'last_error TEXT, '
+        'created_at TIMESTAMP NOT NULL DEFAULT now(), '
+        'updated_at TIMESTAMP NOT NULL DEFAULT now(), '
+        'PRIMARY KEY (ticker, date))',
+        # the claims only scan the open items, however many are done
+        'CREATE INDEX IF NOT EXISTS ' + WORK_QUEUE_TABLE + '_claim_idx '
+        'ON {schema_name}.' + WORK_QUEUE_TABLE + " (date, ticker) WHERE status IN ('pending', 'running')",
+    ]),
+]
+
+# versions that create the processed table, recorded per schema and table
+# instead of once per schema: a new table reruns them, keep them idempotent
+TABLE_MIGRATIONS = {1}
+
+# (schema, table) pairs this process has already seen at the latest version
+_checked_tables = set()
+
+
+def latest_version() -> int:
+    '''
+    Returns the version of the newest migration in the registry.
+
+    :return version: (int)
+    '''
+    return max(version for version, _, _ in MIGRATIONS)
+
+
+def apply_migrations(
+        endpoint_name: str,
+        port: int,
+        db_name: str,
+        user_name: str,
+        password: str,
+        schema_name: str,
+        temp_schema_name: str,
+        table_name: str) -> int:
+    '''Brings the datawarehouse up to the latest migration.
+    The version of a schema and processed table is read at most once per
+    process and, when they are already up to date, that single query is the
+    only one sent. When the migrations created the processed table, its columns
+    are cached for the column compatibility check of insert_data_into_postgresql.
+
+    :param endpoint_name: (str)
+    The endpoint URL of your Amazon RDS instance
+
+    :param port: (int)
+    The port number to connect to the database
+
+    :param db_name: (str)
+    The name of the database to connect to
+
+    :param user_name: (str)
+    The name of the user to authenticate as
+
+    :param password: (str)
+    The user's password
+
+    :param schema_name: (str)
+    The name of the main schema
+
+    :param temp_schema_name: (str)
+    The name of the schema used for temporary tables
+
+    :param table_name: (str)
+    The name of the processed table
+
+    :return version: (int)
+    The version of the database after the call
+    '''
+    target_version = latest_version()
+    if (schema_name, table_name) in _checked_tables:
+        return target_version
+
+    conn = psycopg2.connect(
+        host=endpoint_name,
+        port=port,
+        database=db_name,
+        user=user_name,
+        password=password
+    )
+
+    created_table = False
+    try:
+        applied = _read_applied_versions(conn, schema_name, table_name)
+
+        if len(applied) < len(MIGRATIONS):
+            # the connection context manager commits on success and rolls back on error
+            with conn:
+                with conn.cursor() as cur:
+                    cur.execute('SELECT pg_advisory_xact_lock(%s)', (MIGRATIONS_LOCK_KEY,))
+                    cur.execute(
+                        f'CREATE TABLE IF NOT EXISTS {MIGRATIONS_TABLE} ('
+                        'schema_name TEXT NOT NULL, table_name TEXT NOT NULL, version INT NOT NULL, '
+                        'description TEXT, applied_at TIMESTAMP DEFAULT now(), '
+                        'PRIMARY KEY (schema_name, table_name, version))')
+
+                    # another process may have migrated while we waited for the lock
+                    cur.execute(APPLIED_VERSIONS_QUERY, (schema_name, table_name))
+                    applied = {version for version, in cur.fetchall()}
+                    cur.execute('SELECT to_regclass(%s)', (f'{schema_name}.{table_name}',))
+                    table_existed = cur.fetchone()[0] is not None
+
+                    for version, description, statements in MIGRATIONS:
+                        if version in applied:
+                            continue
+
+                        for statement in statements:
+                            cur.execute(statement.format(
+                                schema_name=schema_name,
+                                temp_schema_name=temp_schema_name,
+                                table_name=table_name))
+                        cur.execute(
+                            f'INSERT INTO {MIGRATIONS_TABLE} (schema_name, table_name, version, description) '
+                            'VALUES (%s, %s, %s, %s)',
+                            (schema_name, table_name if version in TABLE_MIGRATIONS else '', version, description))
+                        created_table = created_table or (version in TABLE_MIGRATIONS and not table_existed)
+                        logging.info(f'Migration {version} ({description}) was applied: SUCCESS')
+        else:
+            logging.info(f'The datawarehouse is already at migration {target_version}')
+
+    finally:
+        conn.close()
+
+    # only a table created here surely has these columns, the others are read from the catalog
+    if created_table:
+        cache_table_columns(schema_name, table_name, [name for name, _ in PROCESSED_TABLE_COLUMNS])
+    _checked_tables.add((schema_name, table_name))
+
+    return target_version
+
+
+def _read_applied_versions(conn, schema_name: str, table_name: str) -> set:
+    '''
+    Reads the versions already applied to a schema and processed table,
+    none if the version table does not exist yet.
+
+    :param conn: (psycopg2.connection)
+    An open connection to the database
+
+    :param schema_name: (str)
+    The name of the main schema
+
+    :param table_name: (str)
+    The name of the processed table
+
+    :return versions: (set)
+    '''
+    try:
+        with conn.cursor() as cur:
+            cur.execute(APPLIED_VERSIONS_QUERY, (schema_name, table_name))
+            versions = {version for version, in cur.fetchall()}
+        conn.rollback()
+        return versions
+
+    except errors.UndefinedTable:
+        conn.rollback()
+        return set()
@@ -8,6 +8,13 @@ Date: July/2023
 
 # import necessary packages
 import logging
+import os
+import re
+import time
+import random
+import datetime
+import threading
+import numpy as np
 import yfinance as yf
 import pandas as pd
 
@@ -17,8 +24,196 @@ logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
     datefmt='%Y-%m-%d %H:%M:%S')
 
+# source shared by the calls of get_historical_data that do not pass their own
+_default_source = None
 
-def get_historical_data(ticker: str, start_date: str, end_date: str) -> pd.DataFrame:
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: int):
+        '''
+        TokenBucket class to limit the rate of requests sent to an API.
+
+        Parameters:
+            rate (float): Tokens added per second, i.e. the sustained requests per second.
+            capacity (int): Maximum number of tokens, i.e. the largest burst of requests.
+        '''
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.last_refill = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
+        '''
+        Take one token, sleeping until one is available.
+        '''
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+                self.last_refill = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+
+            time.sleep(wait)
+
+
+class CachedYahooSource:
+    def __init__(
+            self,
+            cache_dir: str = '/tmp/yahoo_cache',
+            open_day_ttl: float = 900,
+            rate: float = 2.0,
+            burst: int = 5,
+            max_retries: int = 4,
+            backoff_base: float = 1.0,
+            downloader=None):
+        '''
+        CachedYahooSource class that fetches historical data from Yahoo Finance through
+        an on-disk cache keyed by (ticker, interval, date range), a token-bucket rate limiter
+        and retries with jittered exponential backoff.
+
+        Parameters:
+            cache_dir (str): Directory of the cached responses (default: '/tmp/yahoo_cache').
+            open_day_ttl (float): Seconds a cached range stays valid when it was fetched before
+            the day after its end, as its last candle may still change (default: 900).
+            Ranges fetched later never expire.
+            rate (float): Sustained requests per second sent to Yahoo (default: 2.0).
+            burst (int): Largest burst of requests sent to Yahoo (default: 5).
+            max_retries (int): Retries after a failed request before giving up (default: 4).
+            backoff_base (float): Base of the exponential backoff, in seconds (default: 1.0).
+            downloader (callable): Function (ticker, start_date, end_date, interval) -> pd.DataFrame
+            that performs the request (default: yfinance download).
+        '''
+        self.cache_dir = cache_dir
+        self.open_day_ttl = open_day_ttl
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.downloader = downloader or _download_from_yahoo
+        self.rate_limiter = TokenBucket(rate, burst)
+        self.hits = 0
+        self.misses = 0
+        self.fetch_latencies = []
+
+    def get_history(self, ticker: str, start_date: str, end_date: str, interval: str = '1d') -> pd.DataFrame:
+        '''
+        Get historical price data, from the cache when possible.
+
+        Parameters:
+            ticker (str): The ticker symbol of the cryptocurrency (e.g., 'ETH-USD').
+            start_date (str): Start date in the format 'YYYY-MM-DD'.
+            end_date (str): End date (exclusive) in the format 'YYYY-MM-DD'.
+            interval (str): Interval of the candles (default: '1d').
+
+        Returns:
+            pd.DataFrame: DataFrame containing historical price data.
+
+        Raises:
+            RuntimeError: If Yahoo Finance still fails or returns no data after all the retries.
+        '''
+        start_date, end_date = str(start_date), str(end_date)
+        cache_path = self._cache_path(ticker, interval, start_date, end_date)
+
+        if self._is_fresh(cache_path, end_date):
+            self.hits += 1
+            logging.info(f'The historical dataframe for {ticker} was read from the cache.')
+            return pd.read_parquet(cache_path)
+
+        self.misses += 1
+        data = self._fetch_with_retries(ticker, start_date, end_date, interval)
+        if data.empty:
+            # an empty range is never cached, it may only be a candle that is not published yet
+            return data
+
+        # write to a temporary file first so a crash never leaves a truncated entry behind
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f'{cache_path}.{os.getpid()}.tmp'
+        data.to_parquet(tmp_path)
+        os.replace(tmp_path, cache_path)
+
+        return data
+
+    def stats(self) -> dict:
+        '''
+        Report the cache hit ratio and the latency of the requests sent to Yahoo.
+
+        Returns:
+            stats (dict): hits, misses, hit_ratio, fetches and the fetch latency in ms (mean, p50, p99, max).
+        '''
+        lookups = self.hits + self.misses
+        latencies = np.array(self.fetch_latencies) * 1000 if self.fetch_latencies else np.zeros(1)
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+            'fetches': len(self.fetch_latencies),
+            'fetch_latency_mean_ms': float(latencies.mean()),
+            'fetch_latency_p50_ms': float(np.percentile(latencies, 50)),
+            'fetch_latency_p99_ms': float(np.percentile(latencies, 99)),
+            'fetch_latency_max_ms': float(latencies.max()),
+        }
+
+    def _fetch_with_retries(self, ticker: str, start_date: str, end_date: str, interval: str) -> pd.DataFrame:
+        '''
+        Send the request to Yahoo, retrying failed and empty responses with full-jitter backoff.
+        '''
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire()
+            start = time.perf_counter()
+            try:
+                data = self.downloader(ticker, start_date, end_date, interval)
+                if data is None or data.empty:
+                    raise ValueError('empty response')
+                return data
+
+            except Exception as e:
+                if attempt == self.max_retries:
+                    logging.error(f'Error fetching data for {ticker} after {attempt + 1} attempts: {e}.')
+                    raise RuntimeError(f'Failed to fetch data for {ticker} from Yahoo Finance.') from e
+
+                wait = random.uniform(0, self.backoff_base * 2 ** attempt)
+                logging.warning(f'Error fetching data for {ticker}: {e}. Retrying in {wait:.1f}s.')
+                time.sleep(wait)
+
+            finally:
+                self.fetch_latencies.append(time.perf_counter() - start)
+
+    def _cache_path(self, ticker: str, interval: str, start_date: str, end_date: str) -> str:
+        '''
+        Path of the cache entry of a request.
+        '''
+        key = re.sub(r'[^A-Za-z0-9._=-]', '_', f'{ticker}_{interval}_{start_date}_{end_date}')
+        return os.path.join(self.cache_dir, f'{key}.parquet')
+
+    def _is_fresh(self, cache_path: str, end_date: str) -> bool:
+        '''
+        Whether a cache entry exists and can still be used. An entry fetched on a later
+        day (UTC) than the end of its range only holds settled candles and never expires.
+        One fetched earlier, e.g. during the day the range ends, expires after open_day_ttl.
+        '''
+        if not os.path.exists(cache_path):
+            return False
+
+        fetched_at = os.path.getmtime(cache_path)
+        fetched_on = datetime.datetime.fromtimestamp(fetched_at, datetime.timezone.utc).date()
+        if fetched_on > datetime.date.fromisoformat(end_date[:10]):
+            return True
+
+        return time.time() - fetched_at < self.open_day_ttl
+
+
+def _download_from_yahoo(ticker: str, start_date: str, end_date: str, interval: str) -> pd.DataFrame:
+    '''
+    Send a single request to Yahoo Finance.
+    '''
+    return yf.download(ticker, start=start_date, end=end_date, interval=interval, progress=False)
+
+
+def get_historical_data(
+        ticker: str, start_date: str, end_date: str, source: CachedYahooSource = None) -> pd.DataFrame:
     '''
     Get historical price data from Yahoo Finance.
 
@@ -26,15 +221,22 @@ def get_historical_data(ticker: str, start_date: str, end_date: str) -> pd.DataF
         ticker (str): The ticker symbol of the cryptocurrency (e.g., 'ETH-USD').
         start_date (str): Start date in the format 'YYYY-MM-DD'.
         end_date (str): End date in the format 'YYYY-MM-DD'.
+        source (CachedYahooSource): Source used to fetch the data. A shared one,
+        caching under YAHOO_CACHE_DIR (default '/tmp/yahoo_cache'), is used if not given.
 
     Returns:
         pd.DataFrame: DataFrame containing historical price data.
+
+    Raises:
+        RuntimeError: If no data could be fetched, instead of returning an empty DataFrame.
     '''
-    try:
-        data = yf.download(ticker, start=start_date, end=end_date)
-        logging.info(f'The historical dataframe for {ticker} were fetched successfully.')
-        return data
-    
-    except Exception as e:
-        logging.error(f'Error fetching data: {e}.')
-        return pd.DataFrame()
+    global _default_source
+
+    if source is None:
+        if _default_source is None:
+            _default_source = CachedYahooSource(cache_dir=os.getenv('YAHOO_CACHE_DIR', '/tmp/yahoo_cache'))
+        source = _default_source
+
+    data = source.get_history(ticker, start_date, end_date)
+    logging.info(f'The historical dataframe for {ticker} were fetched successfully.')
+    return data
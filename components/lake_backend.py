@@ -0,0 +1,290 @@
+'''
+Component with the storage backends of the data lake:
+AWS S3 and the local filesystem, sharing the same key layout
+
+Author: Vitor Abdo
+Date: Oct/2026
+'''
+
+# import necessary packages
+import os
+import abc
+import shutil
+import logging
+import tempfile
+import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+logging.basicConfig(
+    level=logging.INFO,
+    filemode='w',
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S')
+
+
+class LakeBackend(abc.ABC):
+    '''
+    Interface of a data lake backend. Keys are '/' separated paths such as
+    'raw/crypto_anomaly_detect/eth/extracted_at=2023-08-01/eth_historical_data.csv'.
+    '''
+    @abc.abstractmethod
+    def put_file(self, local_path: str, key: str) -> None:
+        '''
+        Upload a local file to the lake.
+
+        Parameters:
+            local_path (str): Path of the file to upload.
+            key (str): Destination key in the lake.
+        '''
+
+    def put_bytes(self, data: bytes, key: str) -> None:
+        '''
+        Write a byte string to the lake.
+
+        Parameters:
+            data (bytes): Content of the object.
+            key (str): Destination key in the lake.
+        '''
+        fd, tmp_path = tempfile.mkstemp(suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as tmp_file:
+                tmp_file.write(data)
+            self.put_file(tmp_path, key)
+        finally:
+            os.remove(tmp_path)
+
+    @abc.abstractmethod
+    def get_bytes(self, key: str) -> bytes:
+        '''
+        Read an object of the lake.
+
+        Parameters:
+            key (str): Key of the object.
+
+        Returns:
+            data (bytes): Content of the object.
+        '''
+
+    @abc.abstractmethod
+    def exists(self, key: str) -> bool:
+        '''
+        Check whether an object is in the lake, without listing its prefix.
+
+        Parameters:
+            key (str): Key of the object.
+
+        Returns:
+            exists (bool): Whether the object exists.
+        '''
+
+    @abc.abstractmethod
+    def list_keys(self, prefix: str, start_after: str = None) -> list:
+        '''
+        List the keys of the lake that start with a prefix.
+
+        Parameters:
+            prefix (str): Prefix of the keys.
+            start_after (str): Only list the keys that sort after this one, skipping the
+            listing of the earlier ones where the backend allows it (default: None).
+
+        Returns:
+            keys (list): Sorted keys.
+        '''
+
+    @abc.abstractmethod
+    def list_versions(self, prefix: str) -> dict:
+        '''
+        List the keys of the lake that start with a prefix, with a token that changes
+        whenever the object is rewritten, so readers can fetch only what changed.
+
+        Parameters:
+            prefix (str): Prefix of the keys.
+
+        Returns:
+            versions (dict): Mapping from key to version token.
+        '''
+
+    def read_table(self, key: str) -> pa.Table:
+        '''
+        Read a parquet, Arrow IPC (.arrow/.feather) or csv object as an Arrow table.
+
+        Parameters:
+            key (str): Key of the object.
+
+        Returns:
+            table (pa.Table): Content of the object.
+        '''
+        return _decode_table(key, pa.BufferReader(self.get_bytes(key)))
+
+
+class S3LakeBackend(LakeBackend):
+    def __init__(self, bucket_name: str, aws_access_key_id: str, aws_secret_access_key: str, region_name: str,
+                 max_pool_connections: int = 32):
+        '''
+        S3LakeBackend class that keeps the data lake in an AWS S3 bucket. The client is
+        thread-safe and keeps a pool of connections, reused by concurrent reads.
+
+        Parameters:
+            bucket_name (str): Name of the S3 bucket.
+            aws_access_key_id (str): AWS access key ID.
+            aws_secret_access_key (str): AWS secret access key.
+            region_name (str): AWS region name.
+            max_pool_connections (int): Connections kept open to S3 (default: 32).
+        '''
+        # Create a session with AWS credentials
+        session = boto3.Session(
+            aws_access_key_id=aws_access_key_id,
+            aws_secret_access_key=aws_secret_access_key,
+            region_name=region_name
+        )
+
+        # Create a client instance for S3
+        self.s3_client = session.client('s3', config=Config(max_pool_connections=max_pool_connections))
+        self.bucket_name = bucket_name
+        logging.info('S3 authentication was created successfully.')
+
+    def put_file(self, local_path: str, key: str) -> None:
+        self.s3_client.upload_file(local_path, self.bucket_name, key)
+
+    def get_bytes(self, key: str) -> bytes:
+        response = self.s3_client.get_object(Bucket=self.bucket_name, Key=key)
+        return response['Body'].read()
+
+    def exists(self, key: str) -> bool:
+        try:
+            self.s3_client.head_object(Bucket=self.bucket_name, Key=key)
+            return True
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('404', 'NoSuchKey', 'NotFound'):
+                return False
+            raise
+
+    def list_keys(self, prefix: str, start_after: str = None) -> list:
+        keys = []
+        paginator = self.s3_client.get_paginator('list_objects_v2')
+        start_after = {'StartAfter': start_after} if start_after else {}
+        for page in paginator.paginate(Bucket=self.bucket_name, Prefix=prefix, **start_after):
+            keys.extend(obj['Key'] for obj in page.get('Contents', []))
+        return sorted(keys)
+
+    def list_versions(self, prefix: str) -> dict:
+        versions = {}
+        paginator = self.s3_client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket_name, Prefix=prefix):
+            versions.update((obj['Key'], obj['ETag']) for obj in page.get('Contents', []))
+        return versions
+
+
+class LocalLakeBackend(LakeBackend):
+    def __init__(self, root_dir: str):
+        '''
+        LocalLakeBackend class that keeps the data lake in a local directory,
+        with the same key layout as the S3 bucket. Writes are atomic renames,
+        so readers never see a partially written object.
+
+        Parameters:
+            root_dir (str): Directory that plays the role of the bucket.
+        '''
+        self.root_dir = root_dir
+
+    def put_file(self, local_path: str, key: str) -> None:
+        destination = self._path(key)
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+
+        # copy next to the destination first, the rename is atomic inside a filesystem
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(destination), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as tmp_file, open(local_path, 'rb') as source_file:
+                shutil.copyfileobj(source_file, tmp_file)
+            os.replace(tmp_path, destination)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def get_bytes(self, key: str) -> bytes:
+        with open(self._path(key), 'rb') as f:
+            return f.read()
+
+    def exists(self, key: str) -> bool:
+        return os.path.isfile(self._path(key))
+
+    def list_keys(self, prefix: str, start_after: str = None) -> list:
+        # only walk the deepest directory that contains the whole prefix
+        keys = []
+        start_dir = self._path(prefix.rsplit('/', 1)[0]) if '/' in prefix else self.root_dir
+        for directory, _, files in os.walk(start_dir):
+            for name in files:
+                if name.endswith('.tmp'):
+                    continue
+                key = os.path.relpath(os.path.join(directory, name), self.root_dir).replace(os.sep, '/')
+                if key.startswith(prefix) and (start_after is None or key > start_after):
+                    keys.append(key)
+        return sorted(keys)
+
+    def list_versions(self, prefix: str) -> dict:
+        versions = {}
+        for key in self.list_keys(prefix):
+            # writes are atomic renames of a new file, so a rewrite changes the inode
+            stat = os.stat(self._path(key))
+            versions[key] = f'{stat.st_ino}-{stat.st_mtime_ns}-{stat.st_size}'
+        return versions
+
+    def read_table(self, key: str) -> pa.Table:
+        '''
+        Read an object as an Arrow table from a memory map of the file. Arrow IPC
+        objects are zero-copy (the table points into the page cache); parquet and
+        csv objects are decoded from the map without reading the file into a buffer first.
+        '''
+        return _decode_table(key, pa.memory_map(self._path(key), 'r'))
+
+    def _path(self, key: str) -> str:
+        '''
+        Local path of a key.
+        '''
+        return os.path.join(self.root_dir, *key.split('/'))
+
+
+def _decode_table(key: str, source) -> pa.Table:
+    '''
+    Decode an Arrow table from a pyarrow file-like source according to the key extension.
+    '''
+    if key.endswith('.parquet'):
+        return pq.read_table(source)
+    if key.endswith(('.arrow', '.feather')):
+        return pa.ipc.open_file(source).read_all()
+    if key.endswith('.csv'):
+        return pa_csv.read_csv(source)
+    raise ValueError(f'Unsupported object format for {key}')
+
+
+def get_lake_backend(
+        backend_name: str,
+        bucket_name: str = None,
+        aws_access_key_id: str = None,
+        aws_secret_access_key: str = None,
+        region_name: str = None,
+        root_dir: str = None) -> LakeBackend:
+    '''
+    Create the data lake backend selected by configuration.
+
+    Parameters:
+        backend_name (str): 's3' or 'local'.
+        bucket_name (str): Name of the S3 bucket (s3 only).
+        aws_access_key_id (str): AWS access key ID (s3 only).
+        aws_secret_access_key (str): AWS secret access key (s3 only).
+        region_name (str): AWS region name (s3 only).
+        root_dir (str): Directory of the lake (local only).
+
+    Returns:
+        backend (LakeBackend): The configured backend.
+    '''
+    if backend_name == 's3':
+        return S3LakeBackend(bucket_name, aws_access_key_id, aws_secret_access_key, region_name)
+    if backend_name == 'local':
+        return LocalLakeBackend(root_dir)
+    raise ValueError(f"Unknown lake backend '{backend_name}', expected 's3' or 'local'")
@@ -0,0 +1,235 @@
+'''
+Component to keep the pipeline inside the memory budget
+of its container: tracks the process RSS and tracemalloc
+per stage, adapts chunk sizes and fails fast before the OOM killer
+
+Author: Vitor Abdo
+Date: Oct/2026
+'''
+
+# import necessary packages
+import os
+import time
+import _thread
+import logging
+import resource
+import threading
+import contextlib
+import tracemalloc
+
+logging.basicConfig(
+    level=logging.INFO,
+    filemode='w',
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S')
+
+
+class MemoryBudgetExceeded(MemoryError):
+    '''
+    Raised when the process RSS goes over the hard limit of the memory budget.
+    The args hold the allocation report of the stage that was running.
+    '''
+
+
+def current_rss_mb() -> float:
+    '''
+    Current resident set size of this process, in MB.
+    Falls back to the peak RSS where /proc is not available.
+
+    Returns:
+        rss (float): Resident set size in MB.
+    '''
+    try:
+        with open('/proc/self/statm') as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+
+    except (OSError, ValueError, IndexError):
+        # ru_maxrss is in KB on Linux and in bytes on macOS
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class MemoryGovernor:
+    def __init__(
+            self,
+            budget_mb: float = 512,
+            soft_fraction: float = 0.75,
+            hard_fraction: float = 0.9,
+            sample_interval: float = 0.05,
+            trace_allocations: bool = False,
+            top_allocations: int = 10):
+        '''
+        MemoryGovernor class that watches the memory of the process during the pipeline stages.
+
+        Parameters:
+            budget_mb (float): Memory of the container, in MB (default: 512, the Fargate task memory).
+            soft_fraction (float): Fraction of the budget that chunked readers and writers aim to stay under (default: 0.75).
+            hard_fraction (float): Fraction of the budget above which the stage fails (default: 0.9).
+            sample_interval (float): Seconds between two RSS samples during a stage (default: 0.05).
+            trace_allocations (bool): Whether to trace python allocations with tracemalloc, which slows
+            down allocation-heavy stages (default: False).
+            top_allocations (int): Number of source lines listed in the allocation report (default: 10).
+        '''
+        self.budget_mb = budget_mb
+        self.soft_limit_mb = budget_mb * soft_fraction
+        self.hard_limit_mb = budget_mb * hard_fraction
+        self.sample_interval = sample_interval
+        self.trace_allocations = trace_allocations
+        self.top_allocations = top_allocations
+        self.stages = []
+        self._exceeded = None
+        self._interrupt_pending = False
+
+    def headroom_mb(self) -> float:
+        '''
+        Memory left before the soft limit, in MB.
+        '''
+        return self.soft_limit_mb - current_rss_mb()
+
+    def chunk_size(self, row_bytes: int, min_rows: int = 1000, max_rows: int = 1000000, safety_factor: float = 4) -> int:
+        '''
+        Number of rows a chunked reader or writer can hold at once without leaving the soft limit.
+
+        Parameters:
+            row_bytes (int): Approximate size of one row in memory, in bytes.
+            min_rows (int): Smallest chunk returned, even without headroom (default: 1000).
+            max_rows (int): Largest chunk returned (default: 1000000).
+            safety_factor (float): Copies of a chunk expected to be alive at the same time,
+            e.g. driver buffer, python objects and numpy array (default: 4).
+
+        Returns:
+            rows (int): The chunk size.
+        '''
+        rows = int(max(self.headroom_mb(), 0) * 2 ** 20 / (row_bytes * safety_factor))
+        return max(min_rows, min(max_rows, rows))
+
+    def check(self, stage: str = None) -> None:
+        '''
+        Fail if the RSS is over the hard limit. Chunked loops can call it between chunks.
+
+        Parameters:
+            stage (str): Name of the stage, for the error message.
+
+        Raises:
+            MemoryBudgetExceeded: If the RSS is over the hard limit.
+        '''
+        rss = current_rss_mb()
+        if rss > self.hard_limit_mb:
+            raise MemoryBudgetExceeded(
+                f'RSS {rss:.0f} MB is over the hard limit of {self.hard_limit_mb:.0f} MB '
+                f'(budget {self.budget_mb:.0f} MB) during stage {stage}')
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        '''
+        Watch the memory of a stage. A sampler thread interrupts the stage as soon as the RSS
+        goes over the hard limit, and MemoryBudgetExceeded is raised with the allocation report.
+
+        Parameters:
+            name (str): Name of the stage.
+        '''
+        started_tracing = False
+        if self.trace_allocations:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracing = True
+            tracemalloc.reset_peak()
+
+        record = {'stage': name, 'rss_start_mb': current_rss_mb()}
+        record['rss_peak_mb'] = record['rss_start_mb']
+        self._exceeded = None
+        self._interrupt_pending = False
+
+        stop = threading.Event()
+        sampler = threading.Thread(target=self._sample, args=(record, stop), daemon=True)
+        sampler.start()
+        start = time.perf_counter()
+
+        exceeded = None
+        try:
+            yield record
+
+        except KeyboardInterrupt:
+            if not self._interrupt_pending:
+                raise
+            self._interrupt_pending = False
+            exceeded = self._exceeded
+
+        except MemoryBudgetExceeded as e:
+            exceeded = str(e.args[0])
+
+        finally:
+            # runs for any exception too, so the sampler never outlives its stage
+            self._finish(record, start, stop, sampler, started_tracing)
+
+        # the interrupt of the sampler may have landed in _finish, after the stage body returned
+        exceeded = exceeded or self._exceeded
+        if exceeded is not None:
+            logging.error(f'Memory budget exceeded, allocation report: {record}')
+            raise MemoryBudgetExceeded(exceeded, record) from None
+
+        logging.info(
+            f'Stage {name}: RSS peak {record["rss_peak_mb"]:.0f} MB of {self.budget_mb:.0f} MB, '
+            f'python allocations peak {record.get("traced_peak_mb", 0):.1f} MB')
+
+    def report(self) -> list:
+        '''
+        Memory report of every stage watched so far.
+
+        Returns:
+            stages (list): One dict per stage with the RSS at start, peak and end, the
+            tracemalloc peak and the source lines with the largest allocations.
+        '''
+        return self.stages
+
+    def _sample(self, record: dict, stop: threading.Event) -> None:
+        '''
+        Sample the RSS until the stage ends, interrupting the main thread over the hard limit.
+        '''
+        while not stop.wait(self.sample_interval):
+            rss = current_rss_mb()
+            record['rss_peak_mb'] = max(record['rss_peak_mb'], rss)
+            if rss > self.hard_limit_mb:
+                self._exceeded = (
+                    f'RSS {rss:.0f} MB is over the hard limit of {self.hard_limit_mb:.0f} MB '
+                    f'(budget {self.budget_mb:.0f} MB) during stage {record["stage"]}')
+                self._interrupt_pending = True
+                _thread.interrupt_main()
+                return
+
+    def _finish(self, record: dict, start: float, stop: threading.Event, sampler: threading.Thread,
+                started_tracing: bool) -> None:
+        '''
+        Stop the sampler and complete the record of a stage. An interrupt of the sampler
+        that was not delivered to the stage body is consumed here, so it never escapes as
+        a KeyboardInterrupt: the stage raises MemoryBudgetExceeded instead.
+        '''
+        try:
+            stop.set()
+            sampler.join()
+
+            # the interrupt lands on the next bytecode boundary of the main thread
+            deadline = time.monotonic() + 1
+            while self._interrupt_pending and time.monotonic() < deadline:
+                time.sleep(0.001)
+
+        except KeyboardInterrupt:
+            if not self._interrupt_pending:
+                raise
+            self._interrupt_pending = False
+
+        record['seconds'] = time.perf_counter() - start
+        record['rss_end_mb'] = current_rss_mb()
+        record['rss_peak_mb'] = max(record['rss_peak_mb'], record['rss_end_mb'])
+
+        if tracemalloc.is_tracing():
+            _, traced_peak = tracemalloc.get_traced_memory()
+            record['traced_peak_mb'] = traced_peak / 2 ** 20
+            statistics = tracemalloc.take_snapshot().statistics('lineno')[:self.top_allocations]
+            record['top_allocations'] = [
+                {'line': str(stat.traceback[0]), 'size_mb': stat.size / 2 ** 20, 'count': stat.count}
+                for stat in statistics]
+            if started_tracing:
+                tracemalloc.stop()
+
+        self.stages.append(record)
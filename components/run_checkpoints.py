@@ -0,0 +1,206 @@
+'''
+Component to checkpoint the stages of a pipeline run in the
+data lake, so a rerun for the same date skips the finished
+stages and reuses their artifacts
+
+Author: Vitor Abdo
+Date: Oct/2026
+'''
+
+# import necessary packages
+import io
+import json
+import hashlib
+import logging
+import datetime
+import pandas as pd
+
+from components.lake_backend import LakeBackend
+
+logging.basicConfig(
+    level=logging.INFO,
+    filemode='w',
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S')
+
+
+def hash_bytes(data: bytes) -> str:
+    '''
+    Content hash of a byte string.
+
+    Parameters:
+        data (bytes): Content to hash.
+
+    Returns:
+        digest (str): Hex sha256 digest.
+    '''
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_dataframe(df: pd.DataFrame) -> str:
+    '''
+    Content hash of a dataframe, independent of how it is serialized.
+
+    Parameters:
+        df (pd.DataFrame): Dataframe to hash.
+
+    Returns:
+        digest (str): Hex sha256 digest of the columns, index and values.
+    '''
+    digest = hashlib.sha256()
+    digest.update(json.dumps([str(col) for col in df.columns]).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+    return digest.hexdigest()
+
+
+class RunCheckpoints:
+    def __init__(self, backend: LakeBackend, run_date: str, stages: list, asset: str = 'eth'):
+        '''
+        RunCheckpoints class that records, in the data lake, each completed stage of the run
+        of a date together with the content hash of its output and of its input. A stage is
+        only considered done if its input hash is unchanged, so redoing a stage invalidates
+        everything that consumed its previous output.
+
+        Parameters:
+            backend (LakeBackend): Lake where the manifest and the artifacts are stored.
+            run_date (str): Date of the run in the format 'YYYY-MM-DD'.
+            stages (list): Names of the stages in execution order.
+            asset (str): Lower case name of the asset in the lake keys (default: 'eth').
+        '''
+        self.backend = backend
+        self.stages = list(stages)
+        self.prefix = f'checkpoints/crypto_anomaly_detect/{asset}/run_date={run_date}/'
+        self.manifest_key = f'{self.prefix}manifest.json'
+        self.manifest = self._load_manifest()
+
+    def is_done(self, stage: str, input_hash: str = None) -> bool:
+        '''
+        Whether a stage was completed in a previous attempt with the same input.
+
+        Parameters:
+            stage (str): Name of the stage.
+            input_hash (str): Content hash of the stage input, None if it has no input.
+
+        Returns:
+            done (bool)
+        '''
+        entry = self.manifest.get(stage)
+        if entry is None or entry.get('input_hash') != input_hash:
+            return False
+
+        logging.info(f'Stage {stage} was already completed at {entry["completed_at"]}, skipping it.')
+        return True
+
+    def output_hash(self, stage: str) -> str:
+        '''
+        Content hash of the output of a completed stage.
+
+        Parameters:
+            stage (str): Name of the stage.
+
+        Returns:
+            digest (str)
+        '''
+        return self.manifest[stage]['output_hash']
+
+    def complete(self, stage: str, output_hash: str, input_hash: str = None, artifact: bytes = None,
+                 artifact_format: str = None) -> None:
+        '''
+        Record a stage as completed, storing its artifact if it has one.
+
+        Parameters:
+            stage (str): Name of the stage.
+            output_hash (str): Content hash of the stage output.
+            input_hash (str): Content hash of the stage input, None if it has no input.
+            artifact (bytes): Serialized output to reuse on a rerun (default: None).
+            artifact_format (str): Extension of the artifact, e.g. 'parquet' or 'json'.
+        '''
+        entry = {
+            'completed_at': datetime.datetime.now().isoformat(),
+            'output_hash': output_hash,
+            'input_hash': input_hash,
+        }
+
+        if artifact is not None:
+            entry['artifact_key'] = f'{self.prefix}{stage}.{artifact_format}'
+            entry['artifact_hash'] = hash_bytes(artifact)
+            self.backend.put_bytes(artifact, entry['artifact_key'])
+
+        self.manifest[stage] = entry
+        self._save_manifest()
+        logging.info(f'Checkpoint of stage {stage} was saved.')
+
+    def complete_dataframe(self, stage: str, df: pd.DataFrame, input_hash: str = None) -> str:
+        '''
+        Record a stage whose output is a dataframe, stored as a parquet artifact.
+
+        Parameters:
+            stage (str): Name of the stage.
+            df (pd.DataFrame): Output of the stage.
+            input_hash (str): Content hash of the stage input, None if it has no input.
+
+        Returns:
+            digest (str): Content hash of the dataframe.
+        '''
+        buffer = io.BytesIO()
+        df.to_parquet(buffer)
+        output_hash = hash_dataframe(df)
+        self.complete(stage, output_hash, input_hash, buffer.getvalue(), 'parquet')
+        return output_hash
+
+    def load_artifact(self, stage: str) -> bytes:
+        '''
+        Read the artifact of a completed stage, checking its content hash.
+
+        Parameters:
+            stage (str): Name of the stage.
+
+        Returns:
+            artifact (bytes)
+
+        Raises:
+            ValueError: If the stored artifact does not match the recorded hash.
+        '''
+        entry = self.manifest[stage]
+        artifact = self.backend.get_bytes(entry['artifact_key'])
+        if hash_bytes(artifact) != entry['artifact_hash']:
+            raise ValueError(f'The artifact of stage {stage} is corrupted, rerun it with --force-stage {stage}')
+        return artifact
+
+    def load_dataframe(self, stage: str) -> pd.DataFrame:
+        '''
+        Read the dataframe artifact of a completed stage.
+
+        Parameters:
+            stage (str): Name of the stage.
+
+        Returns:
+            df (pd.DataFrame)
+        '''
+        return pd.read_parquet(io.BytesIO(self.load_artifact(stage)))
+
+    def invalidate_from(self, stage: str) -> None:
+        '''
+        Forget a stage and every stage after it, so they run again.
+
+        Parameters:
+            stage (str): Name of the first stage to run again.
+        '''
+        for later_stage in self.stages[self.stages.index(stage):]:
+            self.manifest.pop(later_stage, None)
+        self._save_manifest()
+        logging.info(f'Checkpoints from stage {stage} onwards were invalidated.')
+
+    def _load_manifest(self) -> dict:
+        '''
+        Read the manifest of the run, empty if this is the first attempt.
+        '''
+        if not self.backend.exists(self.manifest_key):
+            return {}
+        return json.loads(self.backend.get_bytes(self.manifest_key))
+
+    def _save_manifest(self) -> None:
+        '''
+        Write the manifest of the run.
+        '''
+        self.backend.put_bytes(json.dumps(self.manifest, indent=2).encode(), self.manifest_key)
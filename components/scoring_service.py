@@ -0,0 +1,425 @@
+'''
+Component with the HTTP scoring service: the fitted detector
+state of every ticker is kept in memory, ad-hoc values are scored
+without re-running the batch job and new daily fits are hot-reloaded
+
+Author: Vitor Abdo
+Date: Oct/2026
+'''
+
+# import necessary packages
+import math
+import json
+import asyncio
+import logging
+import datetime
+import urllib.parse
+import numpy as np
+from scipy import special
+
+from components.lake_backend import LakeBackend
+from components.anomaly_detection_system import AnomalyDetector, detect_outliers_iqr, DETECTOR_VERSION
+
+logging.basicConfig(
+    level=logging.INFO,
+    filemode='w',
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S')
+
+# one object per ticker, overwritten by every new fit
+DETECTOR_STATE_PREFIX = 'models/crypto_anomaly_detect/detector_state/'
+
+# largest request body accepted, in bytes
+MAX_BODY_BYTES = 10 * 2 ** 20
+
+HTTP_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 413: 'Payload Too Large',
+                500: 'Internal Server Error'}
+
+
+class UnknownTickerError(KeyError):
+    '''
+    Raised when a ticker has no fitted detector state.
+    '''
+
+
+def build_detector_state(ticker: str, fitted_at: str, data_distribution: np.array, anomaly_detector: AnomalyDetector,
+                         volatility_state: dict = None) -> dict:
+    '''
+    Build the state the scoring service needs to score a ticker: the IQR bounds of the
+    history and the mean, std and threshold of the cleaned history.
+
+    Parameters:
+        ticker (str): The ticker symbol (e.g., 'ETH-USD').
+        fitted_at (str): Last day of the history in the format 'YYYY-MM-DD'.
+        data_distribution (array-like): History the detector was fitted on, before outlier elimination.
+        anomaly_detector (AnomalyDetector): The fitted detector.
+        volatility_state (dict): State of the volatility-adaptive detector of the ticker, from
+        VolatilityAdaptiveDetector.state, carried to the next daily run (default: None).
+
+    Returns:
+        state (dict): JSON serializable detector state.
+    '''
+    iqr_lower_bound, iqr_upper_bound = detect_outliers_iqr(data_distribution, return_thresholds=True)
+    state = {
+        'ticker': ticker,
+        'fitted_at': str(fitted_at),
+        'iqr_lower_bound': float(iqr_lower_bound),
+        'iqr_upper_bound': float(iqr_upper_bound),
+        'mean': float(anomaly_detector.mean),
+        'std': float(anomaly_detector.std),
+        'threshold': float(anomaly_detector.threshold),
+        'detector_version': DETECTOR_VERSION,
+    }
+    if volatility_state is not None:
+        state['volatility'] = volatility_state
+    return state
+
+
+def load_detector_state(backend: LakeBackend, ticker: str) -> dict:
+    '''
+    Read the last published detector state of a ticker.
+
+    Parameters:
+        backend (LakeBackend): Lake where the states are published.
+        ticker (str): The ticker symbol.
+
+    Returns:
+        state (dict): The detector state, None if the ticker was never published.
+    '''
+    key = f'{DETECTOR_STATE_PREFIX}{ticker}.json'
+    if not backend.exists(key):
+        return None
+    return json.loads(backend.get_bytes(key))
+
+
+def publish_detector_state(backend: LakeBackend, state: dict) -> str:
+    '''
+    Write the detector state of a ticker to the lake, where the scoring service picks it up.
+
+    Parameters:
+        backend (LakeBackend): Lake read by the scoring service.
+        state (dict): State built by build_detector_state.
+
+    Returns:
+        key (str): Key of the state object.
+    '''
+    key = f'{DETECTOR_STATE_PREFIX}{state["ticker"]}.json'
+    backend.put_bytes(json.dumps(state).encode(), key)
+    logging.info(f'The detector state of {state["ticker"]} fitted at {state["fitted_at"]} was published.')
+    return key
+
+
+class DetectorStateStore:
+    def __init__(self, backend: LakeBackend, prefix: str = DETECTOR_STATE_PREFIX):
+        '''
+        DetectorStateStore class that keeps the detector state of every ticker in memory.
+        A reload only downloads the state objects that changed since the previous one, and
+        swaps the whole mapping at once, so a request never sees a half reloaded store.
+
+        Parameters:
+            backend (LakeBackend): Lake where the states are published.
+            prefix (str): Prefix of the state objects (default: DETECTOR_STATE_PREFIX).
+        '''
+        self.backend = backend
+        self.prefix = prefix
+        self.states = {}
+        self.versions = {}
+        self.loaded_at = None
+
+    def reload(self) -> int:
+        '''
+        Load the new and rewritten states and drop the ones that were deleted.
+
+        Returns:
+            n_changed (int): Number of states loaded or dropped.
+        '''
+        versions = self.backend.list_versions(self.prefix)
+        changed = [key for key, version in versions.items() if self.versions.get(key) != version]
+        removed = [key for key in self.versions if key not in versions]
+
+        states = dict(self.states)
+        for key in removed:
+            states.pop(key[len(self.prefix):-len('.json')], None)
+        for key in changed:
+            state = json.loads(self.backend.get_bytes(key))
+            states[state['ticker']] = state
+
+        self.states, self.versions = states, versions
+        self.loaded_at = datetime.datetime.now().isoformat()
+        if changed or removed:
+            logging.info(f'{len(changed)} detector states were loaded and {len(removed)} dropped, '
+                         f'{len(states)} tickers are served.')
+        return len(changed) + len(removed)
+
+    def score(self, ticker: str, value: float) -> dict:
+        '''
+        Score a value of a ticker, with the same rule as AnomalyDetector.
+
+        Parameters:
+            ticker (str): The ticker symbol.
+            value (float): The price amplitude to score.
+
+        Returns:
+            result (dict): z-score (None if the history was constant), p-value, bounds,
+            anomaly flag, IQR outlier flag and state metadata.
+
+        Raises:
+            UnknownTickerError: If the ticker has no fitted state.
+            ValueError: If the value is not finite.
+        '''
+        state = self.states.get(ticker)
+        if state is None:
+            raise UnknownTickerError(ticker)
+        if not math.isfinite(value):
+            raise ValueError(f'value must be a finite number, got {value}')
+
+        if state['std'] > 0:
+            z_score = (value - state['mean']) / state['std']
+            return self._result(state, value, z_score, math.erfc(abs(z_score) / math.sqrt(2)))
+
+        # constant history: the z-score is undefined, and any other value has a p-value of 0
+        return self._result(state, value, None, float(value == state['mean']))
+
+    def score_batch(self, items: list) -> list:
+        '''
+        Score many (ticker, value) pairs, with the statistics computed in one vectorized pass.
+        An unknown ticker, or a value that is missing, not a number or not finite, gives an error
+        entry instead of failing the whole batch.
+
+        Parameters:
+            items (list): Dicts with the 'ticker' and 'value' keys.
+
+        Returns:
+            results (list): One result or {'ticker', 'error'} dict per item, in the same order.
+        '''
+        states = self.states
+        known = [(i, states.get(item['ticker']), self._parse_value(item)) for i, item in enumerate(items)]
+        scored = [(i, state, value) for i, state, value in known if state is not None and math.isfinite(value)]
+
+        values = np.array([value for _, _, value in scored])
+        means = np.array([state['mean'] for _, state, _ in scored])
+        stds = np.array([state['std'] for _, state, _ in scored])
+        constant = ~(stds > 0)
+        z_scores = (values - means) / np.where(constant, 1.0, stds)
+        p_values = np.where(constant, (values == means).astype(float), special.erfc(np.abs(z_scores) / np.sqrt(2)))
+
+        results = [{'ticker': item['ticker'], 'error': 'unknown ticker' if state is None else 'invalid value'}
+                   for item, (_, state, _) in zip(items, known)]
+        for (i, state, value), z_score, p_value, is_constant in zip(
+                scored, z_scores.tolist(), p_values.tolist(), constant.tolist()):
+            results[i] = self._result(state, value, None if is_constant else z_score, p_value)
+        return results
+
+    @staticmethod
+    def _parse_value(item: dict) -> float:
+        '''
+        Value of a batch item as a float, NaN when it is missing or not a number.
+        '''
+        try:
+            return float(item['value'])
+        except (KeyError, TypeError, ValueError):
+            return math.nan
+
+    @staticmethod
+    def _result(state: dict, value: float, z_score: float, p_value: float) -> dict:
+        '''
+        Result of a scored value, with the fields of the anomaly events, and the score
+        against the volatility forecast of the next day when the state has one.
+        '''
+        lower_bound = state['mean'] - state['threshold']
+        upper_bound = state['mean'] + state['threshold']
+        result = {
+            'ticker': state['ticker'],
+            'value': value,
+            'z_score': z_score,
+            'p_value': p_value,
+            'lower_bound': lower_bound,
+            'upper_bound': upper_bound,
+            'is_anomaly': value > upper_bound or value < lower_bound,
+            'iqr_outlier': value > state['iqr_upper_bound'] or value < state['iqr_lower_bound'],
+            'fitted_at': state['fitted_at'],
+            'detector_version': state['detector_version'],
+        }
+
+        volatility = state.get('volatility')
+        if volatility is not None and volatility['variance'] > 0:
+            volatility_z_score = (value - volatility['mean']) / math.sqrt(volatility['variance'])
+            result['volatility_z_score'] = volatility_z_score
+            result['volatility_p_value'] = math.erfc(abs(volatility_z_score) / math.sqrt(2))
+            result['volatility_is_anomaly'] = abs(volatility_z_score) > volatility['sigma']
+        return result
+
+
+class ScoringService:
+    def __init__(self, store: DetectorStateStore, host: str = '0.0.0.0', port: int = 80, reload_seconds: float = 60):
+        '''
+        ScoringService class with a small asyncio HTTP/1.1 server (keep-alive, JSON bodies):
+            - GET /health: number of tickers served and time of the last reload;
+            - GET /score?ticker=ETH-USD&value=12.3 or POST /score {"ticker": ..., "value": ...};
+            - POST /score/batch {"items": [{"ticker": ..., "value": ...}, ...]}.
+        The store is reloaded in a worker thread every reload_seconds, so the requests are
+        never blocked by the lake.
+
+        Parameters:
+            store (DetectorStateStore): Store of the detector states.
+            host (str): Interface to listen on (default: '0.0.0.0').
+            port (int): Port to listen on, 0 for any free port (default: 80, the container port).
+            reload_seconds (float): Time between two reloads of the store (default: 60).
+        '''
+        self.store = store
+        self.host = host
+        self.port = port
+        self.reload_seconds = reload_seconds
+        self.server = None
+        self._reload_task = None
+
+    async def start(self) -> asyncio.AbstractServer:
+        '''
+        Load the store and start listening, returning once the server accepts connections.
+
+        Returns:
+            server (asyncio.AbstractServer): The listening server, its sockets give the bound port.
+        '''
+        await asyncio.get_running_loop().run_in_executor(None, self.store.reload)
+        self.server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        self._reload_task = asyncio.create_task(self._reload_forever())
+        logging.info(f'Scoring service listening on {self.host}:{self.port} with {len(self.store.states)} tickers.')
+        return self.server
+
+    async def stop(self) -> None:
+        '''
+        Stop the reloads and close the server.
+        '''
+        self._reload_task.cancel()
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def serve(self) -> None:
+        '''
+        Start the server and serve until cancelled.
+        '''
+        await self.start()
+        try:
+            await self.server.serve_forever()
+        finally:
+            await self.stop()
+
+    def run(self) -> None:
+        '''
+        Serve from a new event loop, blocking until interrupted.
+        '''
+        asyncio.run(self.serve())
+
+    def route(self, method: str, target: str, body: bytes) -> tuple:
+        '''
+        Answer a request.
+
+        Parameters:
+            method (str): HTTP method.
+            target (str): Path and query string.
+            body (bytes): Request body.
+
+        Returns:
+            (status, payload): HTTP status code and JSON serializable payload.
+        '''
+        path, _, query = target.partition('?')
+        try:
+            if path == '/health':
+                return 200, {'status': 'ok', 'tickers': len(self.store.states), 'loaded_at': self.store.loaded_at}
+
+            if path == '/score':
+                if method == 'GET':
+                    item = {key: values[0] for key, values in urllib.parse.parse_qs(query).items()}
+                elif method == 'POST':
+                    item = json.loads(body)
+                else:
+                    return 405, {'error': f'{method} is not allowed on {path}'}
+                return 200, self.store.score(item['ticker'], float(item['value']))
+
+            if path == '/score/batch':
+                if method != 'POST':
+                    return 405, {'error': f'{method} is not allowed on {path}'}
+                return 200, {'results': self.store.score_batch(json.loads(body)['items'])}
+
+            return 404, {'error': f'{path} was not found'}
+
+        except UnknownTickerError as e:
+            return 404, {'error': f'there is no fitted detector for {e.args[0]}'}
+        except (KeyError, TypeError, ValueError) as e:
+            return 400, {'error': f'invalid request: {e!r}'}
+        except Exception:
+            # a bug or a bad state must not drop the connection of the client
+            logging.exception(f'The request {method} {target} failed.')
+            return 500, {'error': 'internal error'}
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        '''
+        Serve the requests of a connection until the client closes it or asks to.
+        '''
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                try:
+                    method, target, version = request_line.decode('latin-1').split()
+                    content_length = int(headers.get('content-length', 0))
+                except ValueError:
+                    await self._respond(writer, 400, {'error': 'malformed request'}, keep_alive=False)
+                    break
+
+                if content_length > MAX_BODY_BYTES:
+                    await self._respond(writer, 413, {'error': 'request body is too large'}, keep_alive=False)
+                    break
+
+                body = await reader.readexactly(content_length)
+                status, payload = self.route(method, target, body)
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _respond(writer: asyncio.StreamWriter, status: int, payload: dict, keep_alive: bool) -> None:
+        '''
+        Write a JSON response. A payload that is not strict JSON (NaN or infinity) gives a 500.
+        '''
+        try:
+            data = json.dumps(payload, allow_nan=False).encode()
+        except ValueError:
+            logging.exception('The response could not be serialized as JSON.')
+            status, data = 500, b'{"error": "internal error"}'
+
+        writer.write(
+            f'HTTP/1.1 {status} {HTTP_REASONS[status]}\r\n'
+            f'Content-Type: application/json\r\n'
+            f'Content-Length: {len(data)}\r\n'
+            f'Connection: {"keep-alive" if keep_alive else "close"}\r\n\r\n'.encode('latin-1') + data)
+        await writer.drain()
+
+    async def _reload_forever(self) -> None:
+        '''
+        Reload the store periodically, keeping the previous states if a reload fails.
+        '''
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.reload_seconds)
+            try:
+                await loop.run_in_executor(None, self.store.reload)
+            except Exception:
+                logging.exception('The reload of the detector states failed, the previous states are kept.')
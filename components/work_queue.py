@@ -0,0 +1,379 @@
+'''
+Component with a Postgres work queue of (ticker, date) items,
+so several workers can share the detection of a large universe
+without a coordinator: FOR UPDATE SKIP LOCKED claims, leases
+renewed by heartbeats, retries with backoff and dead letters
+
+Author: Vitor Abdo
+Date: Oct/2026
+'''
+
+# import necessary packages
+import os
+import time
+import uuid
+import socket
+import logging
+import threading
+import contextlib
+import psycopg2
+from psycopg2.extras import execute_values
+
+logging.basicConfig(
+    level=logging.INFO,
+    filemode='w',
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S')
+
+# table of the work items, created by the datawarehouse migrations
+WORK_QUEUE_TABLE = 'work_queue'
+
+# status of an item: waiting, leased by a worker, finished or given up (dead letter)
+PENDING, RUNNING, DONE, DEAD = 'pending', 'running', 'done', 'dead'
+
+
+def enqueue_work_items(conn_string: str, schema_name: str, tickers: list, dates: list, max_attempts: int = 3) -> int:
+    '''
+    Adds one work item per ticker and date. Items that are already in the queue,
+    whatever their status, are left untouched, so enqueueing a day twice is harmless.
+
+    Parameters:
+        conn_string (str): Connection string for the database.
+        schema_name (str): Name of the schema where the queue table is.
+        tickers (list): Tickers to score, e.g. ['ETH-USD', 'BTC-USD'].
+        dates (list): Days to score, as 'YYYY-MM-DD' strings or dates.
+        max_attempts (int): Attempts of an item before it goes to the dead letters (default: 3).
+
+    Returns:
+        n_enqueued (int): Number of new items.
+    '''
+    records = [(ticker, str(date), max_attempts) for date in dates for ticker in tickers]
+    if not records:
+        return 0
+
+    conn = psycopg2.connect(conn_string)
+    try:
+        with conn:
+            with conn.cursor() as cur:
+                inserted = execute_values(
+                    cur,
+                    f'INSERT INTO {schema_name}.{WORK_QUEUE_TABLE} (ticker, date, max_attempts) VALUES %s '
+                    'ON CONFLICT (ticker, date) DO NOTHING RETURNING 1',
+                    records,
+                    fetch=True)
+        logging.info(f'{len(inserted)} of {len(records)} work items were enqueued: SUCCESS')
+        return len(inserted)
+
+    finally:
+        conn.close()
+
+
+def fetch_queue_stats(conn_string: str, schema_name: str) -> dict:
+    '''
+    Number of work items per status.
+
+    Parameters:
+        conn_string (str): Connection string for the database.
+        schema_name (str): Name of the schema where the queue table is.
+
+    Returns:
+        stats (dict): e.g. {'pending': 10, 'running': 2, 'done': 120, 'dead': 1}.
+    '''
+    conn = psycopg2.connect(conn_string)
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f'SELECT status, count(*) FROM {schema_name}.{WORK_QUEUE_TABLE} GROUP BY status')
+            stats = {status: 0 for status in (PENDING, RUNNING, DONE, DEAD)}
+            stats.update(dict(cur.fetchall()))
+        conn.rollback()
+        return stats
+
+    finally:
+        conn.close()
+
+
+def fetch_dead_letters(conn_string: str, schema_name: str) -> list:
+    '''
+    Items that failed every attempt, with their last error.
+
+    Parameters:
+        conn_string (str): Connection string for the database.
+        schema_name (str): Name of the schema where the queue table is.
+
+    Returns:
+        dead_letters (list): (ticker, date, attempts, last_error) tuples, oldest day first.
+    '''
+    conn = psycopg2.connect(conn_string)
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                f'SELECT ticker, date, attempts, last_error FROM {schema_name}.{WORK_QUEUE_TABLE} '
+                'WHERE status = %s ORDER BY date, ticker', (DEAD,))
+            dead_letters = cur.fetchall()
+        conn.rollback()
+        return dead_letters
+
+    finally:
+        conn.close()
+
+
+def requeue_dead_letters(conn_string: str, schema_name: str, tickers: list = None) -> int:
+    '''
+    Gives the dead items a new round of attempts, e.g. after the cause was fixed.
+
+    Parameters:
+        conn_string (str): Connection string for the database.
+        schema_name (str): Name of the schema where the queue table is.
+        tickers (list): Only requeue these tickers, every dead item if None (default: None).
+
+    Returns:
+        n_requeued (int): Number of items back in the queue.
+    '''
+    query = (
+        f'UPDATE {schema_name}.{WORK_QUEUE_TABLE} SET status = %s, attempts = 0, available_at = now(), '
+        'updated_at = now() WHERE status = %s')
+    params = [PENDING, DEAD]
+    if tickers is not None:
+        query += ' AND ticker = ANY(%s)'
+        params.append(list(tickers))
+
+    conn = psycopg2.connect(conn_string)
+    try:
+        with conn:
+            with conn.cursor() as cur:
+                cur.execute(query, params)
+                n_requeued = cur.rowcount
+        logging.info(f'{n_requeued} dead work items were requeued: SUCCESS')
+        return n_requeued
+
+    finally:
+        conn.close()
+
+
+class WorkQueue:
+    def __init__(
+            self,
+            conn_string: str,
+            schema_name: str,
+            worker_id: str = None,
+            lease_seconds: float = 300,
+            heartbeat_seconds: float = None,
+            retry_backoff_seconds: float = 60):
+        '''
+        WorkQueue class with the worker side of the queue. Each claim leases the items to this
+        worker for lease_seconds; a heartbeat thread renews the leases while they are processed,
+        so the items of a worker that dies go back to the queue once its leases expire.
+        A failed item is retried after an exponential backoff and becomes a dead letter
+        after its max_attempts.
+
+        Parameters:
+            conn_string (str): Connection string for the database.
+            schema_name (str): Name of the schema where the queue table is.
+            worker_id (str): Unique name of the worker, hostname-pid-random if not given.
+            lease_seconds (float): Time a claimed item stays leased without a heartbeat (default: 300).
+            heartbeat_seconds (float): Time between two lease renewals (default: a third of lease_seconds).
+            retry_backoff_seconds (float): Delay before the first retry of a failed item, doubled
+            at every attempt (default: 60).
+        '''
+        self.conn_string = conn_string
+        self.table = f'{schema_name}.{WORK_QUEUE_TABLE}'
+        self.worker_id = worker_id or f'{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}'
+        self.lease_seconds = lease_seconds
+        self.heartbeat_seconds = heartbeat_seconds or lease_seconds / 3
+        self.retry_backoff_seconds = retry_backoff_seconds
+        self.conn = psycopg2.connect(conn_string)
+
+    def claim(self, batch_size: int = 1) -> list:
+        '''
+        Lease up to batch_size items, oldest day first. Rows locked by other workers are
+        skipped instead of waited for, so concurrent workers never claim the same item.
+        Expired leases of items without attempts left are moved to the dead letters first.
+
+        Parameters:
+            batch_size (int): Maximum number of items to claim (default: 1).
+
+        Returns:
+            items (list): (ticker, date, attempt) tuples, empty if there is nothing to do.
+        '''
+        with self.conn:
+            with self.conn.cursor() as cur:
+                cur.execute(
+                    f'UPDATE {self.table} q SET status = %s, lease_owner = NULL, updated_at = now(), '
+                    "last_error = 'lease expired on the last attempt' "
+                    f'FROM (SELECT ticker, date FROM {self.table} '
+                    'WHERE status = %s AND lease_expires_at < now() AND attempts >= max_attempts '
+                    'FOR UPDATE SKIP LOCKED) expired '
+                    'WHERE q.ticker = expired.ticker AND q.date = expired.date',
+                    (DEAD, RUNNING))
+                if cur.rowcount:
+                    logging.warning(f'{cur.rowcount} work items with expired leases were moved to the dead letters.')
+
+                cur.execute(
+                    f'UPDATE {self.table} q SET status = %s, lease_owner = %s, '
+                    "lease_expires_at = now() + %s * interval '1 second', "
+                    'attempts = q.attempts + 1, updated_at = now() '
+                    f'FROM (SELECT ticker, date FROM {self.table} '
+                    'WHERE (status = %s AND available_at <= now()) '
+                    'OR (status = %s AND lease_expires_at < now() AND attempts < max_attempts) '
+                    'ORDER BY date, ticker LIMIT %s FOR UPDATE SKIP LOCKED) claimable '
+                    'WHERE q.ticker = claimable.ticker AND q.date = claimable.date '
+                    'RETURNING q.ticker, q.date, q.attempts',
+                    (RUNNING, self.worker_id, self.lease_seconds, PENDING, RUNNING, batch_size))
+                return sorted(cur.fetchall(), key=lambda item: (item[1], item[0]))
+
+    def heartbeat(self, conn=None) -> int:
+        '''
+        Renew the leases of every item this worker is processing.
+
+        Parameters:
+            conn (psycopg2.connection): Connection to use, the one of the worker if not given.
+
+        Returns:
+            n_renewed (int): Number of leases renewed.
+        '''
+        conn = conn or self.conn
+        with conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    f"UPDATE {self.table} SET lease_expires_at = now() + %s * interval '1 second' "
+                    'WHERE lease_owner = %s AND status = %s',
+                    (self.lease_seconds, self.worker_id, RUNNING))
+                return cur.rowcount
+
+    def complete(self, ticker: str, date) -> bool:
+        '''
+        Mark an item as done.
+
+        Parameters:
+            ticker (str): Ticker of the item.
+            date (str or date): Day of the item.
+
+        Returns:
+            completed (bool): False if the lease was lost, i.e. another worker took the item over.
+        '''
+        completed = self._finish(
+            'status = %s, lease_owner = NULL, last_error = NULL', (DONE,), ticker, date)
+        if not completed:
+            logging.warning(f'The lease of {ticker} {date} was lost before it was completed.')
+        return completed
+
+    def fail(self, ticker: str, date, error: str) -> bool:
+        '''
+        Record a failed attempt: the item is retried after a backoff, or becomes
+        a dead letter if it has no attempts left.
+
+        Parameters:
+            ticker (str): Ticker of the item.
+            date (str or date): Day of the item.
+            error (str): Description of the failure, kept in last_error.
+
+        Returns:
+            recorded (bool): False if the lease was lost, i.e. another worker took the item over.
+        '''
+        return self._finish(
+            'status = CASE WHEN attempts >= max_attempts THEN %s ELSE %s END, lease_owner = NULL, '
+            "last_error = %s, available_at = now() + %s * power(2, attempts - 1) * interval '1 second'",
+            (DEAD, PENDING, error[:2000], self.retry_backoff_seconds), ticker, date)
+
+    def release(self) -> int:
+        '''
+        Give back the items leased by this worker without spending an attempt, e.g. on shutdown.
+
+        Returns:
+            n_released (int): Number of items back in the queue.
+        '''
+        with self.conn:
+            with self.conn.cursor() as cur:
+                cur.execute(
+                    f'UPDATE {self.table} SET status = %s, lease_owner = NULL, attempts = attempts - 1, '
+                    'updated_at = now() WHERE lease_owner = %s AND status = %s',
+                    (PENDING, self.worker_id, RUNNING))
+                return cur.rowcount
+
+    @contextlib.contextmanager
+    def keep_alive(self):
+        '''
+        Renew the leases of this worker from a background thread, with its own
+        connection, while the block runs.
+        '''
+        stop = threading.Event()
+
+        def beat():
+            conn = psycopg2.connect(self.conn_string)
+            try:
+                while not stop.wait(self.heartbeat_seconds):
+                    try:
+                        self.heartbeat(conn)
+                    except psycopg2.Error as e:
+                        # the lease survives a missed beat, the next one retries
+                        logging.warning(f'Heartbeat of worker {self.worker_id} failed: {e}')
+                        conn.close()
+                        conn = psycopg2.connect(self.conn_string)
+            finally:
+                conn.close()
+
+        thread = threading.Thread(target=beat, daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    def run(self, process_item, batch_size: int = 1, drain: bool = False, poll_seconds: float = 5) -> dict:
+        '''
+        Claim and process items until stopped. An exception of process_item fails the
+        item and the worker moves on; the leases still held on exit are released.
+
+        Parameters:
+            process_item (callable): Function called with (ticker, date) for each item.
+            batch_size (int): Items claimed at once (default: 1).
+            drain (bool): Stop when there is nothing left to claim instead of polling (default: False).
+            poll_seconds (float): Wait between two claims when the queue is empty (default: 5).
+
+        Returns:
+            counts (dict): Number of items 'completed' and 'failed' by this worker.
+        '''
+        counts = {'completed': 0, 'failed': 0}
+        logging.info(f'Worker {self.worker_id} started.')
+
+        try:
+            with self.keep_alive():
+                while True:
+                    items = self.claim(batch_size)
+                    if not items:
+                        if drain:
+                            break
+                        time.sleep(poll_seconds)
+                        continue
+
+                    for ticker, date, attempt in items:
+                        try:
+                            process_item(ticker, date)
+                        except Exception as e:
+                            logging.exception(f'Attempt {attempt} of {ticker} {date} failed.')
+                            self.fail(ticker, date, f'{type(e).__name__}: {e}')
+                            counts['failed'] += 1
+                        else:
+                            self.complete(ticker, date)
+                            counts['completed'] += 1
+        finally:
+            released = self.release()
+            if released:
+                logging.info(f'Worker {self.worker_id} released {released} leased items.')
+            self.conn.close()
+
+        logging.info(f'Worker {self.worker_id} stopped: {counts}')
+        return counts
+
+    def _finish(self, assignments: str, params: tuple, ticker: str, date) -> bool:
+        '''
+        Update an item leased by this worker, returning whether the lease was still held.
+        '''
+        with self.conn:
+            with self.conn.cursor() as cur:
+                cur.execute(
+                    f'UPDATE {self.table} SET {assignments}, updated_at = now() '
+                    'WHERE ticker = %s AND date = %s AND lease_owner = %s AND status = %s',
+                    params + (ticker, str(date), self.worker_id, RUNNING))
+                return cur.rowcount == 1
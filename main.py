@@ -6,22 +6,34 @@ Date: Aug/2023
 '''
 
 # import necessary packages
+import sys
+import json
+import signal
 import logging
+import argparse
 import datetime
+import functools
 import pandas as pd
 import numpy as np
-from decouple import config
+from decouple import config, Csv
 
-from components.get_api_data import get_historical_data
+from components.get_api_data import get_historical_data, CachedYahooSource
+from components.lake_backend import LakeBackend, get_lake_backend
 from components.create_s3_raw import move_files_to_raw_layer
 from components.create_s3_processed import move_files_to_processed_layer, get_files_from_processed_layer
-from components.dw_management import create_schema_into_postgresql
-from components.dw_management import create_table_into_postgresql
 from components.dw_management import insert_data_into_postgresql
-from components.dw_management import fetch_data_from_database
+from components.dw_management import fetch_array_from_database
+from components.dw_management import insert_anomaly_events, refresh_anomaly_summary
+from components.dw_migrations import apply_migrations
 from components.anomaly_detection_system import AnomalyTransformer
 from components.anomaly_detection_system import AnomalyDetector
+from components.anomaly_detection_system import advance_volatility_state
 from components.alert_system import send_gmail_message
+from components.memory_governor import MemoryGovernor
+from components.run_checkpoints import RunCheckpoints, hash_bytes
+from components.work_queue import WorkQueue, enqueue_work_items
+from components.scoring_service import DetectorStateStore, ScoringService
+from components.scoring_service import build_detector_state, publish_detector_state, load_detector_state
 
 logging.basicConfig(
     level=logging.INFO,
@@ -31,11 +43,18 @@ logging.basicConfig(
 
 # config
 TICKER = 'ETH-USD'
+PIPELINE_STAGES = ['ingest', 'raw_layer', 'processed_layer', 'dw_load', 'detect', 'alert']
+MEMORY_BUDGET_MB = config('MEMORY_BUDGET_MB', default=512, cast=float)
+# tracemalloc costs memory and CPU inside the budget, only turn it on to diagnose a stage
+MEMORY_TRACE_ALLOCATIONS = config('MEMORY_TRACE_ALLOCATIONS', default=False, cast=bool)
+YAHOO_CACHE_DIR = config('YAHOO_CACHE_DIR', default='/tmp/yahoo_cache')
 
-BUCKET_NAME = config('BUCKET_NAME')
-AWS_ACCESS_KEY_ID = config('AWS_ACCESS_KEY_ID')
-AWS_SECRET_ACCESS_KEY = config('AWS_SECRET_ACCESS_KEY')
-AWS_REGION = config('AWS_REGION')
+LAKE_BACKEND = config('LAKE_BACKEND', default='s3')
+LAKE_ROOT_DIR = config('LAKE_ROOT_DIR', default='lake')
+BUCKET_NAME = config('BUCKET_NAME', default='')
+AWS_ACCESS_KEY_ID = config('AWS_ACCESS_KEY_ID', default='')
+AWS_SECRET_ACCESS_KEY = config('AWS_SECRET_ACCESS_KEY', default='')
+AWS_REGION = config('AWS_REGION', default='')
 
 ENDPOINT_NAME = config('ENDPOINT_NAME')
 PORT = config('PORT')
@@ -45,123 +64,282 @@ PASSWORD = config('PASSWORD')
 DW_SCHEMA_TO_CREATE = config('DW_SCHEMA_TO_CREATE')
 DW_TEMP_SCHEMA_TO_CREATE = config('DW_TEMP_SCHEMA_TO_CREATE')
 PROCESSED_TABLE_NAME = config('PROCESSED_TABLE_NAME')
+SMALL_BATCH_MAX_ROWS = config('SMALL_BATCH_MAX_ROWS', default=1000, cast=int)
+
+# volatility-adaptive detector: 'garch' or 'ewma', and days between two fits of its parameters
+VOLATILITY_MODEL = config('VOLATILITY_MODEL', default='garch')
+VOLATILITY_REFIT_DAYS = config('VOLATILITY_REFIT_DAYS', default=30, cast=int)
 
 FROM = config('FROM')
 TO = config('TO')
 EMAIL_PASS = config('EMAIL_PASS')
 
+# worker mode: tickers enqueued by the daily run and how the workers lease them
+WORK_QUEUE_TICKERS = config('WORK_QUEUE_TICKERS', default='', cast=Csv())
+WORKER_HISTORY_DAYS = config('WORKER_HISTORY_DAYS', default=365, cast=int)
+WORKER_BATCH_SIZE = config('WORKER_BATCH_SIZE', default=1, cast=int)
+WORKER_LEASE_SECONDS = config('WORKER_LEASE_SECONDS', default=300, cast=float)
+
+# serve mode: port of the scoring service and time between two reloads of the detector states
+SCORING_PORT = config('SCORING_PORT', default=80, cast=int)
+SCORING_RELOAD_SECONDS = config('SCORING_RELOAD_SECONDS', default=60, cast=float)
+
+
+def score_work_item(
+        ticker: str, date: datetime.date, conn_string: str, source: CachedYahooSource, backend: LakeBackend) -> None:
+    '''
+    Score the price amplitude of a ticker on a day against its history and its volatility
+    forecast, persist the anomaly events, publish the detector state for the scoring service and
+    send the alert if it is an anomaly. Scoring an item twice overwrites the same anomaly event.
+
+    :param ticker: (str) Ticker of the work item, e.g. 'BTC-USD'.
+    :param date: (datetime.date) Day of the work item.
+    :param conn_string: (str) Connection string for the datawarehouse.
+    :param source: (CachedYahooSource) Source of the price history.
+    :param backend: (LakeBackend) Lake where the detector state is published.
+    '''
+    history = get_historical_data(
+        ticker, date - datetime.timedelta(days=WORKER_HISTORY_DAYS), date + datetime.timedelta(days=1), source)
+    if history.index[-1].date() != date:
+        # the item goes back to the queue and is retried after a backoff
+        raise RuntimeError(f'There is no candle of {ticker} for {date} yet')
+
+    price_amplitude = (history['Close'] - history['Open']).to_numpy()
+    last_crypto_value = round(float(price_amplitude[-1]), 2)
+    data_distribution = np.round(price_amplitude[:-1], 2)
+
+    anomaly_transformer = AnomalyTransformer(data_distribution)
+    anomaly_transformer.fit_transform()
+    transformed_data = anomaly_transformer.transformed_data
+    std_transformed = np.std(transformed_data)
+    anomaly_detector = AnomalyDetector(
+        transformed_data, np.mean(transformed_data), std_transformed, 3 * std_transformed)
+
+    anomaly_event = anomaly_detector.anomaly_event(ticker, str(date), last_crypto_value)
+    volatility_event, volatility_state = advance_volatility_state(
+        ticker, date, data_distribution, last_crypto_value,
+        (load_detector_state(backend, ticker) or {}).get('volatility'), VOLATILITY_MODEL, VOLATILITY_REFIT_DAYS)
+    insert_anomaly_events(conn_string, DW_SCHEMA_TO_CREATE, pd.DataFrame([anomaly_event, volatility_event]))
+    publish_detector_state(
+        backend, build_detector_state(ticker, date, data_distribution, anomaly_detector, volatility_state))
+
+    if anomaly_event['is_anomaly']:
+        email_subject = f'Anomaly about {ticker} cryptocurrency has been found!'
+        email_body = f'The anomaly detection system found an anomaly with a value of {last_crypto_value} and a p-value of {anomaly_event["p_value"]}'
+        send_gmail_message(FROM, TO, EMAIL_PASS, email_subject, email_body)
+
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Daily anomaly detection pipeline.')
+    parser.add_argument(
+        '--force-stage',
+        choices=PIPELINE_STAGES,
+        help='Run this stage and every stage after it again, even if they were checkpointed today.')
+    parser.add_argument(
+        '--worker',
+        action='store_true',
+        help='Run as a worker of the (ticker, date) work queue instead of the daily pipeline.')
+    parser.add_argument(
+        '--drain',
+        action='store_true',
+        help='In worker mode, stop when the queue is empty instead of polling it.')
+    parser.add_argument(
+        '--serve',
+        action='store_true',
+        help='Run the HTTP scoring service on SCORING_PORT instead of the daily pipeline.')
+    args = parser.parse_args()
+    conn_string = f'host={ENDPOINT_NAME} port={PORT} dbname={DB_NAME} user={USER} password={PASSWORD}'
+
+    # the lake keeps the layers, the checkpoints of the runs and the detector states (s3 bucket or local directory)
+    lake_backend = get_lake_backend(
+        LAKE_BACKEND, BUCKET_NAME, AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY, AWS_REGION, LAKE_ROOT_DIR)
+
+    if args.serve:
+        # score ad-hoc values against the latest fits, reloaded as the daily runs publish them
+        ScoringService(DetectorStateStore(lake_backend), port=SCORING_PORT, reload_seconds=SCORING_RELOAD_SECONDS).run()
+        exit()
+
+    if args.worker:
+        apply_migrations(
+            ENDPOINT_NAME, PORT, DB_NAME, USER, PASSWORD, DW_SCHEMA_TO_CREATE, DW_TEMP_SCHEMA_TO_CREATE, PROCESSED_TABLE_NAME)
+
+        # ECS stops a task with SIGTERM, exit cleanly so the leased items are released
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+        yahoo_source = CachedYahooSource(cache_dir=YAHOO_CACHE_DIR)
+        work_queue = WorkQueue(conn_string, DW_SCHEMA_TO_CREATE, lease_seconds=WORKER_LEASE_SECONDS)
+        counts = work_queue.run(
+            lambda ticker, date: score_work_item(ticker, date, conn_string, yahoo_source, lake_backend),
+            WORKER_BATCH_SIZE,
+            drain=args.drain)
+
+        if counts['completed']:
+            refresh_anomaly_summary(conn_string, DW_SCHEMA_TO_CREATE)
+        exit()
+
     # Define the start and end date of the period of interest to collect API data
     today_date = datetime.datetime.now()
     yesterday_date = today_date - datetime.timedelta(days=1)
 
+    # watch the memory of the heavy stages against the task memory
+    governor = MemoryGovernor(MEMORY_BUDGET_MB, trace_allocations=MEMORY_TRACE_ALLOCATIONS)
+
+    # a rerun for the same date skips the stages that were already completed
+    checkpoints = RunCheckpoints(lake_backend, today_date.date(), PIPELINE_STAGES)
+    if args.force_stage:
+        checkpoints.invalidate_from(args.force_stage)
+
     # 1. Get the raw data from API
-    logging.info('About to start getting data from the yahoo API')
-    raw_df = get_historical_data(TICKER, yesterday_date.date(), today_date.date())
-
-    # 2. Send the raw df to s3 bucket raw layer
-    logging.info('About to start the creation of raw layer')
-    move_files_to_raw_layer(BUCKET_NAME, AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY, AWS_REGION, raw_df)
-
-    # 3. Move file to processed layer doing some transformations
-    logging.info('About to start the creation of processed layer')
-    move_files_to_processed_layer(BUCKET_NAME, AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY, AWS_REGION)
-
-    # 4. Get the current processed data
-    logging.info('About to start getting data from processed layer')
-    processed_data = get_files_from_processed_layer(BUCKET_NAME, AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY, AWS_REGION)
-    logging.info('The processed data was fetched successfully')
-
-    # 5. create rds schema if it does not already exist
-    logging.info(f'About to start executing the create schema {DW_SCHEMA_TO_CREATE} function')
-    create_schema_into_postgresql(ENDPOINT_NAME, PORT, DB_NAME, USER, PASSWORD, DW_SCHEMA_TO_CREATE) # main schema
-
-    logging.info(f'About to start executing the create schema {DW_TEMP_SCHEMA_TO_CREATE} function')
-    create_schema_into_postgresql(ENDPOINT_NAME, PORT, DB_NAME, USER, PASSWORD, DW_TEMP_SCHEMA_TO_CREATE) # temp schema
-
-    # 6. Create rds table
-    logging.info(f'About to start executing the create table {PROCESSED_TABLE_NAME} function')
-    table_columns = '''
-    id INT,
-    date TEXT,
-    price_amplitude FLOAT,
-    created_at TEXT,
-    updated_at TEXT,
-    PRIMARY KEY (date)
-    '''
-    create_table_into_postgresql(
+    if checkpoints.is_done('ingest'):
+        raw_df = checkpoints.load_dataframe('ingest')
+    else:
+        logging.info('About to start getting data from the yahoo API')
+        yahoo_source = CachedYahooSource(cache_dir=YAHOO_CACHE_DIR)
+        raw_df = get_historical_data(TICKER, yesterday_date.date(), today_date.date(), yahoo_source)
+        logging.info(f'Yahoo source stats: {yahoo_source.stats()}')
+        checkpoints.complete_dataframe('ingest', raw_df)
+    raw_hash = checkpoints.output_hash('ingest')
+
+    # 2. Send the raw df to the lake raw layer
+    if not checkpoints.is_done('raw_layer', raw_hash):
+        logging.info(f'About to start the creation of raw layer in the {LAKE_BACKEND} lake')
+        with governor.stage('raw_layer'):
+            move_files_to_raw_layer(BUCKET_NAME, AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY, AWS_REGION, raw_df, lake_backend)
+        checkpoints.complete('raw_layer', raw_hash, raw_hash)
+
+    # 3-4. Move file to processed layer doing some transformations and get the current processed data
+    if checkpoints.is_done('processed_layer', raw_hash):
+        processed_data = checkpoints.load_dataframe('processed_layer')
+    else:
+        logging.info('About to start the creation of processed layer')
+        with governor.stage('processed_layer'):
+            move_files_to_processed_layer(BUCKET_NAME, AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY, AWS_REGION, lake_backend)
+
+        logging.info('About to start getting data from processed layer')
+        with governor.stage('read_processed'):
+            processed_data = get_files_from_processed_layer(
+                BUCKET_NAME, AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY, AWS_REGION, lake_backend)
+        logging.info('The processed data was fetched successfully')
+        checkpoints.complete_dataframe('processed_layer', processed_data, raw_hash)
+    processed_hash = checkpoints.output_hash('processed_layer')
+
+    # 5-6. create rds schemas and tables through the versioned migrations
+    logging.info('About to start applying the datawarehouse migrations')
+    apply_migrations(
         ENDPOINT_NAME,
         PORT,
         DB_NAME,
         USER,
         PASSWORD,
         DW_SCHEMA_TO_CREATE,
-        PROCESSED_TABLE_NAME,
-        table_columns)
-    
+        DW_TEMP_SCHEMA_TO_CREATE,
+        PROCESSED_TABLE_NAME)
+
+    # the workers score the rest of the universe for yesterday
+    if WORK_QUEUE_TICKERS:
+        enqueue_work_items(conn_string, DW_SCHEMA_TO_CREATE, WORK_QUEUE_TICKERS, [yesterday_date.date()])
+
     # 7. insert data
-    logging.info('About to start inserting data in our rds postgres table')
-    if processed_data.empty:
-        logging.info('The dataframe is empty.')
+    if not checkpoints.is_done('dw_load', processed_hash):
+        logging.info('About to start inserting data in our rds postgres table')
+        if processed_data.empty:
+            logging.info('The dataframe is empty.')
 
-    else:
-        insert_data_into_postgresql(
-            ENDPOINT_NAME,
-            PORT,
-            DB_NAME,
-            USER,
-            PASSWORD,
-            DW_SCHEMA_TO_CREATE,
-            PROCESSED_TABLE_NAME,
-            processed_data,
-            DW_TEMP_SCHEMA_TO_CREATE)
+        else:
+            # size the insert batches from the memory left in the budget
+            row_bytes = int(processed_data.memory_usage(deep=True).sum() / len(processed_data))
+            with governor.stage('dw_load'):
+                insert_data_into_postgresql(
+                    ENDPOINT_NAME,
+                    PORT,
+                    DB_NAME,
+                    USER,
+                    PASSWORD,
+                    DW_SCHEMA_TO_CREATE,
+                    PROCESSED_TABLE_NAME,
+                    processed_data,
+                    DW_TEMP_SCHEMA_TO_CREATE,
+                    SMALL_BATCH_MAX_ROWS,
+                    governor.chunk_size(row_bytes),
+                    functools.partial(governor.check, 'dw_load'))
+        checkpoints.complete('dw_load', processed_hash, processed_hash)
 
     # 8. anomaly detection
-    conn_string = f'host={ENDPOINT_NAME} port={PORT} dbname={DB_NAME} user={USER} password={PASSWORD}'
-    query = '''
-    SELECT * FROM cryptocurrency.processed_eth_historical_data
-    '''
-    anomaly_df = fetch_data_from_database(conn_string, query)
-    logging.info(f'The dataframe about {TICKER} cryptocurrency was fetched successfully.')
+    if checkpoints.is_done('detect', processed_hash):
+        anomaly_event = json.loads(checkpoints.load_artifact('detect'))
+        last_crypto_value = anomaly_event['value']
 
-    anomaly_df['date'] = pd.to_datetime(anomaly_df['date'])
-    anomaly_df.sort_values(by=['date'], inplace=True)
+    else:
+        # the day travels as days since epoch, so the event date comes from the same row as its value
+        query = '''
+        SELECT price_amplitude, date::date - DATE '1970-01-01'
+        FROM cryptocurrency.processed_eth_historical_data ORDER BY date
+        '''
+        with governor.stage('fetch_history'):
+            # ~150 bytes per row while two floats travel from the driver tuple to the numpy array
+            history = fetch_array_from_database(
+                conn_string, query, governor.chunk_size(row_bytes=150),
+                check_memory=functools.partial(governor.check, 'fetch_history'))
+        price_amplitude = history[:, 0]
+        last_date = datetime.date(1970, 1, 1) + datetime.timedelta(days=int(history[-1, 1]))
+        logging.info(f'The price amplitude history about {TICKER} cryptocurrency was fetched successfully.')
 
-    # get the last value from yesterday about ETH cryptocurrency to test the anomaly
-    last_crypto_value = round(anomaly_df['price_amplitude'].iloc[-1], 2)
-    logging.info(f'The last value from yesterday {last_crypto_value} was fetched successfully.')
+        # get the last value of the DW, normally yesterday's, about ETH cryptocurrency to test the anomaly
+        last_crypto_value = round(float(price_amplitude[-1]), 2)
+        if last_date != yesterday_date.date():
+            logging.warning(f'The DW is behind: its last day is {last_date}, not yesterday {yesterday_date.date()}.')
+        logging.info(f'The last value {last_crypto_value} of {last_date} was fetched successfully.')
 
-    # get the entire distribution to compare the last value
-    data_distribution = anomaly_df['price_amplitude'].iloc[:-1].values
-    data_distribution = [round(value, 2) for value in data_distribution]
-    logging.info(f'The data distribution from the historic data for {TICKER} were fetched successfully.')
+        # get the entire distribution to compare the last value
+        data_distribution = np.round(price_amplitude[:-1], 2)
+        logging.info(f'The data distribution from the historic data for {TICKER} were fetched successfully.')
 
-    # Perform outlier elimination
-    anomaly_transformer = AnomalyTransformer(data_distribution)
-    anomaly_transformer.fit_transform()
-    transformed_data = anomaly_transformer.transformed_data
-    logging.info(f'The outliers were eliminated from historic data distribution.')
+        # Perform outlier elimination
+        anomaly_transformer = AnomalyTransformer(data_distribution)
+        anomaly_transformer.fit_transform()
+        transformed_data = anomaly_transformer.transformed_data
+        logging.info(f'The outliers were eliminated from historic data distribution.')
 
-    # calculate mean, standard deviation, and threshold about cleaned distribution
-    mean_transformed = np.mean(transformed_data)
-    std_transformed = np.std(transformed_data)
-    threshold_transformed = 3 * std_transformed
+        # calculate mean, standard deviation, and threshold about cleaned distribution
+        mean_transformed = np.mean(transformed_data)
+        std_transformed = np.std(transformed_data)
+        threshold_transformed = 3 * std_transformed
 
-    # create anomaly detector
-    anomaly_detector = AnomalyDetector(
-        transformed_data, mean_transformed, std_transformed, threshold_transformed)
-    
-    # perform anomaly detection
-    if anomaly_detector.is_anomaly(last_crypto_value):
-        p_value = anomaly_detector.anomaly_report(last_crypto_value) # Generate anomaly report
+        # create anomaly detector
+        anomaly_detector = AnomalyDetector(
+            transformed_data, mean_transformed, std_transformed, threshold_transformed)
+
+        # persist the detection result so dashboards and post-mortems do not need to re-run the detector
+        anomaly_event = anomaly_detector.anomaly_event(TICKER, str(last_date), last_crypto_value)
 
+        # score against the volatility forecast carried from the previous run, refitting only when needed
+        volatility_event, volatility_state = advance_volatility_state(
+            TICKER, last_date, data_distribution, last_crypto_value,
+            (load_detector_state(lake_backend, TICKER) or {}).get('volatility'), VOLATILITY_MODEL, VOLATILITY_REFIT_DAYS)
+        logging.info(f'The volatility-adaptive z-score of {last_crypto_value} is {volatility_event["z_score"]:.2f}.')
+
+        insert_anomaly_events(conn_string, DW_SCHEMA_TO_CREATE, pd.DataFrame([anomaly_event, volatility_event]))
+        refresh_anomaly_summary(conn_string, DW_SCHEMA_TO_CREATE)
+
+        # the scoring service hot-reloads the new fit, the next run picks up the volatility state
+        publish_detector_state(
+            lake_backend,
+            build_detector_state(TICKER, last_date, data_distribution, anomaly_detector, volatility_state))
+
+        event_artifact = json.dumps(anomaly_event).encode()
+        checkpoints.complete('detect', hash_bytes(event_artifact), processed_hash, event_artifact, 'json')
+    detect_hash = checkpoints.output_hash('detect')
+
+    # perform anomaly detection
+    if anomaly_event['is_anomaly'] and not checkpoints.is_done('alert', detect_hash):
         email_subject = f'Anomaly about {TICKER} cryptocurrency has been found!'
-        email_body = f'The anomaly detection system found an anomaly with a value of {last_crypto_value} and a p-value of {p_value}'
+        email_body = f'The anomaly detection system found an anomaly with a value of {last_crypto_value} and a p-value of {anomaly_event["p_value"]}'
         send_gmail_message(FROM, TO, EMAIL_PASS, email_subject, email_body)
+        checkpoints.complete('alert', detect_hash, detect_hash)
 
     logging.info(
-        f'The anomaly detection system for day {today_date.date()} ran successfully for the quote value {last_crypto_value} obtained for yesterday day {yesterday_date.date()}')
-    
+        f'The anomaly detection system for day {today_date.date()} ran successfully for the quote value {last_crypto_value} obtained for day {anomaly_event["date"]}')
+
+    logging.info(f'Memory report per stage: {governor.report()}')
     logging.info('Exiting the program...')
     exit()
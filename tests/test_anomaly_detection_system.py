@@ -7,10 +7,15 @@ Date: Aug/2023
 '''
 
 # import necessary packages
+import datetime
 import pytest
 import numpy as np
 from scipy import stats
 from components.anomaly_detection_system import detect_outliers_iqr, AnomalyTransformer
+from components.anomaly_detection_system import build_ohlcv_features, MultivariateAnomalyDetector, DETECTOR_VERSION
+from components.anomaly_detection_system import AnomalyDetector, sensitivity_sweep, sensitivity_sweep_tickers, select_thresholds
+from components.anomaly_detection_system import VolatilityAdaptiveDetector, _conditional_variance_log_likelihood
+from components.anomaly_detection_system import advance_volatility_state
 
 # DETERMINISTIC TESTS
 @pytest.mark.parametrize("data, k, return_thresholds, expected_result", [
@@ -55,6 +60,202 @@ def test_anomaly_detector_is_anomaly(anomaly_detector):
     assert anomaly_detector.is_anomaly(value3)
 
 
+def test_anomaly_detector_anomaly_event(anomaly_detector):
+    '''Unit tests for anomaly_event method of AnomalyDetector in anomaly_detection_system component'''
+    event = anomaly_detector.anomaly_event('ETH-USD', '2023-08-01', 15.3)
+
+    assert event['is_anomaly']
+    assert event['z_score'] == pytest.approx((15.3 - 5.5) / anomaly_detector.std)
+    assert event['p_value'] == pytest.approx(anomaly_detector.anomaly_report(15.3))
+    assert event['lower_bound'] < anomaly_detector.mean < event['upper_bound']
+    assert event['detector_version'] == DETECTOR_VERSION
+
+
+def test_build_ohlcv_features(sample_api_data):
+    '''Unit tests for build_ohlcv_features func in anomaly_detection_system component'''
+    features = build_ohlcv_features(sample_api_data)
+
+    assert features.shape == (4, 5)
+    assert np.allclose(features[:, 0], 1 / sample_api_data['Open'].values)
+    assert np.allclose(features[:, 1], 4 / sample_api_data['Open'].values)
+    assert np.allclose(features[:, 4], np.log1p(sample_api_data['Volume'].values))
+
+
+def test_multivariate_anomaly_detector():
+    '''Unit tests for MultivariateAnomalyDetector class in anomaly_detection_system component'''
+    rng = np.random.default_rng(42)
+    cov = np.array([[1.0, 0.8], [0.8, 1.0]])
+    features = rng.multivariate_normal([0, 0], cov, size=(3, 500))
+    features[:, :25] = 50  # contamination that a classical covariance would absorb
+    features[2, :100] = np.nan  # shorter history
+
+    detector = MultivariateAnomalyDetector().fit(features)
+
+    assert np.allclose(detector.location, 0, atol=0.2)
+    assert np.allclose(detector.covariance, cov, atol=0.25)
+
+    # a move against the correlation is anomalous even if each coordinate is not
+    new_rows = np.array([[0.5, 0.5], [2.0, -2.0], [0.0, 0.0]])
+    assert list(detector.is_anomaly(new_rows)) == [False, True, False]
+    assert detector.anomaly_report(new_rows).shape == (3,)
+
+
+def test_sensitivity_sweep_matches_detector():
+    '''Unit tests for sensitivity_sweep func: every (k, sigma) row matches a full fit of the detector'''
+    rng = np.random.default_rng(7)
+    data = np.round(np.concatenate([rng.standard_t(3, 2000) * 10, [300, -250, 400]]), 2)
+    last_value = 42.0
+
+    sweep = sensitivity_sweep(data, ks=[1.0, 1.5, 3.0], sigmas=[2.0, 3.0], value=last_value)
+    assert len(sweep) == 6
+
+    for row in sweep.itertuples():
+        outliers = detect_outliers_iqr(data, row.k)
+        cleaned = data[~outliers]
+        detector = AnomalyDetector(cleaned, np.mean(cleaned), np.std(cleaned), row.sigma * np.std(cleaned))
+
+        assert row.n_kept == len(cleaned)
+        assert row.mean == pytest.approx(detector.mean)
+        assert row.std == pytest.approx(detector.std)
+        assert row.n_alerts == sum(detector.is_anomaly(value) for value in data)
+        assert row.is_anomaly == detector.is_anomaly(last_value)
+
+
+def test_select_thresholds():
+    '''Unit tests for select_thresholds func: one (k, sigma) per ticker, close to the target alert rate'''
+    rng = np.random.default_rng(3)
+    histories = {'ETH-USD': rng.normal(0, 1, 1000), 'BTC-USD': rng.standard_t(2, 1000)}
+
+    sweep = sensitivity_sweep_tickers(histories)
+    thresholds = select_thresholds(sweep, target_alert_rate=0.02)
+
+    assert sorted(thresholds['ticker']) == ['BTC-USD', 'ETH-USD']
+    for ticker, best in thresholds.groupby('ticker'):
+        rates = sweep.loc[sweep['ticker'] == ticker, 'alert_rate']
+        assert abs(best['alert_rate'].iloc[0] - 0.02) == pytest.approx((rates - 0.02).abs().min())
+
+
+
+def test_sensitivity_sweep_tickers_skips_empty_histories():
+    '''Unit tests for sensitivity_sweep_tickers func: empty and all-NaN histories are left out, the others swept'''
+    histories = {'ETH-USD': np.random.default_rng(4).normal(0, 1, 100), 'NEW-USD': [], 'GAP-USD': [np.nan, np.nan]}
+
+    sweep = sensitivity_sweep_tickers(histories)
+    assert set(sweep['ticker']) == {'ETH-USD'}
+    assert sweep.equals(sensitivity_sweep_tickers({'ETH-USD': histories['ETH-USD']}))
+
+    with pytest.raises(ValueError):
+        sensitivity_sweep(histories['GAP-USD'])
+    with pytest.raises(ValueError):
+        sensitivity_sweep_tickers({'NEW-USD': []})
+
+def simulate_garch(n_tickers: int, n_days: int, omega: float, alpha: float, beta: float, seed: int = 0) -> np.array:
+    '''Simulate GARCH(1,1) price amplitudes for several tickers'''
+    rng = np.random.default_rng(seed)
+    data = np.zeros((n_tickers, n_days))
+    variance = np.full(n_tickers, omega / (1 - alpha - beta))
+    for t in range(n_days):
+        data[:, t] = rng.normal(size=n_tickers) * np.sqrt(variance)
+        variance = omega + alpha * data[:, t] ** 2 + beta * variance
+    return data
+
+
+def test_volatility_adaptive_detector_recovers_garch_parameters():
+    '''Unit tests for VolatilityAdaptiveDetector: the batched fit recovers the simulated parameters'''
+    data = simulate_garch(50, 2000, omega=0.05, alpha=0.1, beta=0.85)
+    data[0, :500] = np.nan  # shorter history
+
+    detector = VolatilityAdaptiveDetector('garch').fit(data)
+
+    assert np.median(detector.alpha) == pytest.approx(0.1, abs=0.03)
+    assert np.median(detector.beta) == pytest.approx(0.85, abs=0.05)
+    assert np.all(detector.alpha + detector.beta < 1)
+    assert detector.variance.shape == (50,)
+
+
+def test_volatility_adaptive_detector_update_matches_recursion():
+    '''Unit tests for VolatilityAdaptiveDetector.update: the O(1) updates continue the fitted recursion'''
+    data = simulate_garch(5, 1200, omega=0.05, alpha=0.1, beta=0.85, seed=1)
+
+    for model in ('garch', 'ewma'):
+        detector = VolatilityAdaptiveDetector(model).fit(data[:, :1000])
+        initial_variance = np.var(data[:, :1000], axis=1)[:, None]
+        omega, alpha, beta = detector.omega[:, None], detector.alpha[:, None], detector.beta[:, None]
+
+        for t in range(1000, 1200):
+            detector.update(data[:, t])
+
+        residuals = data - detector.mean[:, None]
+        _, forecast = _conditional_variance_log_likelihood(
+            residuals ** 2, np.ones(data.shape, dtype=bool), omega, alpha, beta, initial_variance)
+        assert np.allclose(detector.variance, forecast[:, 0])
+
+
+def test_volatility_adaptive_detector_follows_regime():
+    '''Unit tests for VolatilityAdaptiveDetector: a move is judged against the current volatility'''
+    rng = np.random.default_rng(2)
+    history = np.concatenate([rng.normal(0, 10, 400), rng.normal(0, 1, 200)])
+    static_std = np.std(history)
+
+    detector = VolatilityAdaptiveDetector('ewma').fit(history)
+
+    # large for a calm regime, ordinary for the whole history
+    assert abs(6.0 - np.mean(history)) < 3 * static_std
+    assert detector.is_anomaly(6.0)[0]
+    assert detector.anomaly_report(6.0)[0] < 0.01
+    assert not detector.is_anomaly(1.0)[0]
+
+
+def test_volatility_adaptive_detector_unknown_model():
+    '''Unit tests for VolatilityAdaptiveDetector: an unknown model is rejected'''
+    with pytest.raises(ValueError):
+        VolatilityAdaptiveDetector('arch')
+
+
+def test_volatility_adaptive_detector_masks_empty_tickers():
+    '''Unit tests for VolatilityAdaptiveDetector: a ticker without history is left unfitted, the others are not affected'''
+    data = simulate_garch(3, 800, omega=0.05, alpha=0.1, beta=0.85, seed=3)
+    data[1] = np.nan
+
+    detector = VolatilityAdaptiveDetector('garch').fit(data)
+    alone = VolatilityAdaptiveDetector('garch').fit(data[[0, 2]])
+
+    assert detector.fitted.tolist() == [True, False, True]
+    assert np.isnan(detector.variance[1]) and np.isnan(detector.score([0.0, 0.0, 0.0])[1])
+    assert not detector.is_anomaly([0.0, 1e6, 0.0])[1]
+    assert np.allclose(detector.variance[[0, 2]], alone.variance)
+    with pytest.raises(ValueError):
+        VolatilityAdaptiveDetector('garch').fit(np.full((2, 10), np.nan))
+
+
+def test_advance_volatility_state_updates_in_place_of_refitting():
+    '''Unit tests for advance_volatility_state: a state of the day before is updated, a stale one is refitted'''
+    data = simulate_garch(1, 1000, omega=0.05, alpha=0.1, beta=0.85, seed=4)[0]
+    start = datetime.date(2023, 1, 1)
+
+    event, state = advance_volatility_state('ETH-USD', start, data[:900], data[900])
+    assert state['fitted_at'] == '2022-12-31' and state['updated_through'] == '2023-01-01'
+    assert event['date'] == '2023-01-01' and event['detector_version'] == 'garch-3sigma-1'
+
+    detector = VolatilityAdaptiveDetector('garch').fit(data[:900])
+    detector.update(data[900])
+    for day in range(1, 10):
+        date = start + datetime.timedelta(days=day)
+        event, state = advance_volatility_state('ETH-USD', date, data[:900 + day], data[900 + day], state)
+        assert event['z_score'] == pytest.approx(detector.score(data[900 + day])[0])
+        detector.update(data[900 + day])
+
+    # nine O(1) updates of the first fit, no refit
+    assert state['fitted_at'] == '2022-12-31'
+    assert state['variance'] == pytest.approx(detector.variance[0])
+
+    # a skipped day or an old fit refits the parameters
+    _, gap = advance_volatility_state('ETH-USD', start + datetime.timedelta(days=12), data[:912], data[912], state)
+    _, old = advance_volatility_state('ETH-USD', start + datetime.timedelta(days=10), data[:910], data[910], state,
+                                      refit_days=5)
+    assert gap['fitted_at'] == '2023-01-12' and old['fitted_at'] == '2023-01-10'
+
+
 # NON-DETERMINISTIC TESTS
 def test_normality_db_data(historical_amplitude):
     '''Non deterministic tests for our historical data stored in database
@@ -0,0 +1,90 @@
+'''
+Unit tests for the functions included in
+the "create_s3_processed.py" component
+
+Author: Vitor Abdo
+Date: Oct/2026
+'''
+
+# import necessary packages
+import pytest
+import pandas as pd
+from components.lake_backend import LocalLakeBackend
+from components.create_s3_processed import get_range_from_processed_layer
+
+
+@pytest.fixture
+def processed_lake(tmp_path):
+    '''Local lake with one processed partition per asset and day'''
+    backend = LocalLakeBackend(str(tmp_path / 'lake'))
+    for asset in ('eth', 'btc'):
+        for day in ('2023-01-01', '2023-01-02', '2023-01-03'):
+            partition = pd.DataFrame({
+                'id': [1.0],
+                'date': [day],
+                'price_amplitude': [float(day[-1])],
+                'created_at': [pd.Timestamp(day)],
+                'updated_at': [pd.Timestamp(day)]})
+            local_file = tmp_path / f'{asset}_{day}.parquet'
+            partition.to_parquet(local_file, compression='gzip')
+            backend.put_file(
+                str(local_file),
+                f'processed/crypto_anomaly_detect/{asset}/extracted_at={day}/processed_{asset}_historical_data.parquet')
+    return backend
+
+
+def test_get_range_from_processed_layer(processed_lake):
+    '''Test whether only the partitions of the assets and dates asked for are read, in order'''
+    table, stats = get_range_from_processed_layer(
+        '', '', '', '', '2023-01-02', '2023-01-03', ['eth', 'btc'], processed_lake, max_workers=4, return_stats=True)
+
+    assert table.column('asset').to_pylist() == ['eth', 'eth', 'btc', 'btc']
+    assert table.column('extracted_at').to_pylist() == ['2023-01-02', '2023-01-03'] * 2
+    assert table.column('price_amplitude').to_pylist() == [2.0, 3.0, 2.0, 3.0]
+    assert stats['objects'] == 4
+    assert stats['objects_per_s'] > 0
+
+
+def test_get_range_from_processed_layer_does_not_copy(processed_lake):
+    '''Test whether the partitions are concatenated as chunks instead of being copied into one buffer'''
+    table = get_range_from_processed_layer('', '', '', '', '2023-01-01', '2023-01-03', ['eth'], processed_lake)
+
+    assert table.num_rows == 3
+    assert table.column('price_amplitude').num_chunks == 3
+
+
+def test_get_range_from_processed_layer_empty(processed_lake):
+    '''Test whether a range without partitions gives an empty table'''
+    table = get_range_from_processed_layer('', '', '', '', '2024-01-01', '2024-01-31', ['eth'], processed_lake)
+
+    assert table.num_rows == 0
+
+
+def test_get_range_from_processed_layer_bounds_listing(processed_lake, monkeypatch):
+    '''Test whether the listing starts at the range instead of covering the whole history of the asset'''
+    listings = []
+    list_keys = processed_lake.list_keys
+    monkeypatch.setattr(processed_lake, 'list_keys', lambda prefix, start_after=None: listings.append(
+        (prefix, start_after)) or list_keys(prefix, start_after))
+
+    table = get_range_from_processed_layer('', '', '', '', '2023-01-02', '2023-01-09', ['eth'], processed_lake)
+
+    assert table.column('extracted_at').to_pylist() == ['2023-01-02', '2023-01-03']
+    assert listings == [('processed/crypto_anomaly_detect/eth/extracted_at=2023-01-0',
+                         'processed/crypto_anomaly_detect/eth/extracted_at=2023-01-02')]
+
+
+def test_get_range_from_processed_layer_schema_drift(processed_lake, tmp_path):
+    '''Test whether a partition with an extra column is concatenated with nulls for the others'''
+    partition = pd.DataFrame({'id': [1.0], 'date': ['2023-01-04'], 'price_amplitude': [4.0],
+                              'created_at': [pd.Timestamp('2023-01-04')], 'updated_at': [pd.Timestamp('2023-01-04')],
+                              'volume': [100.0]})
+    local_file = tmp_path / 'eth_2023-01-04.parquet'
+    partition.to_parquet(local_file)
+    processed_lake.put_file(
+        str(local_file),
+        'processed/crypto_anomaly_detect/eth/extracted_at=2023-01-04/processed_eth_historical_data.parquet')
+
+    table = get_range_from_processed_layer('', '', '', '', '2023-01-03', '2023-01-04', ['eth'], processed_lake)
+
+    assert table.column('volume').to_pylist() == [None, 100.0]
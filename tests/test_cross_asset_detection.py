@@ -0,0 +1,87 @@
+'''
+Unit tests for the functions included in
+the "cross_asset_detection.py" component
+
+Author: Vitor Abdo
+Date: Oct/2026
+'''
+
+# import necessary packages
+import numpy as np
+from components.cross_asset_detection import CrossAssetMonitor
+
+
+def make_history(n_days: int = 400, n_assets: int = 20, seed: int = 0) -> np.array:
+    '''Daily values driven by one market factor plus idiosyncratic noise'''
+    rng = np.random.default_rng(seed)
+    market = rng.normal(size=(n_days, 1))
+    return market + 0.5 * rng.normal(size=(n_days, n_assets))
+
+
+def test_update_matches_reference():
+    '''Test whether the in-place rank-1 update matches the EWMA recursion and stays close to a refit'''
+    history = make_history()
+    tickers = [f'T{i}' for i in range(history.shape[1])]
+
+    monitor = CrossAssetMonitor(tickers).fit(history[:300])
+    mean, covariance = monitor.mean.copy(), np.array(monitor.covariance)
+    for values in history[300:]:
+        monitor.update(values)
+        deviation = values - mean
+        mean = mean + monitor.alpha * deviation
+        covariance = (1 - monitor.alpha) * (covariance + monitor.alpha * np.outer(deviation, deviation))
+
+    np.testing.assert_allclose(monitor.mean, mean)
+    np.testing.assert_allclose(monitor.covariance, covariance)
+
+    refit = CrossAssetMonitor(tickers).fit(history)
+    np.testing.assert_allclose(monitor.covariance, refit.covariance, rtol=1e-2)
+
+
+def test_update_flags_isolated_move():
+    '''Test whether a ticker moving alone is flagged as decoupled, not as a market move'''
+    history = make_history()
+    monitor = CrossAssetMonitor([f'T{i}' for i in range(history.shape[1])]).fit(history)
+
+    values = monitor.mean.copy()
+    values[3] += 10
+    flagged = monitor.flagged_tickers(monitor.update(values))
+
+    assert flagged['decoupled'] == ['T3']
+    assert not flagged['market_move']
+
+
+def test_update_flags_market_move():
+    '''Test whether the whole universe moving together is a market move, not decoupled tickers'''
+    history = make_history()
+    monitor = CrossAssetMonitor([f'T{i}' for i in range(history.shape[1])]).fit(history)
+
+    flagged = monitor.flagged_tickers(monitor.update(monitor.mean + 6))
+
+    assert flagged['market_move']
+    assert flagged['decoupled'] == []
+
+
+def test_update_flags_correlation_regime_break():
+    '''Test whether a ticker that stops following the market is flagged as a regime break'''
+    history = make_history()
+    monitor = CrossAssetMonitor([f'T{i}' for i in range(history.shape[1])], halflife=10).fit(history)
+
+    rng = np.random.default_rng(1)
+    flagged = {'regime_break': []}
+    for _ in range(40):
+        values = rng.normal(size=history.shape[1]) + rng.normal()
+        values[5] = rng.normal()
+        flagged = monitor.flagged_tickers(monitor.update(values))
+
+    assert 'T5' in flagged['regime_break']
+
+
+def test_float32_state():
+    '''Test whether the monitor keeps a float32 covariance when asked to'''
+    history = make_history()
+    monitor = CrossAssetMonitor([f'T{i}' for i in range(history.shape[1])], dtype=np.float32).fit(history)
+    monitor.update(history[-1])
+
+    assert monitor.covariance.dtype == np.float32
+    assert monitor.covariance.flags['F_CONTIGUOUS']
@@ -0,0 +1,271 @@
+'''
+Unit tests for the functions included in
+the "dw_management.py" component
+
+The insert tests run against a local Postgres, given by the
+DW_TEST_DSN environment variable, e.g.
+DW_TEST_DSN="host=localhost dbname=postgres user=postgres"
+They are skipped when it is not set.
+
+Author: Vitor Abdo
+Date: Oct/2026
+'''
+
+# import necessary packages
+import os
+import pytest
+import numpy as np
+import pandas as pd
+import psycopg2
+from psycopg2.extensions import parse_dsn
+from components import dw_management
+from components.dw_management import iter_chunks_from_database, fetch_array_from_database
+from components.dw_management import insert_data_into_postgresql, upsert_small_batch_into_postgresql
+from components.dw_management import insert_anomaly_events, fetch_anomaly_events
+from components.dw_management import refresh_anomaly_summary, fetch_anomaly_summary
+from components.dw_migrations import MIGRATIONS, PROCESSED_TABLE_COLUMNS
+from components.memory_governor import MemoryGovernor, MemoryBudgetExceeded, current_rss_mb
+
+DSN = os.getenv('DW_TEST_DSN')
+SCHEMA = 'dw_test'
+TEMP_SCHEMA = 'temp_dw_test'
+
+requires_postgres = pytest.mark.skipif(DSN is None, reason='DW_TEST_DSN is not set')
+
+
+class FakeCursor:
+    '''Minimal psycopg2 cursor that serves rows from memory'''
+    def __init__(self, rows):
+        self.rows = rows
+        self.position = 0
+        self.itersize = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def execute(self, query, params=None):
+        self.query = query
+
+    def fetchone(self):
+        return (len(self.rows),)
+
+    def fetchmany(self, size):
+        rows = self.rows[self.position:self.position + size]
+        self.position += len(rows)
+        return rows
+
+
+class FakeConnection:
+    '''Minimal psycopg2 connection that serves rows from memory'''
+    def __init__(self, rows):
+        self.rows = rows
+        self.closed = False
+
+    def cursor(self, name=None):
+        return FakeCursor(self.rows)
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def fake_connect(monkeypatch):
+    rows = [(float(i), float(i) * 2) for i in range(25)]
+    monkeypatch.setattr(dw_management.psycopg2, 'connect', lambda conn_string: FakeConnection(rows))
+    return rows
+
+
+def test_iter_chunks_from_database_chunk_sizes(fake_connect):
+    '''Test whether iter_chunks_from_database yields fixed-size chunks'''
+    sizes = [len(chunk) for chunk in iter_chunks_from_database('', 'SELECT 1', chunk_size=10)]
+    assert sizes == [10, 10, 5]
+
+
+
+def test_iter_chunks_from_database_checks_memory(fake_connect):
+    '''Test whether iter_chunks_from_database calls the memory check before each chunk and stops over the limit'''
+    checks = []
+    chunks = list(iter_chunks_from_database('', 'SELECT 1', chunk_size=10, check_memory=lambda: checks.append(1)))
+    assert len(chunks) == 3 and len(checks) == 4
+
+    governor = MemoryGovernor(budget_mb=current_rss_mb() / 2)
+    with pytest.raises(MemoryBudgetExceeded):
+        fetch_array_from_database('', 'SELECT 1', chunk_size=10, check_memory=governor.check)
+
+
+@pytest.mark.parametrize("use_float32, expected_dtype", [
+    (False, np.float64),
+    (True, np.float32),
+])
+def test_fetch_array_from_database(fake_connect, use_float32, expected_dtype):
+    '''Test whether fetch_array_from_database fills the whole preallocated array'''
+    result = fetch_array_from_database('', 'SELECT 1', chunk_size=10, use_float32=use_float32)
+
+    assert result.dtype == expected_dtype
+    assert np.array_equal(result, np.array(fake_connect, dtype=expected_dtype))
+
+
+def processed_batch(dates: list) -> pd.DataFrame:
+    '''Processed-like dataframe with one row per date'''
+    return pd.DataFrame({
+        'id': range(len(dates)),
+        'date': dates,
+        'price_amplitude': np.linspace(1, 2, len(dates)),
+        'created_at': '2023-01-01 00:00:00',
+        'updated_at': '2023-01-01 00:00:00'})
+
+
+def test_insert_switches_path_on_small_batch_max_rows(monkeypatch):
+    '''Test whether batches up to small_batch_max_rows take the small-batch path and larger ones the bulk path'''
+    def refuse_bulk(**kwargs):
+        raise ConnectionError('bulk')
+
+    small_calls = []
+    monkeypatch.setattr(dw_management, 'upsert_small_batch_into_postgresql', lambda *args, **kwargs: small_calls.append(args))
+    monkeypatch.setattr(dw_management.psycopg2, 'connect', refuse_bulk)
+
+    insert_data_into_postgresql('', 5432, '', '', '', 'schema', 'table', processed_batch(['2023-01-01'] * 3), 'temp', 3)
+    assert len(small_calls) == 1
+
+    with pytest.raises(ConnectionError, match='bulk'):
+        insert_data_into_postgresql('', 5432, '', '', '', 'schema', 'table', processed_batch(['2023-01-01'] * 4), 'temp', 3)
+    assert len(small_calls) == 1
+
+
+def test_small_batch_checks_columns(monkeypatch):
+    '''Test whether the small-batch path rejects a dataframe whose columns do not match the table'''
+    monkeypatch.setattr(dw_management, '_table_columns_cache', {})
+    monkeypatch.setattr(dw_management.psycopg2, 'connect', lambda **kwargs: FakeConnection([]))
+    dw_management.cache_table_columns('schema', 'table', [name for name, _ in PROCESSED_TABLE_COLUMNS])
+
+    batch = processed_batch(['2023-01-01']).rename(columns={'price_amplitude': 'amplitude'})
+    with pytest.raises(ValueError):
+        upsert_small_batch_into_postgresql('', 5432, '', '', '', 'schema', 'table', batch)
+
+
+@pytest.fixture
+def dw_tables():
+    '''Two empty processed tables in a test schema of the local Postgres'''
+    columns = ', '.join(f'{name} {data_type}' for name, data_type in PROCESSED_TABLE_COLUMNS)
+    conn = psycopg2.connect(DSN)
+    with conn:
+        with conn.cursor() as cur:
+            cur.execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE')
+            cur.execute(f'DROP SCHEMA IF EXISTS {TEMP_SCHEMA} CASCADE')
+            cur.execute(f'CREATE SCHEMA {SCHEMA}')
+            cur.execute(f'CREATE SCHEMA {TEMP_SCHEMA}')
+            for table in ('small_path', 'bulk_path'):
+                cur.execute(f'CREATE TABLE {SCHEMA}.{table} ({columns}, PRIMARY KEY (date))')
+    conn.close()
+
+    params = parse_dsn(DSN)
+    yield [params.get('host', 'localhost'), params.get('port', 5432), params['dbname'], params['user'],
+           params.get('password', '')]
+
+    conn = psycopg2.connect(DSN)
+    with conn:
+        with conn.cursor() as cur:
+            cur.execute(f'DROP SCHEMA {SCHEMA} CASCADE')
+            cur.execute(f'DROP SCHEMA {TEMP_SCHEMA} CASCADE')
+    conn.close()
+
+
+def read_table(table: str) -> list:
+    '''Rows of a test table ordered by date'''
+    conn = psycopg2.connect(DSN)
+    with conn.cursor() as cur:
+        cur.execute(f'SELECT * FROM {SCHEMA}.{table} ORDER BY date')
+        rows = cur.fetchall()
+    conn.close()
+    return rows
+
+
+@requires_postgres
+def test_small_and_bulk_paths_are_idempotent_and_equal(dw_tables, monkeypatch):
+    '''Test whether reinserting a batch is a no-op, both paths leave the same rows and both skip a missing table'''
+    monkeypatch.setattr(dw_management, '_table_columns_cache', {})
+    first = processed_batch([f'2023-01-{day:02d}' for day in range(1, 11)])
+    overlap = processed_batch([f'2023-01-{day:02d}' for day in range(6, 16)]).assign(price_amplitude=-1.0)
+
+    checks = []
+    for batch in (first, first, overlap):
+        for table, small_batch_max_rows in (('small_path', 1000), ('bulk_path', 0)):
+            insert_data_into_postgresql(
+                *dw_tables, SCHEMA, table, batch, TEMP_SCHEMA, small_batch_max_rows,
+                chunk_size=4, check_memory=lambda: checks.append(table))
+
+    rows = read_table('small_path')
+    assert len(rows) == 15
+    assert rows == read_table('bulk_path')
+    # existing days are never overwritten
+    assert [row[2] for row in rows[:10]] == first['price_amplitude'].tolist()
+    # both paths write 10 rows in batches of 4 and check the memory before each batch
+    assert checks.count('small_path') == checks.count('bulk_path') == 9
+
+    # a missing table is skipped the same way by both paths
+    for small_batch_max_rows in (1000, 0):
+        insert_data_into_postgresql(*dw_tables, SCHEMA, 'missing_table', first, TEMP_SCHEMA, small_batch_max_rows)
+    conn = psycopg2.connect(DSN)
+    with conn.cursor() as cur:
+        cur.execute('SELECT to_regclass(%s), to_regclass(%s)',
+                    (f'{SCHEMA}.missing_table', f'{TEMP_SCHEMA}.temp_missing_table'))
+        assert cur.fetchone() == (None, None)
+    conn.close()
+
+
+@pytest.fixture
+def events_schema():
+    '''Test schema with the anomaly events table, its indexes and the summary view'''
+    conn = psycopg2.connect(DSN)
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE')
+        cur.execute(f'CREATE SCHEMA {SCHEMA}')
+        for version, _, statements in MIGRATIONS:
+            if version == 2:
+                for statement in statements:
+                    cur.execute(statement.format(schema_name=SCHEMA))
+    yield SCHEMA
+
+    with conn.cursor() as cur:
+        cur.execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE')
+    conn.close()
+
+
+def anomaly_events(ticker: str, values: list, anomalies: set) -> pd.DataFrame:
+    '''One event per day of January 2023, flagged as anomaly on the given days'''
+    return pd.DataFrame({
+        'ticker': ticker,
+        'date': [f'2023-01-{day:02d}' for day in range(1, len(values) + 1)],
+        'value': values,
+        'z_score': [value / 10 for value in values],
+        'p_value': [0.001 if day in anomalies else 0.5 for day in range(1, len(values) + 1)],
+        'lower_bound': -30.0,
+        'upper_bound': 30.0,
+        'is_anomaly': [day in anomalies for day in range(1, len(values) + 1)],
+        'detector_version': 'test'})
+
+
+@requires_postgres
+def test_anomaly_events_round_trip(events_schema):
+    '''Test whether events are upserted per (ticker, date, version) and read back by ticker and range'''
+    insert_anomaly_events(DSN, events_schema, anomaly_events('ETH-USD', [1.0, 40.0, 2.0, 3.0, -50.0], {2, 5}))
+    insert_anomaly_events(DSN, events_schema, anomaly_events('BTC-USD', [1.0, 2.0, 60.0], {3}))
+    # scoring a day again overwrites its event
+    insert_anomaly_events(DSN, events_schema, anomaly_events('ETH-USD', [1.0, 45.0], {2}))
+
+    flagged = fetch_anomaly_events(DSN, events_schema, 'ETH-USD', '2023-01-01', '2023-01-31')
+    assert [str(day) for day in flagged['date']] == ['2023-01-02', '2023-01-05']
+    assert flagged['value'].tolist() == [45.0, -50.0]
+
+    scored = fetch_anomaly_events(DSN, events_schema, 'ETH-USD', '2023-01-02', '2023-01-04', only_anomalies=False)
+    assert len(scored) == 3
+
+    refresh_anomaly_summary(DSN, events_schema)
+    summary = fetch_anomaly_summary(DSN, events_schema, '2023-01-02', '2023-01-03')
+    assert summary['n_scored'].tolist() == [2, 2]
+    assert summary['n_anomalies'].tolist() == [1, 1]
+    assert summary['anomalous_tickers'].tolist() == [['ETH-USD'], ['BTC-USD']]
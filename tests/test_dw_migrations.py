@@ -0,0 +1,150 @@
+'''
+Unit tests for the functions included in
+the "dw_migrations.py" component
+
+Author: Vitor Abdo
+Date: Oct/2026
+'''
+
+# import necessary packages
+import os
+import pytest
+import psycopg2
+from components import dw_management, dw_migrations
+from components.dw_migrations import apply_migrations, MIGRATIONS, MIGRATIONS_TABLE
+
+DSN = os.getenv('DW_TEST_DSN')
+SCHEMA = 'dw_migrations_test'
+
+requires_postgres = pytest.mark.skipif(DSN is None, reason='DW_TEST_DSN is not set')
+
+
+class VersionConnection:
+    '''Minimal psycopg2 connection whose version table is already up to date'''
+    def __init__(self, queries):
+        self.queries = queries
+
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def execute(self, query, params=None):
+        self.queries.append(query)
+
+    def fetchall(self):
+        return [(version,) for version, _, _ in MIGRATIONS]
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def executed_queries(monkeypatch):
+    queries = []
+    monkeypatch.setattr(dw_migrations, '_checked_tables', set())
+    monkeypatch.setattr(dw_management, '_table_columns_cache', {})
+    monkeypatch.setattr(dw_migrations.psycopg2, 'connect', lambda **kwargs: VersionConnection(queries))
+    return queries
+
+
+def test_apply_migrations_checks_version_once(executed_queries):
+    '''Test whether a hot process skips every catalog query after the first check'''
+    for _ in range(3):
+        version = apply_migrations('', 5432, '', '', '', 'schema', 'temp_schema', 'table')
+
+    assert version == dw_migrations.latest_version()
+    assert len(executed_queries) == 1
+    assert 'information_schema' not in executed_queries[0]
+
+
+def test_apply_migrations_tracks_each_table(executed_queries):
+    '''Test whether a new table of an up to date schema gets its own version check instead of a stale cache'''
+    apply_migrations('', 5432, '', '', '', 'schema', 'temp_schema', 'table')
+    apply_migrations('', 5432, '', '', '', 'schema', 'temp_schema', 'other_table')
+
+    assert len(executed_queries) == 2
+    assert all("table_name IN (%s, '')" in query for query in executed_queries)
+
+
+class EmptyVersionConnection(VersionConnection):
+    '''Connection of a database where no migration was applied yet'''
+    def __init__(self, queries, table_exists):
+        super().__init__(queries)
+        self.table_exists = table_exists
+
+    def fetchall(self):
+        return []
+
+    def fetchone(self):
+        return ('schema.table',) if self.table_exists else (None,)
+
+
+@pytest.mark.parametrize('table_exists', [False, True])
+def test_apply_migrations_caches_only_created_tables(monkeypatch, table_exists):
+    '''Test whether the known columns are cached for a table the migrations created, and only for it'''
+    monkeypatch.setattr(dw_migrations, '_checked_tables', set())
+    monkeypatch.setattr(dw_management, '_table_columns_cache', {})
+    monkeypatch.setattr(
+        dw_migrations.psycopg2, 'connect', lambda **kwargs: EmptyVersionConnection([], table_exists))
+    apply_migrations('', 5432, '', '', '', 'schema', 'temp_schema', 'table')
+
+    if table_exists:
+        assert dw_management._table_columns_cache == {}
+    else:
+        assert dw_management._table_columns_cache[('schema', 'table')] == [
+            'id', 'date', 'price_amplitude', 'created_at', 'updated_at']
+
+
+@pytest.fixture
+def migrations_schema(monkeypatch):
+    '''Empty schema on the test database, with its recorded migrations removed afterwards'''
+    monkeypatch.setattr(dw_migrations, '_checked_tables', set())
+    monkeypatch.setattr(dw_management, '_table_columns_cache', {})
+
+    def cleanup():
+        conn = psycopg2.connect(DSN)
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE')
+            cur.execute(f'DROP SCHEMA IF EXISTS temp_{SCHEMA} CASCADE')
+            cur.execute('SELECT to_regclass(%s)', (MIGRATIONS_TABLE,))
+            if cur.fetchone()[0] is not None:
+                cur.execute(f'DELETE FROM {MIGRATIONS_TABLE} WHERE schema_name = %s', (SCHEMA,))
+        conn.close()
+
+    cleanup()
+    yield psycopg2.extensions.parse_dsn(DSN)
+    cleanup()
+
+
+@requires_postgres
+def test_apply_migrations_records_schema_and_table_versions(migrations_schema):
+    '''Test whether the schema-wide migrations are recorded once and the table ones per table'''
+    db = migrations_schema
+    conn = psycopg2.connect(DSN)
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute(f'CREATE SCHEMA {SCHEMA}')
+        cur.execute(f'CREATE TABLE {SCHEMA}.legacy_table (date TEXT PRIMARY KEY, close FLOAT)')
+
+    for table_name in ('new_table', 'legacy_table'):
+        apply_migrations(db.get('host', 'localhost'), db.get('port', 5432), db['dbname'], db['user'],
+                         db.get('password', ''), SCHEMA, f'temp_{SCHEMA}', table_name)
+
+    with conn.cursor() as cur:
+        cur.execute(
+            f'SELECT table_name, version FROM {MIGRATIONS_TABLE} WHERE schema_name = %s ORDER BY 2, 1', (SCHEMA,))
+        recorded = cur.fetchall()
+    conn.close()
+
+    assert recorded == [('legacy_table', 1), ('new_table', 1), ('', 2), ('', 3)]
+    assert dw_management._table_columns_cache == {
+        (SCHEMA, 'new_table'): ['id', 'date', 'price_amplitude', 'created_at', 'updated_at']}
@@ -7,24 +7,109 @@ Date: Aug/2023
 '''
 
 # import necessary packages
-from components.get_api_data import get_historical_data
+import os
+import datetime
+import pytest
+import pandas as pd
+from components.get_api_data import get_historical_data, CachedYahooSource
 
 
-def test_columns_get_historical_data_success(sample_api_data):
+@pytest.fixture
+def stub_source(tmp_path, sample_api_data):
+    '''CachedYahooSource answering with the sample data, caching under a temporary directory'''
+    return CachedYahooSource(
+        cache_dir=str(tmp_path / 'yahoo_cache'), backoff_base=0,
+        downloader=lambda ticker, start_date, end_date, interval: sample_api_data)
+
+
+def test_columns_get_historical_data_success(sample_api_data, stub_source):
     '''Test whether get_historical_data returns correct data columns.'''
     ticker = 'ETH-USD'
     start_date = '2023-01-01'
     end_date = '2023-01-04'
-    result = get_historical_data(ticker, start_date, end_date)
+    result = get_historical_data(ticker, start_date, end_date, stub_source)
 
     assert all(col in sample_api_data.columns for col in result.columns)
 
 
-def test_index_get_historical_data_success(sample_api_data):
+def test_index_get_historical_data_success(sample_api_data, stub_source):
     '''Test whether get_historical_data returns correct index.'''
     ticker = 'ETH-USD'
     start_date = '2023-01-01'
     end_date = '2023-01-04'
-    result = get_historical_data(ticker, start_date, end_date)
+    result = get_historical_data(ticker, start_date, end_date, stub_source)
 
     assert result.index.name == sample_api_data.index.name
+
+
+def test_cached_yahoo_source_hits_cache(tmp_path, sample_api_data):
+    '''Test whether CachedYahooSource downloads a closed range only once.'''
+    calls = []
+
+    def downloader(ticker, start_date, end_date, interval):
+        calls.append((ticker, start_date, end_date, interval))
+        return sample_api_data
+
+    source = CachedYahooSource(cache_dir=str(tmp_path), downloader=downloader)
+    for _ in range(3):
+        result = get_historical_data('ETH-USD', '2023-01-01', '2023-01-04', source)
+
+    assert len(calls) == 1
+    assert result.equals(sample_api_data)
+    assert source.stats()['hit_ratio'] == pytest.approx(2 / 3)
+
+
+def test_cached_yahoo_source_retries(tmp_path, sample_api_data):
+    '''Test whether CachedYahooSource retries failed and empty responses.'''
+    responses = [ConnectionError('timeout'), pd.DataFrame(), sample_api_data]
+
+    def downloader(ticker, start_date, end_date, interval):
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    source = CachedYahooSource(cache_dir=str(tmp_path), backoff_base=0, downloader=downloader)
+    result = source.get_history('ETH-USD', '2023-01-01', '2023-01-04')
+
+    assert result.equals(sample_api_data)
+    assert source.stats()['fetches'] == 3
+
+
+def test_cached_yahoo_source_raises_when_empty(tmp_path):
+    '''Test whether CachedYahooSource raises instead of returning an empty dataframe.'''
+    source = CachedYahooSource(
+        cache_dir=str(tmp_path), max_retries=1, backoff_base=0,
+        downloader=lambda *args: pd.DataFrame())
+
+    with pytest.raises(RuntimeError):
+        source.get_history('ETH-USD', '2023-01-01', '2023-01-04')
+
+
+def test_cached_yahoo_source_expires_ranges_fetched_before_they_settle(tmp_path, sample_api_data):
+    '''Test whether a range fetched during its last UTC day expires, and one fetched the day after does not.'''
+    calls = []
+
+    def downloader(ticker, start_date, end_date, interval):
+        calls.append(end_date)
+        return sample_api_data
+
+    source = CachedYahooSource(cache_dir=str(tmp_path), open_day_ttl=900, downloader=downloader)
+    today = str(datetime.datetime.now(datetime.timezone.utc).date())
+    source.get_history('ETH-USD', '2023-01-01', today)
+    source.get_history('ETH-USD', '2023-01-01', today)
+    assert len(calls) == 1
+
+    # once the ttl is over, a range fetched during the day it ends is fetched again
+    source.open_day_ttl = 0
+    source.get_history('ETH-USD', '2023-01-01', today)
+    assert len(calls) == 2
+
+    # fetched the day after the end of the range: settled forever
+    end_date = '2023-01-04'
+    source.get_history('ETH-USD', '2023-01-01', end_date)
+    cache_path = source._cache_path('ETH-USD', '1d', '2023-01-01', end_date)
+    next_day = datetime.datetime(2023, 1, 5, tzinfo=datetime.timezone.utc).timestamp()
+    os.utime(cache_path, (next_day, next_day))
+    source.get_history('ETH-USD', '2023-01-01', end_date)
+    assert len(calls) == 3
@@ -0,0 +1,76 @@
+'''
+Unit tests for the functions included in
+the "lake_backend.py" component
+
+Author: Vitor Abdo
+Date: Oct/2026
+'''
+
+# import necessary packages
+import pytest
+import pyarrow as pa
+from components import lake_backend
+from components.lake_backend import LakeBackend, LocalLakeBackend, get_lake_backend
+
+
+@pytest.fixture
+def local_backend(tmp_path):
+    return LocalLakeBackend(str(tmp_path / 'lake'))
+
+
+def test_local_lake_backend_round_trip(tmp_path, local_backend, sample_api_data):
+    '''Test whether objects written to the local lake are read back with the same key layout'''
+    local_file = tmp_path / 'eth_historical_data.parquet'
+    sample_api_data.to_parquet(local_file)
+
+    key = 'processed/crypto_anomaly_detect/eth/extracted_at=2023-01-04/processed_eth_historical_data.parquet'
+    local_backend.put_file(str(local_file), key)
+
+    assert local_backend.list_keys('processed/crypto_anomaly_detect/eth/') == [key]
+    assert local_backend.read_table(key).to_pandas().equals(sample_api_data)
+
+
+def test_local_lake_backend_zero_copy_arrow(tmp_path, local_backend, sample_api_data):
+    '''Test whether Arrow IPC objects are read without copying them out of the memory map'''
+    table = pa.Table.from_pandas(sample_api_data)
+    local_file = tmp_path / 'eth_historical_data.arrow'
+    with pa.OSFile(str(local_file), 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+    local_backend.put_file(str(local_file), 'raw/eth_historical_data.arrow')
+    allocated_before = pa.total_allocated_bytes()
+    result = local_backend.read_table('raw/eth_historical_data.arrow')
+
+    assert result.equals(table)
+    assert pa.total_allocated_bytes() == allocated_before
+
+
+def test_local_lake_backend_lists_from_prefix_directory(local_backend, monkeypatch):
+    '''Test whether listing walks the directory of the prefix only, and exists does not list'''
+    keys = ['processed/eth/processed_at=2023-01-01/a.parquet', 'processed/eth/processed_at=2023-02-01/a.parquet',
+            'processed/btc/processed_at=2023-01-01/a.parquet']
+    for key in keys:
+        local_backend.put_bytes(b'data', key)
+
+    walked = []
+    walk = lake_backend.os.walk
+    monkeypatch.setattr(lake_backend.os, 'walk', lambda top: walked.append(top) or walk(top))
+
+    assert local_backend.list_keys('processed/eth/processed_at=2023-01') == keys[:1]
+    assert walked == [local_backend._path('processed/eth')]
+    assert local_backend.list_keys('processed/xrp/') == []
+    assert local_backend.exists(keys[2]) and not local_backend.exists('processed/btc/missing.parquet')
+    assert len(walked) == 2
+
+
+def test_lake_backend_is_abstract():
+    '''Test whether a backend missing part of the interface cannot be created'''
+    with pytest.raises(TypeError):
+        LakeBackend()
+
+
+def test_get_lake_backend_unknown():
+    '''Test whether an unknown backend name is rejected'''
+    with pytest.raises(ValueError):
+        get_lake_backend('gcs')
@@ -0,0 +1,94 @@
+'''
+Unit tests for the functions included in
+the "memory_governor.py" component
+
+Author: Vitor Abdo
+Date: Oct/2026
+'''
+
+# import necessary packages
+import time
+import _thread
+import threading
+import tracemalloc
+import pytest
+import numpy as np
+from components.memory_governor import MemoryGovernor, MemoryBudgetExceeded, current_rss_mb
+
+
+def test_chunk_size_is_clamped():
+    '''Test whether chunk_size stays between min_rows and max_rows'''
+    no_headroom = MemoryGovernor(budget_mb=1)
+    large_headroom = MemoryGovernor(budget_mb=10 ** 6)
+
+    assert no_headroom.chunk_size(row_bytes=100, min_rows=500) == 500
+    assert large_headroom.chunk_size(row_bytes=100, max_rows=20000) == 20000
+
+
+def test_stage_records_allocation_report():
+    '''Test whether a stage records its RSS and python allocations'''
+    governor = MemoryGovernor(budget_mb=10 ** 6, trace_allocations=True)
+    with governor.stage('allocate'):
+        data = [np.ones(2 ** 20) for _ in range(4)]
+    del data
+
+    record = governor.report()[0]
+    assert record['stage'] == 'allocate'
+    assert record['rss_peak_mb'] >= record['rss_start_mb'] > 0
+    assert record['traced_peak_mb'] >= 30
+    assert len(record['top_allocations']) > 0
+
+
+def test_check_fails_fast_with_report():
+    '''Test whether going over the hard limit raises with the allocation report'''
+    governor = MemoryGovernor(budget_mb=current_rss_mb() / 2, trace_allocations=False)
+
+    with pytest.raises(MemoryBudgetExceeded) as error:
+        with governor.stage('over_budget'):
+            governor.check('over_budget')
+
+    assert error.value.args[1]['stage'] == 'over_budget'
+
+
+def test_sampler_interrupts_stage():
+    '''Test whether the sampler interrupts a stage that does not call check'''
+    governor = MemoryGovernor(budget_mb=current_rss_mb() / 2, sample_interval=0.01, trace_allocations=False)
+
+    with pytest.raises(MemoryBudgetExceeded):
+        with governor.stage('busy'):
+            deadline = time.time() + 5
+            while time.time() < deadline:
+                pass
+
+
+def test_stage_cleans_up_on_other_exceptions():
+    '''Test whether an ordinary exception stops the sampler and tracemalloc and records the stage'''
+    governor = MemoryGovernor(budget_mb=10 ** 6, trace_allocations=True)
+
+    with pytest.raises(ValueError):
+        with governor.stage('failing'):
+            raise ValueError('bad data')
+
+    assert governor.report()[0]['stage'] == 'failing'
+    assert not tracemalloc.is_tracing()
+    assert not [thread for thread in threading.enumerate() if thread.name.endswith('(_sample)')]
+
+
+def test_late_interrupt_is_converted(monkeypatch):
+    '''Test whether an interrupt of the sampler landing after the stage body returned still fails the stage'''
+    governor = MemoryGovernor(budget_mb=10 ** 6)
+
+    def interrupt_while_finishing(record, stop):
+        stop.wait()
+        governor._exceeded = 'RSS is over the hard limit during stage late'
+        governor._interrupt_pending = True
+        _thread.interrupt_main()
+
+    monkeypatch.setattr(governor, '_sample', interrupt_while_finishing)
+    with pytest.raises(MemoryBudgetExceeded) as error:
+        with governor.stage('late'):
+            pass
+
+    assert error.value.args[1]['stage'] == 'late'
+    assert governor.report()[0]['stage'] == 'late'
+
@@ -0,0 +1,67 @@
+'''
+Unit tests for the functions included in
+the "run_checkpoints.py" component
+
+Author: Vitor Abdo
+Date: Oct/2026
+'''
+
+# import necessary packages
+import pytest
+from components.lake_backend import LocalLakeBackend
+from components.run_checkpoints import RunCheckpoints, hash_dataframe
+
+STAGES = ['ingest', 'raw_layer', 'processed_layer', 'dw_load']
+
+
+@pytest.fixture
+def backend(tmp_path):
+    return LocalLakeBackend(str(tmp_path / 'lake'))
+
+
+def test_rerun_reuses_completed_stages(backend, sample_api_data):
+    '''Test whether a new attempt for the same date sees the stages of the previous one'''
+    first_attempt = RunCheckpoints(backend, '2023-01-05', STAGES)
+    raw_hash = first_attempt.complete_dataframe('ingest', sample_api_data)
+    first_attempt.complete('raw_layer', raw_hash, raw_hash)
+
+    rerun = RunCheckpoints(backend, '2023-01-05', STAGES)
+
+    assert rerun.is_done('ingest')
+    assert rerun.is_done('raw_layer', raw_hash)
+    assert not rerun.is_done('processed_layer', raw_hash)
+    assert rerun.load_dataframe('ingest').equals(sample_api_data)
+    assert raw_hash == hash_dataframe(sample_api_data)
+
+
+def test_changed_input_invalidates_stage(backend, sample_api_data):
+    '''Test whether a stage is redone when the output it consumed changed'''
+    checkpoints = RunCheckpoints(backend, '2023-01-05', STAGES)
+    raw_hash = checkpoints.complete_dataframe('ingest', sample_api_data)
+    checkpoints.complete('raw_layer', raw_hash, raw_hash)
+
+    new_hash = checkpoints.complete_dataframe('ingest', sample_api_data * 2)
+
+    assert not checkpoints.is_done('raw_layer', new_hash)
+
+
+def test_invalidate_from_forces_later_stages(backend, sample_api_data):
+    '''Test whether forcing a stage also forces every stage after it'''
+    checkpoints = RunCheckpoints(backend, '2023-01-05', STAGES)
+    for stage in STAGES:
+        checkpoints.complete(stage, 'hash')
+
+    checkpoints.invalidate_from('raw_layer')
+    rerun = RunCheckpoints(backend, '2023-01-05', STAGES)
+
+    assert [rerun.is_done(stage) for stage in STAGES] == [True, False, False, False]
+
+
+def test_corrupted_artifact_is_rejected(backend, sample_api_data):
+    '''Test whether an artifact that does not match its hash is not reused'''
+    checkpoints = RunCheckpoints(backend, '2023-01-05', STAGES)
+    checkpoints.complete_dataframe('ingest', sample_api_data)
+    backend.put_bytes(b'corrupted', checkpoints.manifest['ingest']['artifact_key'])
+
+    with pytest.raises(ValueError):
+        checkpoints.load_dataframe('ingest')
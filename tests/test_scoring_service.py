@@ -0,0 +1,165 @@
+'''
+Unit tests for the functions included in
+the "scoring_service.py" component
+
+Author: Vitor Abdo
+Date: Oct/2026
+'''
+
+# import necessary packages
+import json
+import datetime
+import asyncio
+import pytest
+import numpy as np
+from components.lake_backend import LocalLakeBackend
+from components.anomaly_detection_system import AnomalyDetector, advance_volatility_state
+from components.scoring_service import DetectorStateStore, ScoringService
+from components.scoring_service import build_detector_state, publish_detector_state, load_detector_state
+
+
+@pytest.fixture
+def state_lake(tmp_path):
+    '''Local lake with the published detector states of two tickers'''
+    backend = LocalLakeBackend(str(tmp_path / 'lake'))
+    rng = np.random.default_rng(0)
+    for ticker, scale in (('ETH-USD', 10.0), ('BTC-USD', 100.0)):
+        data = rng.normal(0, scale, 500)
+        detector = AnomalyDetector(data, np.mean(data), np.std(data), 3 * np.std(data))
+        publish_detector_state(backend, build_detector_state(ticker, '2023-01-01', data, detector))
+    return backend
+
+
+def test_score_matches_anomaly_detector(state_lake):
+    '''Test whether the service scores a value like the batch detector'''
+    store = DetectorStateStore(state_lake)
+    store.reload()
+    state = store.states['ETH-USD']
+    detector = AnomalyDetector(None, state['mean'], state['std'], state['threshold'])
+
+    for value in (0.0, 25.0, 45.0, -60.0):
+        result = store.score('ETH-USD', value)
+        event = detector.anomaly_event('ETH-USD', '2023-01-02', value)
+        assert result['is_anomaly'] == event['is_anomaly']
+        assert result['p_value'] == pytest.approx(event['p_value'], abs=1e-12)
+
+    batch = store.score_batch([{'ticker': 'BTC-USD', 'value': 400}, {'ticker': 'XRP-USD', 'value': 1}])
+    assert batch[0]['is_anomaly']
+    assert batch[1] == {'ticker': 'XRP-USD', 'error': 'unknown ticker'}
+
+
+def test_reload_only_fetches_changed_states(state_lake, monkeypatch):
+    '''Test whether a reload downloads the new states only'''
+    store = DetectorStateStore(state_lake)
+    assert store.reload() == 2
+    assert store.reload() == 0
+
+    data = np.arange(100.0)
+    detector = AnomalyDetector(data, 1000.0, 1.0, 3.0)
+    publish_detector_state(state_lake, build_detector_state('ETH-USD', '2023-01-02', data, detector))
+
+    fetched = []
+    get_bytes = state_lake.get_bytes
+    monkeypatch.setattr(state_lake, 'get_bytes', lambda key: fetched.append(key) or get_bytes(key))
+    assert store.reload() == 1
+    assert fetched == ['models/crypto_anomaly_detect/detector_state/ETH-USD.json']
+    assert store.states['ETH-USD']['fitted_at'] == '2023-01-02'
+
+
+def test_constant_history_scores_without_infinite_z_scores(state_lake):
+    '''Test whether a ticker fitted on a constant history scores to strict JSON instead of failing'''
+    data = np.full(100, 5.0)
+    detector = AnomalyDetector(data, 5.0, 0.0, 0.0)
+    publish_detector_state(state_lake, build_detector_state('USDT-USD', '2023-01-01', data, detector))
+    store = DetectorStateStore(state_lake)
+    store.reload()
+
+    assert store.score('USDT-USD', 5.0)['is_anomaly'] is False
+    result = store.score('USDT-USD', 5.5)
+    assert result['is_anomaly'] and result['z_score'] is None and result['p_value'] == 0.0
+
+    batch = store.score_batch([{'ticker': 'USDT-USD', 'value': 6}, {'ticker': 'ETH-USD', 'value': float('nan')}])
+    assert batch[0] == dict(result, value=6.0)
+    assert batch[1] == {'ticker': 'ETH-USD', 'error': 'invalid value'}
+
+    malformed = [{'ticker': 'ETH-USD', 'value': value} for value in ('abc', None, [1.0])] + [{'ticker': 'ETH-USD'}]
+    batch = store.score_batch(malformed + [{'ticker': 'ETH-USD', 'value': '5'}])
+    assert batch[:4] == [{'ticker': 'ETH-USD', 'error': 'invalid value'}] * 4
+    assert batch[4] == store.score('ETH-USD', 5.0)
+    json.dumps(batch, allow_nan=False)
+    with pytest.raises(ValueError):
+        store.score('ETH-USD', float('inf'))
+
+
+def test_score_with_volatility_state(state_lake):
+    '''Test whether a published volatility state is read back and scored by the service'''
+    assert load_detector_state(state_lake, 'SOL-USD') is None
+
+    data = np.random.default_rng(1).standard_t(4, 600) * 5
+    detector = AnomalyDetector(data, np.mean(data), np.std(data), 3 * np.std(data))
+    _, volatility_state = advance_volatility_state('ETH-USD', datetime.date(2023, 1, 1), data[:-1], data[-1])
+    publish_detector_state(state_lake, build_detector_state('ETH-USD', '2023-01-01', data, detector,
+                                                            volatility_state))
+    assert load_detector_state(state_lake, 'ETH-USD')['volatility'] == volatility_state
+
+    store = DetectorStateStore(state_lake)
+    store.reload()
+    result = store.score('ETH-USD', 1000.0)
+    assert result['volatility_z_score'] == pytest.approx(
+        (1000.0 - volatility_state['mean']) / np.sqrt(volatility_state['variance']))
+    assert result['volatility_is_anomaly']
+    assert 'volatility_z_score' not in store.score('BTC-USD', 0.0)
+
+
+async def request(port: int, method: str, target: str, payload: dict = None) -> tuple:
+    '''Send one HTTP request and read the JSON response'''
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    body = json.dumps(payload).encode() if payload is not None else b''
+    writer.write(f'{method} {target} HTTP/1.1\r\nHost: test\r\nContent-Length: {len(body)}\r\n'
+                 f'Connection: close\r\n\r\n'.encode() + body)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+
+    head, _, body = response.partition(b'\r\n\r\n')
+    return int(head.split()[1]), json.loads(body)
+
+
+def test_http_endpoints(state_lake):
+    '''Test whether the single, batch and health endpoints answer over HTTP'''
+    async def scenario():
+        service = ScoringService(DetectorStateStore(state_lake), host='127.0.0.1', port=0, reload_seconds=3600)
+        await service.start()
+        try:
+            return await asyncio.gather(
+                request(service.port, 'GET', '/health'),
+                request(service.port, 'GET', '/score?ticker=ETH-USD&value=100'),
+                request(service.port, 'POST', '/score/batch', {'items': [{'ticker': 'BTC-USD', 'value': 1}]}),
+                request(service.port, 'GET', '/score?ticker=XRP-USD&value=1'),
+                request(service.port, 'POST', '/score', {'ticker': 'ETH-USD'}))
+        finally:
+            await service.stop()
+
+    health, single, batch, unknown, invalid = asyncio.run(scenario())
+
+    assert health == (200, {'status': 'ok', 'tickers': 2, 'loaded_at': health[1]['loaded_at']})
+    assert single[0] == 200 and single[1]['is_anomaly']
+    assert batch[0] == 200 and not batch[1]['results'][0]['is_anomaly']
+    assert unknown[0] == 404
+    assert invalid[0] == 400
+
+
+def test_unexpected_error_returns_json_500(state_lake, monkeypatch):
+    '''Test whether an unexpected error while scoring answers a JSON 500 instead of dropping the connection'''
+    store = DetectorStateStore(state_lake)
+    monkeypatch.setattr(store, 'score', lambda ticker, value: 1 / 0)
+
+    async def scenario():
+        service = ScoringService(store, host='127.0.0.1', port=0, reload_seconds=3600)
+        await service.start()
+        try:
+            return await request(service.port, 'GET', '/score?ticker=ETH-USD&value=1')
+        finally:
+            await service.stop()
+
+    assert asyncio.run(scenario()) == (500, {'error': 'internal error'})
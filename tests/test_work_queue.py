@@ -0,0 +1,142 @@
+'''
+Unit tests for the functions included in
+the "work_queue.py" component
+
+The queue tests run several worker processes against a local Postgres,
+given by the WORK_QUEUE_TEST_DSN environment variable, e.g.
+WORK_QUEUE_TEST_DSN="host=localhost dbname=postgres user=postgres"
+They are skipped when it is not set.
+
+Author: Vitor Abdo
+Date: Oct/2026
+'''
+
+# import necessary packages
+import os
+import time
+import datetime
+import multiprocessing
+import pytest
+import psycopg2
+from components.dw_migrations import MIGRATIONS
+from components.work_queue import WorkQueue, WORK_QUEUE_TABLE, enqueue_work_items
+from components.work_queue import fetch_queue_stats, fetch_dead_letters, requeue_dead_letters
+
+DSN = os.getenv('WORK_QUEUE_TEST_DSN')
+SCHEMA = 'work_queue_test'
+
+requires_postgres = pytest.mark.skipif(DSN is None, reason='WORK_QUEUE_TEST_DSN is not set')
+
+
+def test_work_queue_migration():
+    '''Test whether a migration creates the queue table and its partial claim index'''
+    statements = ' '.join(statement for _, _, migration in MIGRATIONS for statement in migration)
+
+    assert f'{{schema_name}}.{WORK_QUEUE_TABLE} (' in statements
+    assert f'{WORK_QUEUE_TABLE}_claim_idx' in statements
+
+
+def process_and_log(ticker: str, date, worker_id: str, fail_tickers=(), sleep_seconds: float = 0.01) -> None:
+    '''Record which worker processed an item, failing for the poison tickers'''
+    if ticker in fail_tickers:
+        raise ValueError(f'{ticker} is a poison item')
+    time.sleep(sleep_seconds)
+
+    conn = psycopg2.connect(DSN)
+    try:
+        with conn:
+            with conn.cursor() as cur:
+                cur.execute(f'INSERT INTO {SCHEMA}.processed_log VALUES (%s, %s, %s)', (ticker, date, worker_id))
+    finally:
+        conn.close()
+
+
+def run_worker(worker_id: str, fail_tickers: tuple = ()) -> None:
+    '''Entry point of a worker process that drains the queue'''
+    queue = WorkQueue(DSN, SCHEMA, worker_id=worker_id, lease_seconds=30, retry_backoff_seconds=0)
+    queue.run(lambda ticker, date: process_and_log(ticker, date, worker_id, fail_tickers), batch_size=2, drain=True)
+
+
+@pytest.fixture
+def queue_schema():
+    conn = psycopg2.connect(DSN)
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE')
+        cur.execute(f'CREATE SCHEMA {SCHEMA}')
+        for version, _, statements in MIGRATIONS:
+            if version == 3:
+                for statement in statements:
+                    cur.execute(statement.format(schema_name=SCHEMA))
+        cur.execute(f'CREATE TABLE {SCHEMA}.processed_log (ticker TEXT, date DATE, worker_id TEXT)')
+    yield conn
+
+    with conn.cursor() as cur:
+        cur.execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE')
+    conn.close()
+
+
+def fetch_processed(conn) -> list:
+    with conn.cursor() as cur:
+        cur.execute(f'SELECT ticker, date, worker_id FROM {SCHEMA}.processed_log')
+        return cur.fetchall()
+
+
+@requires_postgres
+def test_workers_process_each_item_once(queue_schema):
+    '''Test whether concurrent worker processes split the queue without processing an item twice'''
+    tickers = [f'T{i:03d}-USD' for i in range(60)]
+    dates = ['2026-10-17', '2026-10-18']
+    assert enqueue_work_items(DSN, SCHEMA, tickers, dates) == 120
+    assert enqueue_work_items(DSN, SCHEMA, tickers, dates) == 0
+
+    workers = [multiprocessing.Process(target=run_worker, args=(f'worker-{i}',)) for i in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(timeout=120)
+        assert worker.exitcode == 0
+
+    processed = fetch_processed(queue_schema)
+    assert len(processed) == 120
+    assert len({(ticker, date) for ticker, date, _ in processed}) == 120
+    assert len({worker_id for _, _, worker_id in processed}) > 1
+    assert fetch_queue_stats(DSN, SCHEMA)['done'] == 120
+
+
+@requires_postgres
+def test_poison_items_become_dead_letters(queue_schema):
+    '''Test whether an item failing every attempt goes to the dead letters and can be requeued'''
+    enqueue_work_items(DSN, SCHEMA, ['GOOD-USD', 'BAD-USD'], ['2026-10-18'], max_attempts=3)
+
+    worker = multiprocessing.Process(target=run_worker, args=('worker-0', ('BAD-USD',)))
+    worker.start()
+    worker.join(timeout=60)
+
+    dead_letters = fetch_dead_letters(DSN, SCHEMA)
+    assert [(ticker, attempts) for ticker, _, attempts, _ in dead_letters] == [('BAD-USD', 3)]
+    assert 'poison item' in dead_letters[0][3]
+    assert fetch_queue_stats(DSN, SCHEMA) == {'pending': 0, 'running': 0, 'done': 1, 'dead': 1}
+
+    assert requeue_dead_letters(DSN, SCHEMA) == 1
+    assert fetch_queue_stats(DSN, SCHEMA)['pending'] == 1
+
+
+@requires_postgres
+def test_expired_lease_is_reclaimed(queue_schema):
+    '''Test whether the item of a worker that died is claimed again once its lease expires'''
+    enqueue_work_items(DSN, SCHEMA, ['ETH-USD'], ['2026-10-18'])
+
+    # a worker that claims and dies without heartbeats or release
+    dead_worker = WorkQueue(DSN, SCHEMA, worker_id='dead-worker', lease_seconds=1)
+    assert len(dead_worker.claim()) == 1
+    dead_worker.conn.close()
+
+    live_worker = WorkQueue(DSN, SCHEMA, worker_id='live-worker', lease_seconds=30)
+    assert live_worker.claim() == []
+
+    time.sleep(1.5)
+    assert live_worker.claim() == [('ETH-USD', datetime.date(2026, 10, 18), 2)]
+    assert live_worker.heartbeat() == 1
+    assert live_worker.complete('ETH-USD', '2026-10-18')
+    live_worker.conn.close()